@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Backtests the bot's strategy on stored funding rate history (and optional price series).
+
+    python backtest.py --days 30 --output backtest_ledger.csv
+    python backtest.py --funding-csv all_funding_rates.csv --prices quotes.jsonl --step-minutes 5 \
+        --set MIN_FUNDING_RATE_DIFFERENCE=0.15 --set STOP_LOSS_USDT=-3
+
+The replay applies the open/close rules of trading_bot.check_and_manage_positions
+in the same order, with the same PnL and funding fee functions
+(trade_logger.calculate_realized_pnl, trading_bot.calculate_funding_fee_profit
+and count_funding_events), and writes a ledger in the trade_logger.FIELDNAMES
+schema that the dashboard's tooling reads.
+
+Every exchange in ARBITRAGE_EXCHANGES takes part: like find_opportunities, each
+step picks the best short/long exchange per pair from the exchange x exchange
+rate difference matrix (utils.funding_matrix), and positions are managed on the
+exchanges they were opened on.
+
+Funding rates come from the funding rate store (or a legacy all_funding_rates.csv);
+each settled rate is used until the next settlement. Prices come from a
+STREAM_REPLAY_FILE-format file (timestamp, exchange, symbol, mark_price); without
+one every exchange is quoted at a flat 1.0, so PnL is zero and the price spread
+and stop-loss rules never fire.
+"""
+import argparse
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import config
+from exchanges.registry import display_name, exchange_id
+from trading_bot import calculate_funding_fee_profit
+from utils import funding_matrix
+from utils.trade_logger import FIELDNAMES, build_trade_record, calculate_realized_pnl
+
+# Strategy parameters the replay reads (config.json keys)
+STRATEGY_KEYS = (
+    'MIN_FUNDING_RATE_DIFFERENCE', 'CLOSE_FUNDING_RATE_DIFFERENCE', 'MAX_PRICE_SPREAD',
+    'POSITION_SIZE_USDT', 'MAX_TOTAL_EXPOSURE_USDT', 'MIN_HOLDING_HOURS_FOR_REVERSAL',
+    'STOP_LOSS_USDT', 'MAX_HOLDING_PRICE_SPREAD', 'MAX_HOLDING_DURATION_HOURS',
+)
+# Closing rules in the order check_and_manage_positions applies them
+CLOSE_REASONS = ('STOP_LOSS', 'LOW_ARBITRAGE_RATE', 'MAX_HOLDING_PRICE_SPREAD', 'RATE_REVERSAL', 'MAX_HOLDING_TIME')
+
+# Grid steps per best_venue_pairs call; bounds the (steps, pairs, E, E) temporaries
+OPPORTUNITY_CHUNK_STEPS = 512
+# MAX_PRICE_SPREAD values whose best exchange pairs a MarketHistory keeps (a sweep may try thousands)
+BEST_PAIRS_CACHE_SIZE = 8
+
+def strategy_params(overrides=None):
+    """The current config values of STRATEGY_KEYS, updated with `overrides`."""
+    params = {key: getattr(config, key) for key in STRATEGY_KEYS}
+    unknown = set(overrides or {}) - set(STRATEGY_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown strategy parameters: {', '.join(sorted(unknown))}")
+    params.update(overrides or {})
+    return params
+
+def to_pair(symbol):
+    """'BTCUSDT', 'BTC/USDT' or 'BTC/USDT:USDT' -> 'BTC/USDT' (the TRADING_PAIRS format)."""
+    symbol = str(symbol).split(':')[0]
+    if '/' not in symbol and symbol.endswith('USDT'):
+        symbol = f"{symbol[:-4]}/USDT"
+    return symbol
+
+
+class MarketHistory:
+    """
+    Funding rates and mark prices of every exchange on a regular time grid:
+    `timestamps` has shape (T,), `rates` and `prices` (T, S, E) with one row per
+    pair, one column per exchange (CCXT ids in `exchanges`) and NaN where
+    nothing is known yet.
+    """
+
+    def __init__(self, timestamps, pairs, exchanges, rates, prices):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.pairs = list(pairs)
+        self.exchanges = list(exchanges)
+        self.rates = rates
+        self.prices = prices
+        self._derived = None
+        self._best_pairs = {}
+
+    def derived(self):
+        """(annualized rates, quoted) for all steps; independent of the strategy parameters, so computed once."""
+        if self._derived is None:
+            annualized = self.rates * 3 * 365
+            quoted = ~(np.isnan(annualized) | np.isnan(self.prices))
+            self._derived = (annualized, quoted)
+        return self._derived
+
+    def best_pairs(self, max_price_spread):
+        """
+        (short_index, long_index, rate_difference), each (T, S): the best exchange pair
+        of every pair and step, as find_opportunities picks it. Cached per spread limit.
+        """
+        if max_price_spread not in self._best_pairs:
+            if len(self._best_pairs) >= BEST_PAIRS_CACHE_SIZE:
+                self._best_pairs.pop(next(iter(self._best_pairs)))
+            annualized, _ = self.derived()
+            chunks = [
+                funding_matrix.best_venue_pairs(annualized[n:n + OPPORTUNITY_CHUNK_STEPS],
+                                                self.prices[n:n + OPPORTUNITY_CHUNK_STEPS], max_price_spread)
+                for n in range(0, len(self.timestamps), OPPORTUNITY_CHUNK_STEPS)
+            ]
+            if chunks:
+                self._best_pairs[max_price_spread] = tuple(np.concatenate(part) for part in zip(*chunks))
+            else:
+                empty = (len(self.timestamps), len(self.pairs))
+                self._best_pairs[max_price_spread] = (np.zeros(empty, dtype=np.int64), np.zeros(empty, dtype=np.int64),
+                                                      np.full(empty, np.nan))
+        return self._best_pairs[max_price_spread]
+
+    def last_days(self, days):
+        keep = self.timestamps >= self.timestamps[-1] - days * 86400
+        return MarketHistory(self.timestamps[keep], self.pairs, self.exchanges, self.rates[keep], self.prices[keep])
+
+    @classmethod
+    def from_frames(cls, funding, prices=None, step_seconds=3600, pairs=None, start=None, end=None, exchanges=None):
+        """
+        Builds the grid from a funding frame (symbol, exchange, timestamp, funding_rate)
+        and an optional price frame (symbol, exchange, timestamp, mark_price), timestamps
+        in epoch seconds. Each value holds until the next observation (forward fill).
+        `exchanges` defaults to ARBITRAGE_EXCHANGES; rows of other exchanges are ignored.
+        """
+        exchanges = list(exchanges or config.ARBITRAGE_EXCHANGES)
+        funding = cls._normalize(funding, exchanges)
+        prices = cls._normalize(prices, exchanges) if prices is not None else None
+        if pairs is None:
+            pairs = sorted(funding['pair'].unique())
+        start = int(funding['timestamp'].min()) if start is None else int(start)
+        end_candidates = [funding['timestamp'].max()] + ([prices['timestamp'].max()] if prices is not None else [])
+        end = int(max(end_candidates)) if end is None else int(end)
+        timestamps = np.arange(start, end + 1, step_seconds, dtype=np.int64)
+
+        def grid(frame, exchange, column):
+            rows = frame[frame['exchange'] == exchange]
+            table = rows.pivot_table(index='timestamp', columns='pair', values=column, aggfunc='last')
+            table = table.reindex(columns=pairs).sort_index().ffill()
+            positions = np.searchsorted(table.index.to_numpy(), timestamps, side='right') - 1
+            values = table.to_numpy(dtype=float)
+            if len(values) == 0:
+                return np.full((len(timestamps), len(pairs)), np.nan)
+            return np.where((positions >= 0)[:, None], values[np.clip(positions, 0, None)], np.nan)
+
+        rates = np.stack([grid(funding, exchange, 'funding_rate') for exchange in exchanges], axis=-1)
+        if prices is None:
+            price_grid = np.ones_like(rates)
+        else:
+            price_grid = np.stack([grid(prices, exchange, 'mark_price') for exchange in exchanges], axis=-1)
+        return cls(timestamps, pairs, exchanges, rates, price_grid)
+
+    @staticmethod
+    def _normalize(frame, exchanges):
+        frame = pd.DataFrame(frame)
+        frame['exchange'] = frame['exchange'].astype(str).map(exchange_id)
+        frame = frame[frame['exchange'].isin(exchanges)].copy()
+        frame['pair'] = frame['symbol'].map(to_pair)
+        timestamps = frame['timestamp']
+        if not pd.api.types.is_numeric_dtype(timestamps):
+            parsed = pd.to_datetime(timestamps, utc=True, format='ISO8601')
+            timestamps = (parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+        frame['timestamp'] = timestamps.astype(np.int64)
+        for column in ('funding_rate', 'mark_price'):
+            if column in frame:
+                frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        return frame
+
+def load_funding_frame(csv_path=None):
+    """Funding rate history from a legacy CSV file, or from the funding rate store."""
+    if csv_path:
+        return pd.read_csv(csv_path)
+    from utils.funding_store import FundingRateStore
+    return pd.DataFrame(FundingRateStore().all_rows())
+
+def load_price_frame(path):
+    """Mark prices from a STREAM_REPLAY_FILE-format file (JSON lines or CSV)."""
+    if path.endswith('.csv'):
+        frame = pd.read_csv(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            frame = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+    return frame.dropna(subset=['mark_price'])
+
+
+def run_backtest(history, params=None, keep_ledger=True):
+    """
+    Replays `history` through the bot's rules.
+
+    Time runs in a loop over grid steps, and at each step every pair is
+    evaluated at once with array operations. Like the bot, pairs are checked in
+    order: a position that closes is not reopened in the same step, a position
+    without quotes from both of its exchanges is skipped, and
+    MAX_TOTAL_EXPOSURE_USDT is applied in pair order with the exposure freed by
+    earlier closes in the same step.
+
+    Returns:
+        (ledger, summary): ledger rows in FIELDNAMES format (empty unless
+        `keep_ledger`), and totals. max_drawdown is measured on the realized
+        profit (PnL plus funding fees) of the closed trades, in close order.
+    """
+    p = strategy_params(params)
+    timestamps, pairs = history.timestamps, history.pairs
+    names = [display_name(exchange) for exchange in history.exchanges]
+    num_pairs = len(pairs)
+
+    # Everything that does not depend on the open positions, for all steps at once
+    annualized, quoted = history.derived()
+    best_short, best_long, best_difference = history.best_pairs(p['MAX_PRICE_SPREAD'])
+    opportunity = best_difference >= p['MIN_FUNDING_RATE_DIFFERENCE']
+
+    is_open = np.zeros(num_pairs, dtype=bool)
+    short_venue = np.zeros(num_pairs, dtype=np.int64)
+    long_venue = np.zeros(num_pairs, dtype=np.int64)
+    size = np.zeros(num_pairs)
+    open_short_price = np.zeros(num_pairs)
+    open_long_price = np.zeros(num_pairs)
+    open_timestamp = np.zeros(num_pairs)
+    initial_rate = np.zeros(num_pairs)
+    trade_ids = [None] * num_pairs
+
+    ledger = []
+    opened = 0
+    closed_pnl = []
+    closed_funding = []
+    reasons = dict.fromkeys(CLOSE_REASONS, 0)
+
+    for step, now in enumerate(timestamps.tolist()):
+        prices = history.prices[step]
+        when = datetime.utcfromtimestamp(now)
+        open_at_start = is_open.copy()
+        closing = np.empty(0, dtype=np.int64)
+        step_records = []  # (pair index, row), logged in pair order like the bot
+
+        # Step 1: closing rules for the open positions quoted on both of their exchanges
+        managed = np.flatnonzero(is_open)
+        managed = managed[quoted[step, managed, short_venue[managed]] & quoted[step, managed, long_venue[managed]]]
+        if managed.size:
+            short_leg, long_leg = short_venue[managed], long_venue[managed]
+            short_price, long_price = prices[managed, short_leg], prices[managed, long_leg]
+            rates = annualized[step, managed, short_leg] - annualized[step, managed, long_leg]
+            unrealized_pnl = calculate_realized_pnl(open_short_price[managed], open_long_price[managed],
+                                                    short_price, long_price, size[managed])
+            holding_hours = (now - open_timestamp[managed]) / 3600
+            price_spread = np.abs(short_price - long_price) / short_price
+            conditions = [
+                unrealized_pnl <= p['STOP_LOSS_USDT'],
+                np.abs(rates) <= p['CLOSE_FUNDING_RATE_DIFFERENCE'],
+                price_spread > p['MAX_HOLDING_PRICE_SPREAD'],
+                (rates < 0) & (holding_hours > p['MIN_HOLDING_HOURS_FOR_REVERSAL']),
+                holding_hours >= p['MAX_HOLDING_DURATION_HOURS'],
+            ]
+            reason_index = np.select(conditions, np.arange(len(CLOSE_REASONS)), default=-1)
+            for k in np.flatnonzero(reason_index >= 0).tolist():
+                i = managed[k]
+                position = {
+                    'size': size[i],
+                    'open_timestamp': open_timestamp[i],
+                    'initial_rate_difference': initial_rate[i],
+                }
+                funding_fee_profit = calculate_funding_fee_profit(position, rates[k], now)
+                pnl = float(unrealized_pnl[k])
+                reason = CLOSE_REASONS[reason_index[k]]
+                if keep_ledger:
+                    step_records.append((i, build_trade_record(
+                        pairs[i], 'CLOSE', names[short_leg[k]], names[long_leg[k]],
+                        float(size[i]), float(short_price[k]), float(long_price[k]), float(initial_rate[i]),
+                        close_reason=reason, realized_pnl=pnl, funding_fee_profit=float(funding_fee_profit),
+                        trade_id=trade_ids[i], timestamp=when,
+                    )))
+                closed_pnl.append(pnl)
+                closed_funding.append(float(funding_fee_profit))
+                reasons[reason] += 1
+            closing = managed[reason_index >= 0]
+            is_open[closing] = False
+
+        # Step 2: new positions, within the exposure limit in pair order
+        candidates = np.flatnonzero(opportunity[step] & ~open_at_start)
+        if candidates.size:
+            position_size = p['POSITION_SIZE_USDT']
+            exposure = float(size[open_at_start].sum())
+            if exposure + position_size * candidates.size <= p['MAX_TOTAL_EXPOSURE_USDT']:
+                accepted = candidates.tolist()
+            else:
+                accepted = []
+                freed = size[closing]
+                closed_before = 0
+                for i in candidates.tolist():
+                    while closed_before < closing.size and closing[closed_before] < i:
+                        exposure -= freed[closed_before]
+                        closed_before += 1
+                    if exposure + position_size > p['MAX_TOTAL_EXPOSURE_USDT']:
+                        continue
+                    accepted.append(i)
+                    exposure += position_size
+
+            opened += len(accepted)
+            for i in accepted:
+                short_leg, long_leg = int(best_short[step, i]), int(best_long[step, i])
+                arbitrage_rate = float(best_difference[step, i])
+                short_price, long_price = float(prices[i, short_leg]), float(prices[i, long_leg])
+                is_open[i] = True
+                short_venue[i], long_venue[i] = short_leg, long_leg
+                size[i] = position_size
+                open_short_price[i], open_long_price[i] = short_price, long_price
+                open_timestamp[i] = now
+                initial_rate[i] = arbitrage_rate
+                trade_ids[i] = f"{pairs[i]}_{now}"
+                if keep_ledger:
+                    step_records.append((i, build_trade_record(
+                        pairs[i], 'OPEN', names[short_leg], names[long_leg],
+                        position_size, short_price, long_price, arbitrage_rate, trade_id=trade_ids[i], timestamp=when,
+                    )))
+
+        if step_records:
+            step_records.sort(key=lambda record: record[0])
+            ledger.extend(row for _, row in step_records)
+
+    realized = float(np.sum(closed_pnl)) if closed_pnl else 0.0
+    funding = float(np.sum(closed_funding)) if closed_funding else 0.0
+    equity = np.cumsum(np.add(closed_pnl, closed_funding))
+    max_drawdown = float(np.max(np.maximum.accumulate(np.maximum(equity, 0)) - equity)) if closed_pnl else 0.0
+    summary = {
+        'pairs': num_pairs,
+        'exchanges': history.exchanges,
+        'steps': len(timestamps),
+        'start': int(timestamps[0]) if len(timestamps) else None,
+        'end': int(timestamps[-1]) if len(timestamps) else None,
+        'opened': opened,
+        'closed': len(closed_pnl),
+        'still_open': int(is_open.sum()),
+        'realized_pnl': realized,
+        'funding_fee_profit': funding,
+        'total_profit': realized + funding,
+        'max_drawdown': max_drawdown,
+        'win_rate': float(np.mean(np.add(closed_pnl, closed_funding) > 0)) if closed_pnl else None,
+        'close_reasons': reasons,
+        'params': p,
+    }
+    return ledger, summary
+
+def write_ledger(path, ledger):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(ledger)
+
+def parse_overrides(assignments):
+    """['KEY=VALUE', ...] -> {KEY: float(VALUE)}"""
+    overrides = {}
+    for assignment in assignments or []:
+        key, _, value = assignment.partition('=')
+        overrides[key.strip().upper()] = float(value)
+    return overrides
+
+def add_history_arguments(parser):
+    parser.add_argument('--funding-csv', help='all_funding_rates.csv to replay (default: the funding rate store)')
+    parser.add_argument('--prices', help='Mark price series in the STREAM_REPLAY_FILE format')
+    parser.add_argument('--step-minutes', type=float, default=60, help='Evaluation interval of the replay')
+    parser.add_argument('--days', type=float, help='Only replay the last N days of the history')
+    parser.add_argument('--config-pairs', action='store_true', help='Only the configured TRADING_PAIRS (default: every symbol)')
+
+def load_history(args):
+    """MarketHistory for the options added by add_history_arguments."""
+    started = time.perf_counter()
+    funding = load_funding_frame(args.funding_csv)
+    prices = load_price_frame(args.prices) if args.prices else None
+    pairs = list(config.TRADING_PAIRS) if args.config_pairs else None
+    history = MarketHistory.from_frames(funding, prices, step_seconds=int(args.step_minutes * 60), pairs=pairs)
+    if args.days:
+        history = history.last_days(args.days)
+    _, quoted = history.derived()
+    tradable = (quoted.sum(axis=2) >= 2).any(axis=0)
+    missing = [pair for pair, seen in zip(history.pairs, tradable) if not seen]
+    if missing:
+        logging.warning(f"{len(missing)} pairs never have rates and prices on two exchanges and cannot trade: "
+                        f"{', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}")
+    logging.info(f"Loaded {len(history.pairs)} pairs x {len(history.exchanges)} exchanges x {len(history.timestamps)} steps in {time.perf_counter() - started:.2f}s")
+    return history
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_history_arguments(parser)
+    parser.add_argument('--set', action='append', metavar='KEY=VALUE', help='Override a strategy parameter (repeatable)')
+    parser.add_argument('--output', help='Write the simulated trade ledger to this CSV file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    history = load_history(args)
+    started = time.perf_counter()
+    ledger, summary = run_backtest(history, parse_overrides(args.set))
+    logging.info(f"Replayed in {time.perf_counter() - started:.2f}s")
+    if args.output:
+        write_ledger(args.output, ledger)
+        logging.info(f"Wrote {len(ledger)} ledger rows to {args.output}")
+    print(json.dumps(summary, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Parameter sweep over the strategy thresholds, on top of backtest.py.
+
+    python backtest_sweep.py --days 30 \
+        --param MIN_FUNDING_RATE_DIFFERENCE=0.05:0.30:0.05 --param CLOSE_FUNDING_RATE_DIFFERENCE=0.0,0.02,0.05 \
+        --param STOP_LOSS_USDT=-1,-2,-5
+    python backtest_sweep.py --samples 10000 --param MIN_FUNDING_RATE_DIFFERENCE=0.05:0.5 \
+        --param MAX_HOLDING_DURATION_HOURS=24:336 --best-config best_config.json --output sweep.csv
+
+--param takes a list of values (a,b,c), a range with a step (lo:hi:step, both
+ends included) or, with --samples, a range to draw from uniformly (lo:hi).
+Without --samples the full grid is evaluated; with it, that many random
+parameter sets. Parameters that are not swept keep their current config value.
+
+The market history is loaded once and copied into one shared memory block;
+the worker processes map it read-only instead of receiving a pickled copy, and
+each runs backtest.run_backtest without building the ledger. Results are
+ranked by --rank; the best set is written in config.json format (every
+DEFAULT_CONFIG key), ready to be posted to /api/config.
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import config
+from backtest import STRATEGY_KEYS, MarketHistory, add_history_arguments, load_history, run_backtest, strategy_params
+
+# Parameters stored as integers in config.json
+INTEGER_KEYS = {'MAX_HOLDING_DURATION_HOURS'}
+RESULT_FIELDS = ('total_profit', 'realized_pnl', 'funding_fee_profit', 'max_drawdown', 'closed', 'opened', 'win_rate')
+RANKINGS = {
+    'total_profit': lambda result: result['total_profit'],
+    'profit_to_drawdown': lambda result: result['total_profit'] / max(result['max_drawdown'], 1e-9),
+}
+ARRAY_FIELDS = ('rates', 'prices')
+
+def parse_param(text, sampled):
+    """'KEY=a,b,c' / 'KEY=lo:hi:step' -> (KEY, [values]); with `sampled`, 'KEY=lo:hi' -> (KEY, (lo, hi))."""
+    key, _, spec = text.partition('=')
+    key = key.strip().upper()
+    if key not in STRATEGY_KEYS:
+        raise ValueError(f"{key} is not a strategy parameter ({', '.join(STRATEGY_KEYS)})")
+    if ':' not in spec:
+        return key, [float(value) for value in spec.split(',')]
+    bounds = [float(value) for value in spec.split(':')]
+    if len(bounds) == 2 and sampled:
+        return key, (bounds[0], bounds[1])
+    if len(bounds) != 3:
+        raise ValueError(f"{text}: a grid range needs a step (lo:hi:step)")
+    low, high, step = bounds
+    return key, np.round(np.arange(low, high + step / 2, step), 10).tolist()
+
+def _cast(key, value):
+    return int(round(value)) if key in INTEGER_KEYS else float(value)
+
+def grid_points(space):
+    keys = list(space)
+    return [{key: _cast(key, value) for key, value in zip(keys, values)}
+            for values in itertools.product(*(space[key] for key in keys))]
+
+def random_points(space, samples, seed=None):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for key, values in space.items():
+        if isinstance(values, tuple):
+            columns[key] = rng.uniform(values[0], values[1], samples)
+        else:
+            columns[key] = rng.choice(values, samples)
+    return [{key: _cast(key, columns[key][n]) for key in space} for n in range(samples)]
+
+
+class SharedHistory:
+    """
+    The arrays of a MarketHistory in one shared memory block. `descriptor` is
+    what the workers need to map it again (block name, shape, timestamps, pairs, exchanges).
+    """
+
+    def __init__(self, history):
+        shape = history.rates.shape
+        item_count = int(np.prod(shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, len(ARRAY_FIELDS) * item_count * 8))
+        for n, field in enumerate(ARRAY_FIELDS):
+            view = np.ndarray(shape, dtype=np.float64, buffer=self._shm.buf, offset=n * item_count * 8)
+            view[:] = getattr(history, field)
+        self.descriptor = {
+            'name': self._shm.name, 'shape': shape,
+            'timestamps': history.timestamps, 'pairs': history.pairs, 'exchanges': history.exchanges,
+        }
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+def attach_history(descriptor):
+    """(MarketHistory backed by the shared block, SharedMemory handle to keep alive)"""
+    shm = shared_memory.SharedMemory(name=descriptor['name'])
+    shape = tuple(descriptor['shape'])
+    item_count = int(np.prod(shape))
+    arrays = []
+    for n in range(len(ARRAY_FIELDS)):
+        view = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=n * item_count * 8)
+        view.flags.writeable = False
+        arrays.append(view)
+    return MarketHistory(descriptor['timestamps'], descriptor['pairs'], descriptor['exchanges'], *arrays), shm
+
+# Set in each worker process by _init_worker
+_worker_history = None
+_worker_shm = None
+
+def _init_worker(descriptor):
+    global _worker_history, _worker_shm
+    logging.disable(logging.WARNING)
+    _worker_history, _worker_shm = attach_history(descriptor)
+
+def _evaluate(params):
+    _, summary = run_backtest(_worker_history, params, keep_ledger=False)
+    return summary_row(params, summary)
+
+def summary_row(params, summary):
+    row = dict(params)
+    row.update({field: summary[field] for field in RESULT_FIELDS})
+    return row
+
+def run_sweep(history, points, workers=None):
+    """Evaluates every parameter set in `points`; results come back in the same order."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [summary_row(params, run_backtest(history, params, keep_ledger=False)[1]) for params in points]
+    shared = SharedHistory(history)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.descriptor,)) as pool:
+            # Several sets per task keep the inter-process traffic small next to the replays
+            chunksize = max(1, len(points) // (workers * 16))
+            return list(pool.map(_evaluate, points, chunksize=chunksize))
+    finally:
+        shared.close()
+
+def best_config(params):
+    """A full config.json dict (current values) with the swept parameters of `params` applied."""
+    values = {key: getattr(config, key) for key in config.DEFAULT_CONFIG}
+    values.update(strategy_params({key: params[key] for key in STRATEGY_KEYS if key in params}))
+    values['MAX_HOLDING_DURATION_HOURS'] = int(values['MAX_HOLDING_DURATION_HOURS'])
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_history_arguments(parser)
+    parser.add_argument('--param', action='append', required=True, metavar='KEY=SPEC', help='Swept parameter (repeatable)')
+    parser.add_argument('--samples', type=int, help='Evaluate this many random parameter sets instead of the full grid')
+    parser.add_argument('--seed', type=int, help='Seed of the random sampling')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: all CPU cores)')
+    parser.add_argument('--rank', choices=sorted(RANKINGS), default='total_profit')
+    parser.add_argument('--top', type=int, default=10, help='Number of results to print')
+    parser.add_argument('--output', help='Write every result to this CSV file')
+    parser.add_argument('--best-config', help='Write the best parameter set to this file in config.json format')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    space = dict(parse_param(text, args.samples is not None) for text in args.param)
+    points = random_points(space, args.samples, args.seed) if args.samples else grid_points(space)
+    history = load_history(args)
+    workers = args.workers or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    results = run_sweep(history, points, workers)
+    elapsed = time.perf_counter() - started
+    logging.info(f"Evaluated {len(points)} parameter sets with {workers} worker(s) in {elapsed:.1f}s "
+                 f"({len(points) / elapsed:.1f} sets/s)")
+
+    ranked = sorted(results, key=RANKINGS[args.rank], reverse=True)
+    keys = list(space)
+    print(' '.join(f"{key:>{len(key)}}" for key in keys) +
+          f" {'profit':>10} {'pnl':>10} {'funding':>10} {'drawdown':>9} {'trades':>7} {'win rate':>8}")
+    for row in ranked[:args.top]:
+        win_rate = f"{row['win_rate']:.0%}" if row['win_rate'] is not None else '-'
+        print(' '.join(f"{row[key]:>{len(key)}g}" for key in keys) +
+              f" {row['total_profit']:>10.2f} {row['realized_pnl']:>10.2f} {row['funding_fee_profit']:>10.2f} "
+              f"{row['max_drawdown']:>9.2f} {row['closed']:>7} {win_rate:>8}")
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=keys + list(RESULT_FIELDS))
+            writer.writeheader()
+            writer.writerows(ranked)
+        logging.info(f"Wrote {len(ranked)} results to {args.output}")
+    if args.best_config and ranked:
+        with open(args.best_config, 'w', encoding='utf-8') as f:
+            json.dump(best_config(ranked[0]), f, indent=4)
+        logging.info(f"Wrote the best parameter set to {args.best_config} (load it with POST /api/config)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Offline benchmarks for the data and decision hot paths
@@ -0,0 +1,97 @@
+"""
+Benchmark: vectorized perform_analysis vs. the original per-symbol Python loop.
+
+The original only compared Gate.io with Bitget, so perform_analysis is run on
+those two exchanges here; the other synthetic exchanges are just extra rows.
+
+    python -m benchmarks.bench_analysis --symbols 300 --settlements 90 --exchanges 2 4
+"""
+import argparse
+import time
+from collections import defaultdict
+from functools import partial
+
+import pandas as pd
+
+from benchmarks.synthetic import make_funding_rows
+from web_server import OPPORTUNITY_THRESHOLD, perform_analysis
+
+def legacy_perform_analysis(data):
+    """The pre-vectorization implementation, kept as the reference for speed and results."""
+    analysis_results = []
+    data_by_symbol = defaultdict(list)
+    for row in data:
+        data_by_symbol[row['symbol']].append(row)
+
+    for symbol, rows in data_by_symbol.items():
+        grouped_by_ts = defaultdict(dict)
+        for row in rows:
+            grouped_by_ts[row['timestamp']][row['exchange']] = float(row['funding_rate'])
+
+        diffs = [exchanges['bitget'] - exchanges['gateio'] for exchanges in grouped_by_ts.values() if 'gateio' in exchanges and 'bitget' in exchanges]
+        if not diffs: continue
+
+        count = len(diffs)
+        mean_abs_diff = sum(map(abs, diffs)) / count
+        variance = sum([(d - (sum(diffs) / count))**2 for d in diffs]) / count
+        opportunity_count = sum(1 for d in diffs if abs(d) > OPPORTUNITY_THRESHOLD)
+
+        analysis_results.append({
+            "symbol": symbol,
+            "avg_annualized_return": mean_abs_diff * 3 * 365,
+            "opportunity_frequency": opportunity_count / count,
+            "std_dev": variance**0.5,
+            "data_points": count
+        })
+
+    analysis_results.sort(key=lambda x: x['avg_annualized_return'], reverse=True)
+    return analysis_results
+
+def best_of(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def results_match(expected, actual, tolerance=1e-12):
+    if [r['symbol'] for r in expected] != [r['symbol'] for r in actual]:
+        return False
+    for e, a in zip(expected, actual):
+        if e['data_points'] != a['data_points']:
+            return False
+        for key in ('avg_annualized_return', 'opportunity_frequency', 'std_dev'):
+            if abs(e[key] - a[key]) > tolerance:
+                return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=300)
+    parser.add_argument('--settlements', type=int, default=90)
+    parser.add_argument('--exchanges', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 3],
+                        help='Multiply symbols and settlements by these factors (extreme sizes)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'symbols':>8} {'settle':>6} {'exch':>4} {'rows':>9} {'legacy (s)':>11} "
+          f"{'rows (s)':>9} {'columns (s)':>12} {'speedup':>8} {'match':>6}")
+    for scale in args.scale:
+        for num_exchanges in args.exchanges:
+            num_symbols, num_settlements = args.symbols * scale, args.settlements * scale
+            data = make_funding_rows(num_symbols, num_settlements, num_exchanges)
+            frame = pd.DataFrame(data)
+            frame['funding_rate'] = frame['funding_rate'].astype(float)
+
+            legacy_time, expected = best_of(legacy_perform_analysis, data, args.repeat)
+            analyze = partial(perform_analysis, exchanges=['gateio', 'bitget'])
+            rows_time, actual = best_of(analyze, data, args.repeat)
+            columns_time, columnar = best_of(analyze, frame, args.repeat)
+            match = results_match(expected, actual) and results_match(expected, columnar)
+            print(f"{num_symbols:>8} {num_settlements:>6} {num_exchanges:>4} {len(data):>9} {legacy_time:>11.3f} "
+                  f"{rows_time:>9.3f} {columns_time:>12.3f} {legacy_time / columns_time:>7.1f}x {str(match):>6}")
+
+if __name__ == '__main__':
+    main()
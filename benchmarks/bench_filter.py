@@ -0,0 +1,63 @@
+"""
+Benchmark: vectorized filter_to_settlement_times vs. the original datetime-based loop.
+
+    python -m benchmarks.bench_filter --symbols 300 --settlements 90 --jitter 1800
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from benchmarks.synthetic import make_funding_rows
+from web_server import filter_to_settlement_times, format_timestamp
+
+def legacy_filter_to_settlement_times(data):
+    """The pre-vectorization implementation, which works on ISO timestamp strings."""
+    def round_to_nearest_8h(dt):
+        hour = dt.hour
+        nearest = min([0, 8, 16], key=lambda h: abs(hour - h))
+        return dt.replace(hour=nearest, minute=0, second=0, microsecond=0)
+
+    grouped = defaultdict(list)
+    for row in data:
+        dt = datetime.fromisoformat(row['timestamp'].replace('Z', ''))
+        slot_dt = round_to_nearest_8h(dt)
+        key = (row['symbol'], row['exchange'], slot_dt.date(), slot_dt.hour)
+        grouped[key].append((abs((dt - slot_dt).total_seconds()), row))
+
+    filtered = []
+    for v in grouped.values():
+        v.sort(key=lambda x: x[0])
+        filtered.append(v[0][1])
+    return filtered
+
+def best_of(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=300)
+    parser.add_argument('--settlements', type=int, default=90)
+    parser.add_argument('--exchanges', type=int, default=2)
+    parser.add_argument('--jitter', type=int, default=1800, help='Max offset (s) of the extra off-slot records')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_funding_rows(args.symbols, args.settlements, args.exchanges, jitter_seconds=args.jitter)
+    iso_data = [{**row, 'timestamp': format_timestamp(row['timestamp'])} for row in data]
+
+    legacy_time, expected = best_of(legacy_filter_to_settlement_times, iso_data, args.repeat)
+    vectorized_time, actual = best_of(filter_to_settlement_times, data, args.repeat)
+
+    expected_keys = sorted((r['symbol'], r['exchange'], r['timestamp']) for r in expected)
+    actual_keys = sorted((r['symbol'], r['exchange'], format_timestamp(r['timestamp'])) for r in actual)
+    print(f"rows={len(data)} kept={len(actual)} legacy={legacy_time:.3f}s vectorized={vectorized_time:.3f}s "
+          f"speedup={legacy_time / vectorized_time:.1f}x match={expected_keys == actual_keys}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: vectorized OPEN/CLOSE pairing vs. the original per-trade groupby loop.
+
+    python -m benchmarks.bench_pairing --rows 10000 100000 1000000 --legacy-max-rows 100000
+
+The legacy loop takes minutes at 1M rows, so it is only run up to --legacy-max-rows.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_trade_ledger
+from utils import trade_pairing
+
+def legacy_closed_positions(ledger):
+    """The pre-vectorization /history/closed implementation, kept as the reference for speed and results."""
+    df = ledger.copy()
+    df['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'], errors='coerce', utc=True)
+    df.dropna(subset=['timestamp_utc'], inplace=True)
+    df = df.sort_values(by='timestamp_utc', ascending=False)
+    df = df.replace({np.nan: None, pd.NA: None})
+
+    closed_positions = []
+    legacy_trades = df[df['trade_id'].astype(str).str.startswith('legacy_')]
+    for _, trade in legacy_trades.iterrows():
+        position = trade.to_dict()
+        position['time'] = position.pop('timestamp_utc')
+        position['close_reason'] = position.get('close_reason') or '舊紀錄 (無法配對)'
+        position['open_time'] = None
+        position['close_time'] = position['time']
+        position['holding_time'] = -1
+        closed_positions.append(position)
+
+    trades_by_id = df[~df['trade_id'].astype(str).str.startswith('legacy_')].groupby('trade_id')
+    for trade_id, group in trades_by_id:
+        if len(group) == 2:
+            open_trade_df = group[group['action'] == 'OPEN']
+            close_trade_df = group[group['action'] == 'CLOSE']
+            if not open_trade_df.empty and not close_trade_df.empty:
+                open_trade = open_trade_df.iloc[0]
+                close_trade = close_trade_df.iloc[0]
+                closed_positions.append({
+                    'trade_id': trade_id,
+                    'pair': open_trade['pair'],
+                    'open_time': open_trade['timestamp_utc'],
+                    'close_time': close_trade['timestamp_utc'],
+                    'holding_time': (pd.Timestamp(close_trade['timestamp_utc']) - pd.Timestamp(open_trade['timestamp_utc'])).total_seconds() / 3600,
+                    'realized_pnl': close_trade['realized_pnl'],
+                })
+
+    closed_positions.sort(key=lambda x: x['close_time'], reverse=True)
+    return closed_positions
+
+def vectorized_closed_positions(ledger):
+    return trade_pairing.position_records(trade_pairing.closed_positions_frame(ledger))
+
+def timed(func, ledger):
+    started = time.perf_counter()
+    result = func(ledger)
+    return time.perf_counter() - started, result
+
+def results_match(expected, actual, tolerance=1e-9):
+    if len(expected) != len(actual):
+        return False
+    expected_by_id = {p['trade_id']: p for p in expected}
+    for position in actual:
+        reference = expected_by_id.get(position['trade_id'])
+        if reference is None or reference['close_time'] != position['close_time']:
+            return False
+        if abs(reference['holding_time'] - position['holding_time']) > tolerance:
+            return False
+        if (reference['realized_pnl'] is None) != (position['realized_pnl'] is None):
+            return False
+    return [p['close_time'] for p in expected] == [p['close_time'] for p in actual]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max-rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'closed':>8} {'legacy (s)':>11} {'pairing (s)':>12} {'records (s)':>12} "
+          f"{'export (s)':>11} {'speedup':>8} {'match':>6}")
+    for num_rows in args.rows:
+        ledger = make_trade_ledger(num_rows)
+
+        pairing_time, positions = timed(trade_pairing.closed_positions_frame, ledger)
+        records_time, actual = timed(trade_pairing.position_records, positions)
+        export_time, _ = timed(lambda p: trade_pairing.export_frame(p).to_csv(index=False), positions)
+        vectorized_time = pairing_time + records_time
+
+        if num_rows <= args.legacy_max_rows:
+            legacy_time, expected = timed(legacy_closed_positions, ledger)
+            legacy_column = f"{legacy_time:>11.3f}"
+            speedup = f"{legacy_time / vectorized_time:>7.1f}x"
+            match = str(results_match(expected, actual))
+        else:
+            legacy_column, speedup, match = f"{'-':>11}", f"{'-':>8}", '-'
+        print(f"{num_rows:>9} {len(positions):>8} {legacy_column} {pairing_time:>12.3f} {records_time:>12.3f} "
+              f"{export_time:>11.3f} {speedup} {match:>6}")
+
+if __name__ == '__main__':
+    main()
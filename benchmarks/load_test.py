@@ -0,0 +1,121 @@
+"""
+Load test of the bot's polling cycle against the local mock exchanges.
+
+    python -m benchmarks.load_test --pairs 50 200 1000 --cycles 20
+    python -m benchmarks.load_test --pairs 1000 --latency-ms 120 --rate-limit-rate 0.02 --error-rate 0.01
+    python -m benchmarks.load_test --settings mock.json --no-bulk
+
+Runs with EXCHANGE_BACKEND=mock, so the clients come from the same
+create_exchange_clients() switch the bot uses, and every cycle is
+trading_bot.run_polling_cycle(): market data collection, the decisions for
+every pair, trade logging and the position snapshot. Stores and files go to a
+temporary directory (see benchmarks.suite.isolate); nothing touches the network.
+Reports cycle throughput and tail latency per pair count.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.suite import isolate
+from exchanges.mock_exchange import load_settings
+
+def run_load(trading_bot, num_pairs, cycles, warmup):
+    import config
+    from exchanges import base_api
+
+    config.TRADING_PAIRS = [f"SYM{i:04d}/USDT" for i in range(num_pairs)]
+    trading_bot.open_positions.clear()
+    clients = trading_bot.create_exchange_clients()
+    for client in clients.values():
+        client.load_markets()
+    collector = base_api.MarketDataCollector(clients, max_workers_per_exchange=config.MARKET_DATA_MAX_WORKERS)
+    try:
+        for _ in range(warmup):
+            trading_bot.run_polling_cycle(collector)
+        errors_before = base_api.EXCHANGE_REQUEST_ERRORS.total()
+        incomplete_before = trading_bot.BOT_INCOMPLETE_QUOTES.total()
+        timings = []
+        for _ in range(cycles):
+            started = time.perf_counter()
+            trading_bot.run_polling_cycle(collector)
+            timings.append(time.perf_counter() - started)
+    finally:
+        collector.close()
+
+    timings = np.array(timings)
+    return {
+        'pairs': num_pairs,
+        'cycles': cycles,
+        'mean_seconds': float(timings.mean()),
+        'p50_seconds': float(np.percentile(timings, 50)),
+        'p95_seconds': float(np.percentile(timings, 95)),
+        'p99_seconds': float(np.percentile(timings, 99)),
+        'max_seconds': float(timings.max()),
+        'pairs_per_second': num_pairs * cycles / float(timings.sum()),
+        'request_errors': base_api.EXCHANGE_REQUEST_ERRORS.total() - errors_before,
+        'incomplete_quotes': trading_bot.BOT_INCOMPLETE_QUOTES.total() - incomplete_before,
+        'open_positions': len(trading_bot.open_positions),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--settings', help='Mock exchange settings JSON (see exchanges/mock_exchange.py)')
+    parser.add_argument('--latency-ms', type=float, help='Median request latency')
+    parser.add_argument('--latency-sigma', type=float, help='Log-normal sigma of the latency')
+    parser.add_argument('--error-rate', type=float, help='Fraction of requests failing with 503')
+    parser.add_argument('--rate-limit-rate', type=float, help='Fraction of requests failing with 429')
+    parser.add_argument('--timeout-rate', type=float, help='Fraction of requests timing out')
+    parser.add_argument('--no-bulk', action='store_true', help='Disable the bulk endpoints (per-symbol requests only)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    settings = load_settings(args.settings)
+    settings['symbols'] = max(settings['symbols'], max(args.pairs))
+    overrides = {
+        'latency_median_ms': args.latency_ms, 'latency_sigma': args.latency_sigma, 'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate, 'timeout_rate': args.timeout_rate,
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    if args.no_bulk:
+        settings['bulk_endpoints'] = False
+
+    # Injected failures are counted in the results instead of logged
+    logging.disable(logging.ERROR)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='funding-load-') as workdir:
+        settings_path = os.path.join(workdir, 'mock_settings.json')
+        with open(settings_path, 'w', encoding='utf-8') as f:
+            json.dump(settings, f)
+
+        import config
+        config.EXCHANGE_BACKEND = 'mock'
+        config.MOCK_EXCHANGE_SETTINGS = settings_path
+        _, trading_bot = isolate(workdir, 'sqlite')
+
+        print(f"Mock latency {settings['latency_median_ms']}ms (sigma {settings['latency_sigma']}), "
+              f"429 {settings['rate_limit_rate']:.1%}, 503 {settings['error_rate']:.1%}, "
+              f"timeouts {settings['timeout_rate']:.1%}, bulk endpoints {'on' if settings['bulk_endpoints'] else 'off'}")
+        print(f"{'pairs':>6} {'cycles':>6} {'mean (s)':>9} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} "
+              f"{'max (s)':>8} {'pairs/s':>9} {'errors':>7} {'skipped':>8}")
+        for num_pairs in args.pairs:
+            result = run_load(trading_bot, num_pairs, args.cycles, args.warmup)
+            results.append(result)
+            print(f"{result['pairs']:>6} {result['cycles']:>6} {result['mean_seconds']:>9.3f} {result['p50_seconds']:>8.3f} "
+                  f"{result['p95_seconds']:>8.3f} {result['p99_seconds']:>8.3f} {result['max_seconds']:>8.3f} "
+                  f"{result['pairs_per_second']:>9.0f} {result['request_errors']:>7.0f} {result['incomplete_quotes']:>8.0f}",
+                  flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
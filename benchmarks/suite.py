@@ -0,0 +1,232 @@
+"""
+Offline benchmark suite for the dashboard and bot hot paths, with a regression check.
+
+    python -m benchmarks.suite --profile realistic                  # run and compare with the baseline
+    python -m benchmarks.suite --profile realistic --save-baseline  # record a new baseline
+    python -m benchmarks.suite --profile extreme --backend csv --threshold 0.5
+
+Synthetic trading_history.csv / all_funding_rates.csv files are generated in a
+temporary directory and imported into stores there, so nothing under /app/data
+is read or written and no network access is needed (the bot cycle runs against
+the mock exchanges of the load test, without latency or failures). Each case
+reports the best of --repeat runs.
+
+Baselines are stored per profile and backend in a JSON file (default
+benchmarks/baseline.json). A case regresses when it is more than --threshold
+(relative) and --min-delta (seconds) slower than its baseline; the exit status
+is 1 if any case regressed. Timings are machine specific, so record the baseline
+on the machine that runs the comparison.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from benchmarks.synthetic import make_funding_rows, make_trade_ledger, write_funding_csv, write_trade_csv
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# trades: ledger rows; symbols x settlements x 2 exchanges funding rows (plus as many
+# off-slot rows for filter_to_settlement_times); pairs: pairs evaluated per bot cycle
+PROFILES = {
+    'quick': {'trades': 10_000, 'symbols': 300, 'settlements': 30, 'pairs': 50},
+    'realistic': {'trades': 100_000, 'symbols': 300, 'settlements': 90, 'pairs': 300},
+    'extreme': {'trades': 1_000_000, 'symbols': 1_000, 'settlements': 270, 'pairs': 1_000},
+}
+
+def isolate(workdir, backend):
+    """
+    Points the trade store, funding store, event spool, position snapshot and
+    config channel at `workdir`. Must run before web_server and trading_bot are
+    imported, since both bind the process-wide trade store at import.
+    """
+    import config
+    from utils import event_stream, trade_store
+
+    config.TRADE_STORE_BACKEND = backend
+    config.TEST_MODE = True
+    trades_csv = os.path.join(workdir, 'trading_history.csv')
+    if backend == 'csv':
+        trade_store._trade_store = trade_store.CsvTradeStore(trades_csv)
+    else:
+        trade_store._trade_store = trade_store.SqliteTradeStore(os.path.join(workdir, 'trading_history.db'),
+                                                                legacy_csv=trades_csv)
+    event_stream._spool = event_stream.EventSpool(os.path.join(workdir, 'events.jsonl'))
+
+    import trading_bot
+    import web_server
+    from utils.config_channel import ConfigListener
+    from utils.funding_store import FundingRateStore
+    from utils.position_snapshot import PositionSnapshotWriter
+
+    web_server.funding_store = FundingRateStore(os.path.join(workdir, 'funding_rates.db'),
+                                                legacy_csv=os.path.join(workdir, 'all_funding_rates.csv'))
+    web_server.POSITION_SNAPSHOT_FILE = os.path.join(workdir, 'positions_snapshot.json')
+    trading_bot.position_snapshot = PositionSnapshotWriter(web_server.POSITION_SNAPSHOT_FILE)
+    # Never pick up config snapshots published to the real bot
+    trading_bot.config_listener = ConfigListener(os.path.join(workdir, 'config_snapshot.json'),
+                                                 os.path.join(workdir, 'config_applied.json'),
+                                                 os.path.join(workdir, 'bot_control.sock'))
+    return web_server, trading_bot
+
+def best_of(func, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def timed_once(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+def run_suite(profile, backend, repeat, workdir):
+    sizes = PROFILES[profile]
+    results = {}
+
+    def record(name, seconds, rows):
+        results[name] = {'seconds': round(seconds, 6), 'rows': rows}
+        print(f"  {name:<28} {rows:>9} rows {seconds:>10.4f}s", flush=True)
+
+    ledger = make_trade_ledger(sizes['trades'])
+    write_trade_csv(os.path.join(workdir, 'trading_history.csv'), ledger)
+    funding_rows = make_funding_rows(sizes['symbols'], sizes['settlements'], jitter_seconds=3600)
+    write_funding_csv(os.path.join(workdir, 'all_funding_rates.csv'), funding_rows)
+    settled_rows = funding_rows[::2]  # make_funding_rows emits each on-slot row before its off-slot twin
+
+    web_server, trading_bot = isolate(workdir, backend)
+    client = web_server.app.test_client()
+
+    # One-off imports of the legacy CSV files, as on the first start after an upgrade
+    record('import_trade_history', timed_once(web_server.trade_store.open_trades), len(ledger))
+    record('import_funding_rates', timed_once(web_server.funding_store.count), len(funding_rows))
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        response.get_data()  # drains streamed responses
+
+    # Dashboard endpoints, every request on a cold data cache
+    cold = web_server.data_cache.clear
+    record('history_open', best_of(lambda: get('/history/open'), repeat, cold), len(ledger))
+    record('history_closed_page', best_of(lambda: get('/history/closed?limit=50'), repeat, cold), len(ledger))
+    record('export_closed_trades', best_of(lambda: get('/api/export-closed-trades'), repeat, cold), len(ledger))
+
+    # Funding rate pipeline
+    record('filter_to_settlement_times',
+           best_of(lambda: web_server.filter_to_settlement_times(funding_rows), repeat), len(funding_rows))
+    record('perform_analysis', best_of(lambda: web_server.perform_analysis(settled_rows), repeat), len(settled_rows))
+    funding_frame = pd.DataFrame(settled_rows)
+    funding_frame['funding_rate'] = funding_frame['funding_rate'].astype(float)
+    record('perform_analysis_columns',
+           best_of(lambda: web_server.perform_analysis(funding_frame), repeat), len(funding_frame))
+
+    # Bot
+    record('rebuild_state_from_history',
+           best_of(trading_bot.rebuild_state_from_history, repeat, trading_bot.open_positions.clear), len(ledger))
+
+    from exchanges.base_api import MarketDataCollector
+    from exchanges.mock_exchange import MockExchange, MockMarket, load_settings
+    import config
+    pairs = [f"SYM{i:04d}/USDT" for i in range(sizes['pairs'])]
+    config.TRADING_PAIRS = pairs
+    # Same fake exchange as benchmarks.load_test, but instant and error free
+    mock_settings = load_settings()
+    mock_settings.update(symbols=len(pairs), latency_median_ms=0.0, rate_limit_rate=0.0, error_rate=0.0, timeout_rate=0.0)
+    market = MockMarket(mock_settings)
+    collector = MarketDataCollector({
+        'Gate.io': MockExchange('gateio', market),
+        'Bitget': MockExchange('bitget', market),
+    })
+    try:
+        record('bot_polling_cycle', best_of(lambda: trading_bot.run_polling_cycle(collector), repeat), len(pairs))
+    finally:
+        collector.close()
+    return results
+
+def load_baselines(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def compare(results, baseline, threshold, min_delta):
+    """Returns the names of the cases that regressed, printing a comparison table."""
+    regressions = []
+    print(f"\n  {'case':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"  {name:<28} {'-':>10} {result['seconds']:>10.4f} {'new':>8}")
+            continue
+        before, after = reference['seconds'], result['seconds']
+        change = (after - before) / before if before else 0.0
+        regressed = change > threshold and after - before > min_delta
+        flag = '  REGRESSION' if regressed else ''
+        print(f"  {name:<28} {before:>10.4f} {after:>10.4f} {change:>+7.0%}{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='realistic')
+    parser.add_argument('--backend', choices=['sqlite', 'csv'], default='sqlite')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative slowdown (0.25 = 25%%)')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='Ignore slowdowns smaller than this (seconds)')
+    parser.add_argument('--output', help='Also write the results of this run to this JSON file')
+    args = parser.parse_args()
+
+    # The bot and web server log every pair and request at INFO; that would dominate the timings
+    logging.disable(logging.INFO)
+
+    key = f"{args.profile}/{args.backend}"
+    print(f"Benchmark profile {key}: {PROFILES[args.profile]}")
+    with tempfile.TemporaryDirectory(prefix='funding-bench-') as workdir:
+        results = run_suite(args.profile, args.backend, args.repeat, workdir)
+
+    run = {
+        'recorded_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'sizes': PROFILES[args.profile],
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({key: run}, f, indent=2)
+
+    baselines = load_baselines(args.baseline)
+    regressions = []
+    if key in baselines:
+        regressions = compare(results, baselines[key]['results'], args.threshold, args.min_delta)
+    else:
+        print(f"\nNo baseline for {key} in {args.baseline}")
+
+    if args.save_baseline:
+        baselines[key] = run
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Saved baseline for {key} to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Synthetic data generators shared by the benchmarks. Everything is generated locally."""
+import numpy as np
+
+SETTLEMENT_SECONDS = 8 * 60 * 60
+EXCHANGE_NAMES = ['gateio', 'bitget', 'okx', 'binance', 'bybit', 'mexc']
+
+def make_symbols(num_symbols):
+    return [f"SYM{i:04d}USDT" for i in range(num_symbols)]
+
+def make_funding_rows(num_symbols=300, num_settlements=90, num_exchanges=2, jitter_seconds=0, seed=42):
+    """
+    Builds funding-rate rows in the format produced by fetch_gate_rates / fetch_bitget_rates
+    (epoch-second integer timestamps).
+
+    With `jitter_seconds` > 0, every settlement also gets a few off-slot records, which is
+    what filter_to_settlement_times has to discard.
+    """
+    rng = np.random.default_rng(seed)
+    exchanges = EXCHANGE_NAMES[:num_exchanges]
+    end_slot = 1_700_000_000 // SETTLEMENT_SECONDS * SETTLEMENT_SECONDS
+    slots = end_slot - SETTLEMENT_SECONDS * np.arange(num_settlements)[::-1]
+
+    rows = []
+    for symbol in make_symbols(num_symbols):
+        base = rng.normal(0.0001, 0.0003)
+        for exchange in exchanges:
+            rates = base + rng.normal(0, 0.0002, size=num_settlements)
+            for ts, rate in zip(slots.tolist(), rates.tolist()):
+                rows.append({
+                    'symbol': symbol, 'exchange': exchange,
+                    'timestamp': ts,
+                    'funding_rate': f"{rate:.8f}"
+                })
+                if jitter_seconds:
+                    offset = int(rng.integers(1, jitter_seconds))
+                    rows.append({
+                        'symbol': symbol, 'exchange': exchange,
+                        'timestamp': ts + offset,
+                        'funding_rate': f"{rate:.8f}"
+                    })
+    return rows
+
+def make_trade_ledger(num_rows=1_000_000, open_fraction=0.01, legacy_fraction=0.001, seed=42):
+    """
+    Builds a trade ledger DataFrame in the trade store format (FIELDNAMES columns,
+    naive UTC ISO timestamps, insertion order = time order) with `num_rows` rows.
+
+    Most trades have an OPEN and a CLOSE row; `open_fraction` of the trades are still
+    open and `legacy_fraction` of the rows are unpaired legacy records.
+    """
+    import pandas as pd
+    from utils.trade_store import FIELDNAMES
+
+    rng = np.random.default_rng(seed)
+    num_legacy = int(num_rows * legacy_fraction)
+    num_trades = int((num_rows - num_legacy) / (2 - open_fraction))
+    num_open = int(num_trades * open_fraction)
+    num_closed = num_trades - num_open
+    num_legacy = num_rows - 2 * num_closed - num_open
+
+    pairs = np.array([f"{symbol[:-4]}/USDT" for symbol in make_symbols(200)], dtype=object)
+    trade_pairs = pairs[rng.integers(0, len(pairs), size=num_trades)]
+    trade_ids = np.array([f"T{i:08d}" for i in range(num_trades)], dtype=object)
+    open_ts = 1_600_000_000 + np.sort(rng.uniform(0, 3 * 365 * 86400, size=num_trades))
+    close_ts = open_ts + rng.uniform(60, 7 * 86400, size=num_trades)
+    size = np.full(num_trades, 100.0)
+    short_open, long_open = rng.uniform(0.5, 2.0, size=(2, num_trades)).round(6)
+    short_close = (short_open * rng.normal(1, 0.01, size=num_trades)).round(6)
+    long_close = (long_open * rng.normal(1, 0.01, size=num_trades)).round(6)
+    rate_diff = rng.uniform(5, 50, size=num_trades).round(4)
+    closed = slice(0, num_closed)
+
+    def block(ts, action, idx, short_price, long_price, **extra):
+        count = len(ts)
+        return pd.DataFrame({
+            'timestamp_utc': ts, 'pair': trade_pairs[idx], 'action': action,
+            'short_exchange': 'Gate.io', 'long_exchange': 'Bitget', 'size_usdt': size[idx],
+            'short_price': short_price, 'long_price': long_price,
+            'funding_rate_diff_annualized_percent': rate_diff[idx],
+            'close_reason': extra.get('close_reason', [None] * count),
+            'realized_pnl': extra.get('realized_pnl', np.full(count, np.nan)),
+            'funding_fee_profit': extra.get('funding_fee_profit', np.full(count, np.nan)),
+            'trade_id': trade_ids[idx],
+        })
+
+    open_rows = block(open_ts, 'OPEN', slice(None), short_open, long_open)
+    close_rows = block(
+        close_ts[closed], 'CLOSE', closed, short_close[closed], long_close[closed],
+        close_reason=np.array(['Funding rate converged'] * num_closed, dtype=object),
+        realized_pnl=rng.normal(0, 1, size=num_closed).round(2),
+        funding_fee_profit=rng.normal(0.5, 0.5, size=num_closed).round(2),
+    )
+    legacy_idx = rng.integers(0, num_trades, size=num_legacy)
+    legacy_rows = block(open_ts[legacy_idx] - 86400, 'OPEN', legacy_idx, short_open[legacy_idx], long_open[legacy_idx])
+    legacy_rows['trade_id'] = [f"legacy_{i}" for i in range(num_legacy)]
+
+    ledger = pd.concat([open_rows, close_rows, legacy_rows], ignore_index=True)
+    ledger = ledger.sort_values('timestamp_utc', kind='stable', ignore_index=True)
+    ledger['timestamp_utc'] = np.datetime_as_string((ledger['timestamp_utc'].to_numpy() * 1e6).astype('datetime64[us]'))
+    return ledger[FIELDNAMES]
+
+def write_funding_csv(path, rows):
+    """Writes funding rows in the legacy all_funding_rates.csv format (ISO timestamps)."""
+    import pandas as pd
+
+    frame = pd.DataFrame(rows, columns=['symbol', 'exchange', 'timestamp', 'funding_rate'])
+    frame['timestamp'] = np.datetime_as_string(frame['timestamp'].to_numpy().astype('datetime64[s]')) + 'Z'
+    frame.to_csv(path, index=False)
+
+def write_trade_csv(path, ledger):
+    """Writes a make_trade_ledger() frame in the trading_history.csv format."""
+    ledger.to_csv(path, index=False)
+
@@ -1,6 +1,8 @@
 import os
 import json
 
+from utils.atomic_file import atomic_write_json
+
 # ------------------ API Keys ------------------
 # IMPORTANT: Load API keys from environment variables for security.
 # On Zeabur, you will set these in the service's "Variables" section.
@@ -12,7 +14,20 @@ BITGET_API_KEY = os.environ.get("BITGET_API_KEY")
 BITGET_SECRET_KEY = os.environ.get("BITGET_SECRET_KEY")
 BITGET_API_PASSPHRASE = os.environ.get("BITGET_API_PASSPHRASE")
 
-DATA_DIR = '/app/data'
+def exchange_credentials(exchange_id):
+    """任一交易所的 API 金鑰：{ID}_API_KEY、{ID}_SECRET_KEY，需要時加上 {ID}_API_PASSPHRASE（如 BITGET_API_PASSPHRASE）"""
+    prefix = exchange_id.upper()
+    credentials = {
+        'apiKey': os.environ.get(f"{prefix}_API_KEY"),
+        'secret': os.environ.get(f"{prefix}_SECRET_KEY"),
+    }
+    passphrase = os.environ.get(f"{prefix}_API_PASSPHRASE")
+    if passphrase:
+        credentials['password'] = passphrase
+    return credentials
+
+# 所有資料檔（設定、交易紀錄、資金費率、IPC 檔案）所在的資料夾
+DATA_DIR = os.environ.get("DATA_DIR", "/app/data")
 CONFIG_FILE = os.path.join(DATA_DIR, 'config.json')
 
 # 確保資料夾存在
@@ -56,39 +71,83 @@ def get_env_value(key, default_value, value_type=str):
         print(f"Warning: Invalid environment variable {key}={env_value}, using default: {default_value}")
         return default_value
 
+# ------------------ Runtime Settings ------------------
+# 執行期設定：只從環境變數讀取，不寫入 config.json，也不在網頁上調整
+# 每個交易所同時進行中的行情請求數上限
+MARKET_DATA_MAX_WORKERS = get_env_value("MARKET_DATA_MAX_WORKERS", 8, int)
+# 行情模式：polling（定時輪詢）或 streaming（WebSocket 即時推送）
+MARKET_DATA_MODE = get_env_value("MARKET_DATA_MODE", "polling", str).lower()
+# 串流模式的本地回放檔（JSON lines 或 CSV），設定後不連線交易所
+STREAM_REPLAY_FILE = get_env_value("STREAM_REPLAY_FILE", "", str)
+# 回放速度倍率，0 表示盡快回放
+STREAM_REPLAY_SPEED = get_env_value("STREAM_REPLAY_SPEED", 0.0, float)
+# 串流模式下以 REST 補抓資金費率的間隔（秒）
+STREAM_FUNDING_REFRESH_SECONDS = get_env_value("STREAM_FUNDING_REFRESH_SECONDS", 60, int)
+# 報價超過此秒數未更新則視為過期，不用於開平倉判斷
+STREAM_MAX_QUOTE_AGE_SECONDS = get_env_value("STREAM_MAX_QUOTE_AGE_SECONDS", 30, int)
+# 資金費率歷史資料更新時的並行請求數上限
+FUNDING_FETCH_MAX_WORKERS = get_env_value("FUNDING_FETCH_MAX_WORKERS", 8, int)
+# 網頁伺服器資料快取上限（項目數與記憶體 MB）
+DATA_CACHE_MAX_ENTRIES = get_env_value("DATA_CACHE_MAX_ENTRIES", 256, int)
+DATA_CACHE_MAX_MB = get_env_value("DATA_CACHE_MAX_MB", 256, int)
+# 交易紀錄儲存方式：sqlite（預設，首次啟動時自動匯入舊 CSV）或 csv
+TRADE_STORE_BACKEND = get_env_value("TRADE_STORE_BACKEND", "sqlite", str).lower()
+# 機器人持倉快照超過此秒數未更新即視為過期，網頁改由交易紀錄顯示未平倉交易
+POSITION_SNAPSHOT_MAX_AGE_SECONDS = get_env_value("POSITION_SNAPSHOT_MAX_AGE_SECONDS", 180, int)
+# 交易所連線：live（真實交易所）或 mock（本機模擬交易所，用於壓力測試與離線執行）
+EXCHANGE_BACKEND = get_env_value("EXCHANGE_BACKEND", "live", str).lower()
+# 模擬交易所設定檔（JSON：延遲分佈、錯誤與 429 比例、價格腳本等），未設定則使用預設值
+MOCK_EXCHANGE_SETTINGS = get_env_value("MOCK_EXCHANGE_SETTINGS", "", str)
+# 資金費率歷史資料的 REST API 位址（可指向模擬交易所伺服器）
+GATEIO_REST_URL = get_env_value("GATEIO_REST_URL", "https://api.gateio.ws", str).rstrip('/')
+BITGET_REST_URL = get_env_value("BITGET_REST_URL", "https://api.bitget.com", str).rstrip('/')
+# 套利交易所（CCXT id，逗號分隔，至少兩個），每個交易對在其中挑選做空與做多的交易所
+ARBITRAGE_EXCHANGES = [name.strip().lower() for name in get_env_value("ARBITRAGE_EXCHANGES", "gateio,bitget", str).split(',') if name.strip()]
+# 管理端點（效能分析）的存取權杖；未設定時這些端點關閉
+ADMIN_TOKEN = get_env_value("ADMIN_TOKEN", "", str)
+
 # 參數全域變數（初始化為預設值）
 for k, v in DEFAULT_CONFIG.items():
     globals()[k] = v
 
-def load_config_from_file():
-    """從 config.json 讀取所有參數，若不存在則用預設值"""
-    global TRADING_PAIRS, MIN_FUNDING_RATE_DIFFERENCE, CLOSE_FUNDING_RATE_DIFFERENCE
-    global MAX_PRICE_SPREAD, POSITION_SIZE_USDT, MAX_TOTAL_EXPOSURE_USDT
-    global STOP_LOSS_USDT, MAX_HOLDING_PRICE_SPREAD, MAX_HOLDING_DURATION_HOURS
-    global MIN_HOLDING_HOURS_FOR_REVERSAL, LOOP_INTERVAL_SECONDS, TEST_MODE
-    global WEB_SERVER_PORT
-    
+# 目前套用中的設定版本（網頁發布的設定快照編號；0 表示直接讀取 config.json）
+CONFIG_VERSION = 0
+
+def resolve_config(config):
+    """由 config.json 內容計算實際參數值（環境變數優先），回傳新的 dict，不修改全域變數"""
+    return {
+        "TRADING_PAIRS": get_env_value("TRADING_PAIRS", config.get("TRADING_PAIRS", DEFAULT_CONFIG["TRADING_PAIRS"]), list),
+        "MIN_FUNDING_RATE_DIFFERENCE": get_env_value("MIN_FUNDING_RATE_DIFFERENCE", float(config.get("MIN_FUNDING_RATE_DIFFERENCE", DEFAULT_CONFIG["MIN_FUNDING_RATE_DIFFERENCE"])), float),
+        "CLOSE_FUNDING_RATE_DIFFERENCE": get_env_value("CLOSE_FUNDING_RATE_DIFFERENCE", float(config.get("CLOSE_FUNDING_RATE_DIFFERENCE", DEFAULT_CONFIG["CLOSE_FUNDING_RATE_DIFFERENCE"])), float),
+        "MAX_PRICE_SPREAD": get_env_value("MAX_PRICE_SPREAD", float(config.get("MAX_PRICE_SPREAD", DEFAULT_CONFIG["MAX_PRICE_SPREAD"])), float),
+        "POSITION_SIZE_USDT": get_env_value("POSITION_SIZE_USDT", float(config.get("POSITION_SIZE_USDT", DEFAULT_CONFIG["POSITION_SIZE_USDT"])), float),
+        "MAX_TOTAL_EXPOSURE_USDT": get_env_value("MAX_TOTAL_EXPOSURE_USDT", float(config.get("MAX_TOTAL_EXPOSURE_USDT", DEFAULT_CONFIG["MAX_TOTAL_EXPOSURE_USDT"])), float),
+        "STOP_LOSS_USDT": get_env_value("STOP_LOSS_USDT", float(config.get("STOP_LOSS_USDT", DEFAULT_CONFIG["STOP_LOSS_USDT"])), float),
+        "MAX_HOLDING_PRICE_SPREAD": get_env_value("MAX_HOLDING_PRICE_SPREAD", float(config.get("MAX_HOLDING_PRICE_SPREAD", DEFAULT_CONFIG["MAX_HOLDING_PRICE_SPREAD"])), float),
+        "MAX_HOLDING_DURATION_HOURS": get_env_value("MAX_HOLDING_DURATION_HOURS", int(config.get("MAX_HOLDING_DURATION_HOURS", DEFAULT_CONFIG["MAX_HOLDING_DURATION_HOURS"])), int),
+        "MIN_HOLDING_HOURS_FOR_REVERSAL": get_env_value("MIN_HOLDING_HOURS_FOR_REVERSAL", float(config.get("MIN_HOLDING_HOURS_FOR_REVERSAL", DEFAULT_CONFIG["MIN_HOLDING_HOURS_FOR_REVERSAL"])), float),
+        "LOOP_INTERVAL_SECONDS": get_env_value("LOOP_INTERVAL_SECONDS", int(config.get("LOOP_INTERVAL_SECONDS", DEFAULT_CONFIG["LOOP_INTERVAL_SECONDS"])), int),
+        "TEST_MODE": get_env_value("TEST_MODE", bool(config.get("TEST_MODE", DEFAULT_CONFIG["TEST_MODE"])), bool),
+        "WEB_SERVER_PORT": get_env_value("WEB_SERVER_PORT", int(config.get("WEB_SERVER_PORT", DEFAULT_CONFIG["WEB_SERVER_PORT"])), int),
+    }
+
+def apply_config(values, version=0):
+    """一次設定所有參數全域變數（機器人只在兩次交易對評估之間呼叫）"""
+    global CONFIG_VERSION
+    globals().update({key: values[key] for key in DEFAULT_CONFIG})
+    CONFIG_VERSION = version
+
+def read_config_file():
+    """讀取 config.json 內容，若不存在則寫入並回傳預設值"""
     if not os.path.exists(CONFIG_FILE):
         save_config_to_file(DEFAULT_CONFIG)
-        config = DEFAULT_CONFIG.copy()
-    else:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-    
-    # 設定全域變數，優先使用環境變數
-    TRADING_PAIRS = get_env_value("TRADING_PAIRS", config.get("TRADING_PAIRS", DEFAULT_CONFIG["TRADING_PAIRS"]), list)
-    MIN_FUNDING_RATE_DIFFERENCE = get_env_value("MIN_FUNDING_RATE_DIFFERENCE", float(config.get("MIN_FUNDING_RATE_DIFFERENCE", DEFAULT_CONFIG["MIN_FUNDING_RATE_DIFFERENCE"])), float)
-    CLOSE_FUNDING_RATE_DIFFERENCE = get_env_value("CLOSE_FUNDING_RATE_DIFFERENCE", float(config.get("CLOSE_FUNDING_RATE_DIFFERENCE", DEFAULT_CONFIG["CLOSE_FUNDING_RATE_DIFFERENCE"])), float)
-    MAX_PRICE_SPREAD = get_env_value("MAX_PRICE_SPREAD", float(config.get("MAX_PRICE_SPREAD", DEFAULT_CONFIG["MAX_PRICE_SPREAD"])), float)
-    POSITION_SIZE_USDT = get_env_value("POSITION_SIZE_USDT", float(config.get("POSITION_SIZE_USDT", DEFAULT_CONFIG["POSITION_SIZE_USDT"])), float)
-    MAX_TOTAL_EXPOSURE_USDT = get_env_value("MAX_TOTAL_EXPOSURE_USDT", float(config.get("MAX_TOTAL_EXPOSURE_USDT", DEFAULT_CONFIG["MAX_TOTAL_EXPOSURE_USDT"])), float)
-    STOP_LOSS_USDT = get_env_value("STOP_LOSS_USDT", float(config.get("STOP_LOSS_USDT", DEFAULT_CONFIG["STOP_LOSS_USDT"])), float)
-    MAX_HOLDING_PRICE_SPREAD = get_env_value("MAX_HOLDING_PRICE_SPREAD", float(config.get("MAX_HOLDING_PRICE_SPREAD", DEFAULT_CONFIG["MAX_HOLDING_PRICE_SPREAD"])), float)
-    MAX_HOLDING_DURATION_HOURS = get_env_value("MAX_HOLDING_DURATION_HOURS", int(config.get("MAX_HOLDING_DURATION_HOURS", DEFAULT_CONFIG["MAX_HOLDING_DURATION_HOURS"])), int)
-    MIN_HOLDING_HOURS_FOR_REVERSAL = get_env_value("MIN_HOLDING_HOURS_FOR_REVERSAL", float(config.get("MIN_HOLDING_HOURS_FOR_REVERSAL", DEFAULT_CONFIG["MIN_HOLDING_HOURS_FOR_REVERSAL"])), float)
-    LOOP_INTERVAL_SECONDS = get_env_value("LOOP_INTERVAL_SECONDS", int(config.get("LOOP_INTERVAL_SECONDS", DEFAULT_CONFIG["LOOP_INTERVAL_SECONDS"])), int)
-    TEST_MODE = get_env_value("TEST_MODE", bool(config.get("TEST_MODE", DEFAULT_CONFIG["TEST_MODE"])), bool)
-    WEB_SERVER_PORT = get_env_value("WEB_SERVER_PORT", int(config.get("WEB_SERVER_PORT", DEFAULT_CONFIG["WEB_SERVER_PORT"])), int)
+        return DEFAULT_CONFIG.copy()
+    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_config_from_file():
+    """從 config.json 讀取所有參數，若不存在則用預設值"""
+    apply_config(resolve_config(read_config_file()))
 
 def save_config_to_file(config_dict=None):
     """將目前全域參數或指定 dict 寫入 config.json"""
@@ -108,8 +167,8 @@ def save_config_to_file(config_dict=None):
             "TEST_MODE": TEST_MODE,
             "WEB_SERVER_PORT": WEB_SERVER_PORT
         }
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config_dict, f, indent=4)
+    # 先寫入暫存檔再改名，讀取端不會讀到寫到一半的檔案
+    atomic_write_json(CONFIG_FILE, config_dict, indent=4)
 
 def reload_config():
     load_config_from_file()
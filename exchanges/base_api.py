@@ -1,13 +1,75 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import ccxt
 
-def get_market_data(api_client, symbol):
+from utils.metrics import Counter, Histogram
+from utils.rate_limiter import bucket_for_exchange
+
+EXCHANGE_REQUEST_SECONDS = Histogram(
+    'exchange_request_seconds', 'Latency of exchange API calls made for market data.',
+    ('exchange', 'endpoint'))
+EXCHANGE_REQUEST_ERRORS = Counter(
+    'exchange_request_errors_total', 'Failed exchange API calls by kind (timeout, rate_limit, network, exchange, other).',
+    ('exchange', 'endpoint', 'kind'))
+
+def call_exchange(api_client, endpoint, *args):
+    """Calls `api_client.<endpoint>(*args)`, recording its latency and failures."""
+    started = time.perf_counter()
+    try:
+        return getattr(api_client, endpoint)(*args)
+    except Exception as e:
+        if isinstance(e, ccxt.RequestTimeout):
+            kind = 'timeout'
+        elif isinstance(e, ccxt.RateLimitExceeded):
+            kind = 'rate_limit'
+        elif isinstance(e, ccxt.NetworkError):
+            kind = 'network'
+        elif isinstance(e, ccxt.ExchangeError):
+            kind = 'exchange'
+        else:
+            kind = 'other'
+        EXCHANGE_REQUEST_ERRORS.labels(api_client.name, endpoint, kind).inc()
+        raise
+    finally:
+        EXCHANGE_REQUEST_SECONDS.labels(api_client.name, endpoint).observe(time.perf_counter() - started)
+
+def build_market_data(api_client, symbol, ticker_data, funding_rate_data):
+    """
+    Normalizes a CCXT ticker and funding-rate structure into the bot's market data format.
+
+    Returns:
+        A dictionary containing all relevant market data, or None if essential fields are missing.
+    """
+    market_data = {
+        "funding_rate": funding_rate_data.get('fundingRate'),
+        "mark_price": ticker_data.get('markPrice'),
+        "last_price": ticker_data.get('last'),
+        "index_price": ticker_data.get('indexPrice')
+    }
+
+    # 如果 mark_price 為 None，使用 last_price 作為備用
+    if market_data["mark_price"] is None and market_data["last_price"] is not None:
+        market_data["mark_price"] = market_data["last_price"]
+        logging.info(f"Using last_price as mark_price for {api_client.name} {symbol}: {market_data['mark_price']}")
+
+    # Validate that we got the essential data
+    if market_data["funding_rate"] is None or market_data["mark_price"] is None:
+        logging.warning(f"Incomplete data received from {api_client.name} for {symbol}. Data: {market_data}")
+        return None
+
+    return market_data
+
+def get_market_data(api_client, symbol, ticker_data=None, funding_rate_data=None):
     """
     Fetches market data (ticker and funding rate) for a given symbol from a CCXT-compatible exchange.
     
     Args:
         api_client: An initialized CCXT API client instance.
         symbol: The contract symbol in CCXT format (e.g., 'SNT/USDT:USDT').
+        ticker_data: Optional ticker already obtained from a bulk call; fetched if omitted.
+        funding_rate_data: Optional funding rate already obtained from a bulk call; fetched if omitted.
 
     Returns:
         A dictionary containing all relevant market data, or None if an error occurs.
@@ -18,27 +80,12 @@ def get_market_data(api_client, symbol):
         
     try:
         # The symbol format (e.g., SNT/USDT:USDT) should tell CCXT it's a swap market.
-        ticker_data = api_client.fetch_ticker(symbol)
-        funding_rate_data = api_client.fetch_funding_rate(symbol)
+        if ticker_data is None:
+            ticker_data = call_exchange(api_client, 'fetch_ticker', symbol)
+        if funding_rate_data is None:
+            funding_rate_data = call_exchange(api_client, 'fetch_funding_rate', symbol)
         
-        market_data = {
-            "funding_rate": funding_rate_data.get('fundingRate'),
-            "mark_price": ticker_data.get('markPrice'),
-            "last_price": ticker_data.get('last'),
-            "index_price": ticker_data.get('indexPrice')
-        }
-
-        # 如果 mark_price 為 None，使用 last_price 作為備用
-        if market_data["mark_price"] is None and market_data["last_price"] is not None:
-            market_data["mark_price"] = market_data["last_price"]
-            logging.info(f"Using last_price as mark_price for {api_client.name} {symbol}: {market_data['mark_price']}")
-
-        # Validate that we got the essential data
-        if market_data["funding_rate"] is None or market_data["mark_price"] is None:
-            logging.warning(f"Incomplete data received from {api_client.name} for {symbol}. Data: {market_data}")
-            return None
-
-        return market_data
+        return build_market_data(api_client, symbol, ticker_data, funding_rate_data)
         
     except ccxt.NetworkError as e:
         logging.error(f"CCXT NetworkError for {api_client.name} on {symbol}: {e}")
@@ -48,4 +95,136 @@ def get_market_data(api_client, symbol):
         return None
     except Exception as e:
         logging.error(f"An unexpected error occurred while fetching data from {api_client.name} for {symbol}: {e}", exc_info=True)
-        return None 
\ No newline at end of file
+        return None 
+
+def fetch_bulk_market_data(api_client, symbols):
+    """
+    Fetches tickers and funding rates for many symbols with one bulk request each
+    (`fetch_tickers` / `fetch_funding_rates`).
+
+    Bulk endpoints are optional: if the exchange does not support one, or the call
+    fails, that part is simply left empty and the caller falls back to per-symbol requests.
+
+    Returns:
+        A tuple (tickers, funding_rates), each a dictionary indexed by CCXT symbol.
+    """
+    tickers = {}
+    funding_rates = {}
+    has = getattr(api_client, 'has', {}) or {}
+
+    if has.get('fetchTickers'):
+        try:
+            tickers = call_exchange(api_client, 'fetch_tickers', symbols) or {}
+        except ccxt.BaseError as e:
+            logging.warning(f"Bulk fetch_tickers failed on {api_client.name}, falling back to per-symbol calls: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error in bulk fetch_tickers on {api_client.name}: {e}", exc_info=True)
+
+    if has.get('fetchFundingRates'):
+        try:
+            funding_rates = call_exchange(api_client, 'fetch_funding_rates', symbols) or {}
+        except ccxt.BaseError as e:
+            logging.warning(f"Bulk fetch_funding_rates failed on {api_client.name}, falling back to per-symbol calls: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error in bulk fetch_funding_rates on {api_client.name}: {e}", exc_info=True)
+
+    return tickers, funding_rates
+
+class MarketDataCollector:
+    """
+    Collects market data for many symbols on several exchanges concurrently.
+
+    Each exchange is first asked for the whole market with its bulk ticker and
+    funding-rate endpoints, so a cycle normally costs two requests per exchange.
+    Symbols the bulk calls did not cover, or covered with incomplete data, are
+    fetched one by one on a bounded per-exchange thread pool, throttled by a
+    token bucket so no venue is called faster than its declared rate limit. The executors are created once and
+    reused for every cycle of the bot loop.
+    """
+
+    def __init__(self, exchange_clients, max_workers_per_exchange=8):
+        """
+        Args:
+            exchange_clients: Dict mapping an exchange name (e.g. 'Gate.io') to its CCXT client.
+            max_workers_per_exchange: Maximum number of in-flight requests per exchange.
+        """
+        self.exchange_clients = dict(exchange_clients)
+        self.executors = {
+            name: ThreadPoolExecutor(max_workers=max_workers_per_exchange, thread_name_prefix=f"md-{name}")
+            for name in self.exchange_clients
+        }
+        self.rate_limiters = {
+            name: bucket_for_exchange(client, capacity=max_workers_per_exchange)
+            for name, client in self.exchange_clients.items()
+        }
+
+    def _fetch_bulk(self, exchange_name, symbols):
+        # One token per bulk request (tickers + funding rates)
+        self.rate_limiters[exchange_name].acquire(2)
+        return fetch_bulk_market_data(self.exchange_clients[exchange_name], symbols)
+
+    def _fetch_single(self, exchange_name, symbol, ticker_data, funding_rate_data):
+        missing_requests = (ticker_data is None) + (funding_rate_data is None)
+        if missing_requests:
+            self.rate_limiters[exchange_name].acquire(missing_requests)
+        return get_market_data(self.exchange_clients[exchange_name], symbol, ticker_data, funding_rate_data)
+
+    def collect(self, symbols):
+        """
+        Fetches market data for every symbol on every exchange in parallel.
+
+        Returns:
+            A dictionary { symbol: { exchange_name: market_data or None } } covering
+            every requested symbol, so callers always receive a complete snapshot.
+        """
+        snapshot = {symbol: {name: None for name in self.exchange_clients} for symbol in symbols}
+
+        # Stage 1: one bulk request pair per exchange, all exchanges at once
+        bulk_futures = {
+            executor.submit(self._fetch_bulk, exchange_name, symbols): exchange_name
+            for exchange_name, executor in self.executors.items()
+        }
+        bulk_results = {}
+        for future in as_completed(bulk_futures):
+            exchange_name = bulk_futures[future]
+            try:
+                bulk_results[exchange_name] = future.result()
+            except Exception as e:
+                logging.error(f"Bulk market data task failed for {exchange_name}: {e}", exc_info=True)
+                bulk_results[exchange_name] = ({}, {})
+
+        # Stage 2: build every symbol, only hitting the network for what the bulk calls missed
+        futures = {}
+        fallback_counts = {name: 0 for name in self.exchange_clients}
+        for exchange_name, executor in self.executors.items():
+            tickers, funding_rates = bulk_results[exchange_name]
+            for symbol in symbols:
+                ticker_data = tickers.get(symbol)
+                funding_rate_data = funding_rates.get(symbol)
+                if ticker_data is not None and funding_rate_data is not None:
+                    market_data = build_market_data(
+                        self.exchange_clients[exchange_name], symbol, ticker_data, funding_rate_data
+                    )
+                    if market_data is not None:
+                        snapshot[symbol][exchange_name] = market_data
+                        continue
+                    # Incomplete bulk entry (e.g. no mark price): ask for both again per symbol
+                    ticker_data = funding_rate_data = None
+                fallback_counts[exchange_name] += 1
+                futures[executor.submit(self._fetch_single, exchange_name, symbol, ticker_data, funding_rate_data)] = (symbol, exchange_name)
+
+        for exchange_name, count in fallback_counts.items():
+            if count:
+                logging.info(f"{exchange_name}: {count}/{len(symbols)} symbols not covered by bulk endpoints, using per-symbol requests.")
+
+        for future in as_completed(futures):
+            symbol, exchange_name = futures[future]
+            try:
+                snapshot[symbol][exchange_name] = future.result()
+            except Exception as e:
+                logging.error(f"Market data task failed for {exchange_name} {symbol}: {e}", exc_info=True)
+        return snapshot
+
+    def close(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
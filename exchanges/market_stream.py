@@ -0,0 +1,288 @@
+import asyncio
+import csv
+import json
+import logging
+import threading
+import time
+
+QUOTE_FIELDS = ('funding_rate', 'mark_price', 'last_price', 'index_price')
+# A websocket feed gives up after this many consecutive errors, so the bot can fall back to polling
+MAX_CONSECUTIVE_STREAM_ERRORS = 5
+
+class QuoteBook:
+    """
+    Thread-safe in-memory book of the latest quote per (symbol, exchange).
+
+    Feeds call `update()` from their own threads; the consumer calls
+    `wait_for_changes()` to receive the symbols whose quotes changed since the
+    last call. Repeated updates to the same symbol are coalesced, so a slow
+    consumer always evaluates the freshest quote instead of a backlog. A replay
+    feed instead waits with `wait_until_consumed()` before its next tick.
+
+    Quote ages are measured in epoch seconds of the feed's clock: the event
+    timestamps of a replay, the wall clock for live feeds.
+    """
+
+    def __init__(self, exchange_names):
+        self.exchange_names = list(exchange_names)
+        self._quotes = {}
+        self._dirty = []
+        self._dirty_set = set()
+        self._consumer_idle = False
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def update(self, exchange_name, symbol, timestamp=None, **fields):
+        """
+        Merges the non-None quote fields into the book. `timestamp` is the event
+        time in epoch seconds (default: now). Returns True if anything changed.
+        """
+        with self._cond:
+            quotes = self._quotes.setdefault(symbol, {})
+            if exchange_name not in quotes:
+                quotes[exchange_name] = dict.fromkeys(QUOTE_FIELDS)
+                quotes[exchange_name]['updated_at'] = 0.0
+            quote = quotes[exchange_name]
+            changed = False
+            for key in QUOTE_FIELDS:
+                value = fields.get(key)
+                if value is not None and quote[key] != value:
+                    quote[key] = value
+                    changed = True
+            if not changed:
+                return False
+
+            quote['updated_at'] = time.time() if timestamp is None else timestamp
+            if symbol not in self._dirty_set:
+                self._dirty_set.add(symbol)
+                self._dirty.append(symbol)
+                self._cond.notify_all()
+            return True
+
+    def get(self, symbol, max_age=None, now=None):
+        """
+        Returns { exchange_name: market_data } for the exchanges holding a usable quote.
+        Quotes older than `max_age` seconds at `now` (default: the wall clock), or
+        missing a price or funding rate, are left out.
+        """
+        now = time.time() if now is None else now
+        result = {}
+        with self._cond:
+            for exchange_name, quote in self._quotes.get(symbol, {}).items():
+                if max_age is not None and now - quote['updated_at'] > max_age:
+                    continue
+                market_data = {key: quote[key] for key in QUOTE_FIELDS}
+                if market_data['mark_price'] is None:
+                    market_data['mark_price'] = market_data['last_price']
+                if market_data['funding_rate'] is None or market_data['mark_price'] is None:
+                    continue
+                result[exchange_name] = market_data
+        return result
+
+    def wait_for_changes(self, timeout=None):
+        """
+        Blocks until at least one symbol changed (or timeout, or the feed closed the
+        book) and returns the changed symbols. Calling it again signals that the
+        previous batch has been handled.
+        """
+        with self._cond:
+            if not self._dirty and not self.closed:
+                self._consumer_idle = True
+                self._cond.notify_all()
+                self._cond.wait(timeout)
+            self._consumer_idle = False
+            changed, self._dirty = self._dirty, []
+            self._dirty_set.clear()
+            return changed
+
+    def wait_until_consumed(self, timeout=None):
+        """Blocks until the consumer has handled every change and waits for more. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._dirty and self._consumer_idle, timeout)
+
+    def close(self):
+        """Called by the feed when it stops; wakes the consumer up."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class ReplayFeed:
+    """
+    Plays recorded quotes back into a QuoteBook, for offline testing of the streaming mode.
+
+    The file is JSON lines or CSV with the columns `timestamp` (epoch seconds),
+    `exchange`, `symbol` and any of `mark_price`, `funding_rate`, `last_price`,
+    `index_price`, in time order. Events are delivered one timestamp at a time,
+    and the next timestamp only once the consumer has evaluated the previous
+    one, so no tick is merged into a later one. `now()` is the timestamp being
+    replayed, which the bot uses as its clock, so holding times and quote ages
+    follow the recording. With `speed=0` events are replayed as fast as
+    possible, otherwise the recorded gaps are divided by `speed`.
+    """
+
+    def __init__(self, path, speed=0.0):
+        self.path = path
+        self.speed = speed
+        self.symbols = []
+        self._now = None
+        self._stop = threading.Event()
+
+    def now(self):
+        return time.time() if self._now is None else self._now
+
+    def _read_events(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            if self.path.endswith('.csv'):
+                yield from csv.DictReader(f)
+            else:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def _wait_until_consumed(self, book):
+        while not self._stop.is_set() and not book.wait_until_consumed(timeout=1.0):
+            pass
+
+    def run(self, book):
+        count = 0
+        for event in self._read_events():
+            if self._stop.is_set():
+                break
+            ts = float(event['timestamp'])
+            if self._now is not None and ts != self._now:
+                # Let the bot evaluate this tick before the clock moves on
+                self._wait_until_consumed(book)
+                if self.speed and ts > self._now:
+                    time.sleep((ts - self._now) / self.speed)
+            self._now = ts
+            fields = {key: float(event[key]) for key in QUOTE_FIELDS if event.get(key) not in (None, '')}
+            book.update(event['exchange'], event['symbol'], timestamp=ts, **fields)
+            count += 1
+        self._wait_until_consumed(book)
+        logging.info(f"Replay feed finished after {count} events from {self.path}")
+
+    def stop(self):
+        self._stop.set()
+
+
+def _funding_rate_from_ticker(ticker):
+    """Gate.io and Bitget include the current funding rate in their websocket ticker payloads."""
+    info = ticker.get('info') or {}
+    for key in ('funding_rate', 'fundingRate'):
+        value = info.get(key)
+        if value not in (None, ''):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class CcxtProFeed:
+    """
+    Live websocket feed built on ccxt.pro.
+
+    Subscribes to the ticker channel of every symbol on every exchange and feeds
+    mark price (and the funding rate, where the ticker carries it) into the
+    QuoteBook. Funding rates are additionally refreshed over REST every
+    `funding_refresh_seconds`, since not every venue streams them. The feed
+    stops when a ticker stream fails `max_consecutive_errors` times in a row.
+    """
+
+    def __init__(self, exchange_params, symbols, funding_refresh_seconds=60,
+                 max_consecutive_errors=MAX_CONSECUTIVE_STREAM_ERRORS):
+        """
+        Args:
+            exchange_params: Dict { exchange_name: (ccxt_id, client_config) }.
+            symbols: CCXT swap symbols to subscribe to. May be replaced while running.
+            funding_refresh_seconds: Interval of the REST funding-rate refresh.
+            max_consecutive_errors: Ticker stream errors in a row after which the feed stops.
+        """
+        self.exchange_params = exchange_params
+        self.symbols = list(symbols)
+        self.funding_refresh_seconds = funding_refresh_seconds
+        self.max_consecutive_errors = max_consecutive_errors
+        self._stop = threading.Event()
+
+    def now(self):
+        return time.time()
+
+    async def _watch_tickers(self, exchange_name, client, book):
+        errors = 0
+        while not self._stop.is_set():
+            try:
+                tickers = await client.watch_tickers(self.symbols)
+                errors = 0
+                for symbol, ticker in tickers.items():
+                    book.update(
+                        exchange_name, symbol,
+                        mark_price=ticker.get('markPrice'),
+                        last_price=ticker.get('last'),
+                        index_price=ticker.get('indexPrice'),
+                        funding_rate=_funding_rate_from_ticker(ticker)
+                    )
+            except Exception as e:
+                errors += 1
+                logging.error(f"Websocket ticker stream error on {exchange_name} ({errors}/{self.max_consecutive_errors}): {e}")
+                if errors >= self.max_consecutive_errors:
+                    logging.error(f"Giving up on the {exchange_name} ticker stream, stopping the feed.")
+                    self.stop()
+                    return
+                await asyncio.sleep(5)
+
+    async def _refresh_funding_rates(self, exchange_name, client, book):
+        while not self._stop.is_set():
+            try:
+                if client.has.get('fetchFundingRates'):
+                    funding_rates = await client.fetch_funding_rates(self.symbols)
+                else:
+                    funding_rates = {symbol: await client.fetch_funding_rate(symbol) for symbol in self.symbols}
+                for symbol, funding_rate_data in funding_rates.items():
+                    book.update(exchange_name, symbol, funding_rate=funding_rate_data.get('fundingRate'))
+            except Exception as e:
+                logging.error(f"Funding rate refresh failed on {exchange_name}: {e}")
+            await asyncio.sleep(self.funding_refresh_seconds)
+
+    async def _main(self, book):
+        import ccxt.pro as ccxtpro
+
+        clients = {
+            name: getattr(ccxtpro, ccxt_id)(client_config)
+            for name, (ccxt_id, client_config) in self.exchange_params.items()
+        }
+        try:
+            for client in clients.values():
+                await client.load_markets()
+            tasks = []
+            for name, client in clients.items():
+                tasks.append(asyncio.ensure_future(self._watch_tickers(name, client, book)))
+                tasks.append(asyncio.ensure_future(self._refresh_funding_rates(name, client, book)))
+            while not self._stop.is_set():
+                await asyncio.sleep(1)
+            for task in tasks:
+                task.cancel()
+        finally:
+            for client in clients.values():
+                await client.close()
+
+    def run(self, book):
+        asyncio.run(self._main(book))
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_feed(feed, book):
+    """Runs a feed in a daemon thread and returns the thread. The book is closed when the feed stops."""
+    def _run():
+        try:
+            feed.run(book)
+        except Exception as e:
+            logging.error(f"Market data feed stopped with an error: {e}", exc_info=True)
+        finally:
+            book.close()
+
+    thread = threading.Thread(target=_run, name=f"feed-{type(feed).__name__}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,414 @@
+"""
+Local stand-ins for the exchanges, for load tests and offline runs.
+
+- MockExchange: an in-process, CCXT-compatible client with the calls the bot
+  makes (load_markets, fetch_ticker(s), fetch_funding_rate(s)). The bot uses it
+  instead of ccxt when EXCHANGE_BACKEND=mock, one per ARBITRAGE_EXCHANGES entry.
+- MockExchangeServer: an HTTP server with the Gate.io/Bitget REST endpoints the
+  web server's funding rate fetchers call (contracts and funding history).
+  Point GATEIO_REST_URL and BITGET_REST_URL at it:
+
+      python -m exchanges.mock_exchange --port 9000 --settings mock.json
+
+Both draw from one MockMarket and apply the same latency (log-normal) and
+failure model (rate-limit, server error and timeout rates), set through a
+JSON settings file (MOCK_EXCHANGE_SETTINGS) whose keys override
+DEFAULT_SETTINGS; per-exchange overrides go under "exchanges": {"gateio": {...}}.
+Prices follow a random walk unless a `script_file` (the STREAM_REPLAY_FILE
+format) scripts them; its timestamps are replayed relative to the first event.
+"""
+import argparse
+import copy
+import csv
+import json
+import logging
+import math
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import ccxt
+import numpy as np
+
+from exchanges.registry import display_name, exchange_id as to_exchange_id
+
+SETTLEMENT_INTERVAL_SECONDS = 8 * 60 * 60
+
+DEFAULT_SETTINGS = {
+    'seed': 42,
+    'symbols': 1000,             # contracts listed on both exchanges (SYM0000/USDT, ...)
+    'latency_median_ms': 50.0,   # log-normal request latency
+    'latency_sigma': 0.5,
+    'latency_max_ms': 5000.0,
+    'rate_limit_rate': 0.0,      # fraction of requests answered with 429 / RateLimitExceeded
+    'error_rate': 0.0,           # fraction answered with 5xx / ExchangeNotAvailable
+    'timeout_rate': 0.0,         # fraction that hang for timeout_seconds, then fail
+    'timeout_seconds': 10.0,
+    'bulk_endpoints': True,      # advertise fetchTickers / fetchFundingRates
+    'rate_limit_ms': 10,         # declared CCXT rateLimit (the bot throttles per-symbol requests to it)
+    'price_volatility': 0.001,   # random-walk step per second (relative)
+    'funding_bias': {'gateio': 0.0003, 'bitget': 0.0},  # per exchange id, 0 for the others
+    'price_basis': {'gateio': 0.0005, 'bitget': -0.0005},
+    'script_file': '',
+    'script_speed': 1.0,
+    'exchanges': {},
+}
+
+def load_settings(path=None):
+    """DEFAULT_SETTINGS overridden by the JSON file at `path` (if given)."""
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    return settings
+
+def exchange_settings(settings, exchange_id):
+    return {**settings, **settings.get('exchanges', {}).get(exchange_id, {})}
+
+def _stable_seed(*parts):
+    return zlib.crc32('|'.join(map(str, parts)).encode())
+
+
+class MockMarket:
+    """
+    Quotes and funding rates of every listed contract on both exchanges.
+
+    Mid prices are a random walk advanced by the wall-clock time between
+    requests, so quotes keep moving however fast the bot polls; each exchange
+    quotes the mid with a small basis. Funding rates are a per-symbol level
+    plus the exchange's `funding_bias` plus noise. Thread-safe.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or load_settings()
+        self.seed = self.settings['seed']
+        self.symbols = [f"SYM{i:04d}/USDT:USDT" for i in range(self.settings['symbols'])]
+        self._rng = np.random.default_rng(self.seed)
+        self._lock = threading.Lock()
+        self._state = {}  # symbol -> [mid, funding level, last update (monotonic)]
+        self._started = time.monotonic()
+        self._script = self._load_script(self.settings.get('script_file'))
+
+    @staticmethod
+    def _load_script(path):
+        """{(exchange_id, symbol): (offsets, events)} from a replay-format file."""
+        if not path:
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.csv'):
+                events = list(csv.DictReader(f))
+            else:
+                events = [json.loads(line) for line in f if line.strip()]
+        if not events:
+            return {}
+        start = min(float(event.get('timestamp') or 0) for event in events)
+        script = {}
+        for event in sorted(events, key=lambda e: float(e.get('timestamp') or 0)):
+            exchange_id = to_exchange_id(event['exchange'])
+            offsets, quotes = script.setdefault((exchange_id, event['symbol']), ([], []))
+            offsets.append(float(event.get('timestamp') or 0) - start)
+            quotes.append({key: float(value) for key, value in event.items()
+                           if key in ('mark_price', 'last_price', 'index_price', 'funding_rate') and value not in (None, '')})
+        logging.info(f"Mock market scripted with {len(events)} events from {path}")
+        return script
+
+    def _scripted(self, exchange_id, symbol):
+        entry = self._script.get((exchange_id, symbol))
+        if entry is None:
+            return None
+        offsets, quotes = entry
+        elapsed = (time.monotonic() - self._started) * self.settings['script_speed']
+        # Latest event at or before the elapsed time (the first one until then)
+        lo, hi = 0, len(offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if offsets[mid] <= elapsed:
+                lo = mid + 1
+            else:
+                hi = mid
+        return quotes[max(lo - 1, 0)]
+
+    def _profile(self, symbol):
+        """Initial mid price and funding level of a symbol, the same in every process."""
+        rng = np.random.default_rng(_stable_seed(self.seed, symbol))
+        return float(rng.uniform(0.5, 200.0)), float(rng.normal(0.0001, 0.0002))
+
+    def _advance(self, symbol):
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(symbol)
+            if state is None:
+                state = self._state[symbol] = [*self._profile(symbol), now]
+            elapsed = now - state[2]
+            if elapsed > 0:
+                state[0] *= math.exp(self.settings['price_volatility'] * math.sqrt(elapsed) * float(self._rng.standard_normal()))
+                state[2] = now
+            return state[0], state[1], float(self._rng.standard_normal())
+
+    def quote(self, exchange_id, symbol):
+        """{'mark_price', 'last_price', 'index_price', 'funding_rate'} on one exchange."""
+        scripted = self._scripted(exchange_id, symbol)
+        mid, funding_level, noise = self._advance(symbol)
+        basis = self.settings.get('price_basis', {}).get(exchange_id, 0.0)
+        price = mid * (1 + basis + 0.0002 * noise)
+        quote = {
+            'mark_price': price,
+            'last_price': price,
+            'index_price': mid,
+            'funding_rate': funding_level + self.settings['funding_bias'].get(exchange_id, 0.0) + 0.00005 * noise,
+        }
+        if scripted:
+            quote.update(scripted)
+            if 'mark_price' in scripted and 'last_price' not in scripted:
+                quote['last_price'] = scripted['mark_price']
+        return quote
+
+    def funding_history(self, exchange_id, symbol, start, end=None):
+        """[(settlement epoch seconds, rate)] for the settlements in [start, end]; the same on every call."""
+        end = int(time.time()) if end is None else end
+        first_slot = -(-int(start) // SETTLEMENT_INTERVAL_SECONDS)
+        level = self._profile(symbol)[1] + self.settings['funding_bias'].get(exchange_id, 0.0)
+        history = []
+        for slot in range(first_slot, end // SETTLEMENT_INTERVAL_SECONDS + 1):
+            rng = np.random.default_rng(_stable_seed(self.seed, exchange_id, symbol, slot))
+            rate = level + rng.normal(0, 0.0002)
+            history.append((slot * SETTLEMENT_INTERVAL_SECONDS, float(rate)))
+        return history
+
+
+class FaultInjector:
+    """Samples a latency and an outcome ('ok', 'rate_limit', 'error', 'timeout') per request."""
+
+    def __init__(self, settings, seed):
+        self.settings = settings
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        settings = self.settings
+        with self._lock:
+            draw = float(self._rng.random())
+            latency = settings['latency_median_ms'] * math.exp(settings['latency_sigma'] * float(self._rng.standard_normal()))
+        latency = min(latency, settings['latency_max_ms']) / 1000.0
+        if draw < settings['timeout_rate']:
+            return settings['timeout_seconds'], 'timeout'
+        draw -= settings['timeout_rate']
+        if draw < settings['rate_limit_rate']:
+            return latency, 'rate_limit'
+        draw -= settings['rate_limit_rate']
+        if draw < settings['error_rate']:
+            return latency, 'error'
+        return latency, 'ok'
+
+
+class MockExchange:
+    """CCXT-compatible client answering from a MockMarket with simulated latency and failures."""
+
+    def __init__(self, exchange_id, market, settings=None):
+        self.id = exchange_id
+        self.name = display_name(exchange_id)
+        self.market = market
+        self.settings = exchange_settings(settings or market.settings, exchange_id)
+        bulk = self.settings['bulk_endpoints']
+        self.has = {'fetchTicker': True, 'fetchFundingRate': True, 'fetchTickers': bulk, 'fetchFundingRates': bulk}
+        self.rateLimit = self.settings['rate_limit_ms']
+        self.markets = {}
+        self._faults = FaultInjector(self.settings, _stable_seed(market.seed, exchange_id))
+
+    def _request(self, endpoint):
+        latency, outcome = self._faults.sample()
+        time.sleep(latency)
+        if outcome == 'timeout':
+            raise ccxt.RequestTimeout(f"{self.id} {endpoint} timed out (mock)")
+        if outcome == 'rate_limit':
+            raise ccxt.RateLimitExceeded(f"{self.id} {endpoint} 429 Too Many Requests (mock)")
+        if outcome == 'error':
+            raise ccxt.ExchangeNotAvailable(f"{self.id} {endpoint} 503 Service Unavailable (mock)")
+
+    def load_markets(self, reload=False):
+        self._request('load_markets')
+        self.markets = {
+            symbol: {'symbol': symbol, 'type': 'swap', 'linear': True, 'settle': 'USDT'}
+            for symbol in self.market.symbols
+        }
+        return self.markets
+
+    def _ticker(self, symbol):
+        quote = self.market.quote(self.id, symbol)
+        return {
+            'symbol': symbol,
+            'timestamp': int(time.time() * 1000),
+            'markPrice': quote['mark_price'],
+            'last': quote['last_price'],
+            'indexPrice': quote['index_price'],
+        }
+
+    def _funding_rate(self, symbol):
+        quote = self.market.quote(self.id, symbol)
+        next_settlement = (int(time.time()) // SETTLEMENT_INTERVAL_SECONDS + 1) * SETTLEMENT_INTERVAL_SECONDS
+        return {
+            'symbol': symbol,
+            'fundingRate': quote['funding_rate'],
+            'markPrice': quote['mark_price'],
+            'fundingTimestamp': next_settlement * 1000,
+        }
+
+    def fetch_ticker(self, symbol, params=None):
+        self._request('fetch_ticker')
+        return self._ticker(symbol)
+
+    def fetch_funding_rate(self, symbol, params=None):
+        self._request('fetch_funding_rate')
+        return self._funding_rate(symbol)
+
+    def fetch_tickers(self, symbols=None, params=None):
+        if not self.has['fetchTickers']:
+            raise ccxt.NotSupported(f"{self.id} fetch_tickers() is disabled (mock)")
+        self._request('fetch_tickers')
+        return {symbol: self._ticker(symbol) for symbol in symbols or self.market.symbols}
+
+    def fetch_funding_rates(self, symbols=None, params=None):
+        if not self.has['fetchFundingRates']:
+            raise ccxt.NotSupported(f"{self.id} fetch_funding_rates() is disabled (mock)")
+        self._request('fetch_funding_rates')
+        return {symbol: self._funding_rate(symbol) for symbol in symbols or self.market.symbols}
+
+_shared_market = None
+_shared_market_lock = threading.Lock()
+
+def create_mock_clients(exchanges, settings_path=None):
+    """{exchange_name: MockExchange} for `exchanges` ({exchange_name: exchange_id}), sharing one process-wide MockMarket."""
+    global _shared_market
+    with _shared_market_lock:
+        if _shared_market is None:
+            _shared_market = MockMarket(load_settings(settings_path))
+    return {name: MockExchange(exchange_id, _shared_market) for name, exchange_id in exchanges.items()}
+
+
+def _contract_id(symbol):
+    """'SYM0001/USDT:USDT' -> 'SYM0001USDT' (the web server's symbol format)."""
+    return symbol.split(':')[0].replace('/', '')
+
+def _ccxt_symbol(contract_id):
+    return f"{contract_id[:-4]}/{contract_id[-4:]}:{contract_id[-4:]}"
+
+
+class MockExchangeServer:
+    """
+    Serves the Gate.io and Bitget REST endpoints used by the funding rate
+    fetchers (same paths as the real APIs, so one server can stand in for both).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, settings=None):
+        self.settings = settings or load_settings()
+        self.market = MockMarket(self.settings)
+        self._faults = {exchange_id: FaultInjector(exchange_settings(self.settings, exchange_id),
+                                                   _stable_seed(self.market.seed, 'http', exchange_id))
+                        for exchange_id in ('gateio', 'bitget')}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves on a background thread. Returns the base URL."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-exchange-server', daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _routes(self):
+        contracts = [_contract_id(symbol) for symbol in self.market.symbols]
+        return {
+            '/api/v4/futures/usdt/contracts': ('gateio', lambda query: [
+                {'name': f"{c[:-4]}_{c[-4:]}", 'type': 'direct'} for c in contracts]),
+            '/api/mix/v1/market/contracts': ('bitget', lambda query: {
+                'code': '00000', 'data': [{'symbol': f"{c}_UMCBL", 'symbolName': c} for c in contracts]}),
+            '/api/v4/futures/usdt/funding_rate': ('gateio', self._gate_funding_history),
+            '/api/mix/v1/market/history-fundRate': ('bitget', self._bitget_funding_history),
+        }
+
+    def _gate_funding_history(self, query):
+        contract = query['contract'].replace('_', '')
+        start = int(query.get('start_time', 0))
+        limit = int(query.get('limit', 100))
+        history = self.market.funding_history('gateio', _ccxt_symbol(contract), start)
+        # Newest first, like the real endpoint
+        return [{'t': ts, 'r': f"{rate:.8f}"} for ts, rate in reversed(history)][:limit]
+
+    def _bitget_funding_history(self, query):
+        contract = query['symbol'].split('_')[0]
+        start = int(query.get('startTime', 0)) // 1000
+        page_size = int(query.get('pageSize', 20))
+        page = int(query.get('pageNo', 1))
+        history = list(reversed(self.market.funding_history('bitget', _ccxt_symbol(contract), start)))
+        rows = history[(page - 1) * page_size:page * page_size]
+        return {'code': '00000', 'data': [
+            {'symbol': query['symbol'], 'fundingRate': f"{rate:.8f}", 'settleTime': str(ts * 1000)} for ts, rate in rows]}
+
+    def _handler_class(self):
+        server = self
+        routes = self._routes()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                route = routes.get(url.path)
+                if route is None:
+                    return self._send(404, {'message': 'not found'})
+                exchange_id, handler = route
+                latency, outcome = server._faults[exchange_id].sample()
+                time.sleep(latency)
+                if outcome == 'rate_limit':
+                    return self._send(429, {'message': 'Too Many Requests'})
+                if outcome == 'error':
+                    return self._send(503, {'message': 'Service Unavailable'})
+                if outcome == 'timeout':
+                    self.close_connection = True
+                    return
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                try:
+                    return self._send(200, handler(query))
+                except (KeyError, ValueError) as e:
+                    return self._send(400, {'message': f'bad request: {e}'})
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"mock exchange: {format % args}")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--settings', help='JSON file overriding DEFAULT_SETTINGS')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    server = MockExchangeServer(args.host, args.port, load_settings(args.settings))
+    logging.info(f"Mock Gate.io/Bitget REST API on {server.url} ({len(server.market.symbols)} contracts)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+The exchanges the bot arbitrages between.
+
+Exchanges are configured by CCXT id (ARBITRAGE_EXCHANGES). Positions, the trade
+ledger and the dashboard name them by the display names below; an id without
+one is used as its own name.
+"""
+import config
+
+DISPLAY_NAMES = {
+    'gateio': 'Gate.io',
+    'bitget': 'Bitget',
+    'okx': 'OKX',
+    'binance': 'Binance',
+    'bybit': 'Bybit',
+    'mexc': 'MEXC',
+}
+
+def display_name(exchange_id):
+    return DISPLAY_NAMES.get(exchange_id, exchange_id)
+
+def exchange_id(name):
+    """Display name or CCXT id (any case) -> CCXT id."""
+    lowered = name.lower()
+    for candidate, display in DISPLAY_NAMES.items():
+        if display.lower() == lowered:
+            return candidate
+    return lowered
+
+def configured_exchanges():
+    """{display_name: ccxt_id} for ARBITRAGE_EXCHANGES, in the configured order."""
+    return {display_name(ccxt_id): ccxt_id for ccxt_id in config.ARBITRAGE_EXCHANGES}
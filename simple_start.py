@@ -32,47 +32,16 @@ def run_bot():
 def update_funding_data():
     """Update funding rate data directly"""
     try:
-        from web_server import (
-            get_common_symbols, fetch_gate_rates, fetch_bitget_rates,
-            filter_to_settlement_times, perform_analysis,
-            ANALYSIS_JSON, RAW_DATA_CSV
-        )
-        import json
-        import csv
-        
-        logging.info("Starting funding rate data update...")
-        
-        common_symbols = get_common_symbols()
-        if not common_symbols:
-            logging.error("No common symbols found")
-            return False
+        from web_server import submit_funding_update
 
-        all_raw_data = []
-        for i, symbol in enumerate(common_symbols):
-            logging.info(f"Fetching data for {symbol} ({i+1}/{len(common_symbols)})...")
-            all_raw_data.extend(fetch_gate_rates(symbol))
-            all_raw_data.extend(fetch_bitget_rates(symbol))
-            time.sleep(0.2)  # To avoid hitting rate limits
-
-        logging.info("Filtering data to settlement times...")
-        filtered_data = filter_to_settlement_times(all_raw_data)
-        
-        logging.info("Performing analysis for each symbol...")
-        analysis_summary = perform_analysis(filtered_data)
-        
-        # Save analysis summary
-        with open(ANALYSIS_JSON, 'w', encoding='utf-8') as f:
-            json.dump(analysis_summary, f, indent=4)
-        logging.info(f"Saved analysis summary for {len(analysis_summary)} symbols")
-
-        # Save raw data
-        filtered_data.sort(key=lambda x: (x['symbol'], x['timestamp']), reverse=True)
-        with open(RAW_DATA_CSV, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['symbol', 'exchange', 'timestamp', 'funding_rate'])
-            writer.writeheader()
-            writer.writerows(filtered_data)
-        logging.info(f"Saved {len(filtered_data)} funding rate records")
-        
+        # Runs through the web server's job runner, so it never overlaps an update started from the API
+        job, created = submit_funding_update()
+        if not created:
+            logging.info(f"Funding rate update {job.id} already running, waiting for it...")
+        job.wait()
+        if job.status != 'succeeded':
+            logging.error(f"Funding rate update failed: {job.error}")
+            return False
         return True
         
     except Exception as e:
@@ -109,11 +78,11 @@ def main():
     logging.info("Starting application...")
     
     # Start trading bot in background
-    bot_thread = threading.Thread(target=run_bot, daemon=True)
+    bot_thread = threading.Thread(target=run_bot, name='trading-bot', daemon=True)
     bot_thread.start()
     
     # Start funding rate updater in background
-    updater_thread = threading.Thread(target=run_funding_rate_updater, daemon=True)
+    updater_thread = threading.Thread(target=run_funding_rate_updater, name='funding-updater', daemon=True)
     updater_thread.start()
     
     # Run web server in main thread
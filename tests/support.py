@@ -0,0 +1,45 @@
+import os
+from functools import partial
+from unittest import mock
+
+import config
+import trading_bot
+import web_server
+from utils import event_stream, metrics, trade_store
+from utils.config_channel import ConfigListener
+from utils.funding_store import FundingRateStore
+from utils.position_snapshot import PositionSnapshotWriter
+
+
+def isolate_stores(test, workdir, backend='sqlite'):
+    """
+    Points the trade store, funding store, event spool, position snapshot,
+    config channel and exported bot metrics at `workdir` for one test. Every
+    replaced global is restored by the test's cleanups.
+    """
+    if backend == 'csv':
+        store = trade_store.CsvTradeStore(os.path.join(workdir, 'trading_history.csv'))
+    else:
+        store = trade_store.SqliteTradeStore(os.path.join(workdir, 'trading_history.db'),
+                                             legacy_csv=os.path.join(workdir, 'trading_history.csv'))
+    snapshot_file = os.path.join(workdir, 'positions_snapshot.json')
+    patches = [
+        mock.patch.object(config, 'TRADE_STORE_BACKEND', backend),
+        mock.patch.object(config, 'TEST_MODE', True),
+        mock.patch.object(trade_store, '_trade_store', store),
+        mock.patch.object(web_server, 'trade_store', store),
+        mock.patch.object(event_stream, '_spool', event_stream.EventSpool(os.path.join(workdir, 'events.jsonl'))),
+        mock.patch.object(web_server, 'funding_store', FundingRateStore(
+            os.path.join(workdir, 'funding_rates.db'), legacy_csv=os.path.join(workdir, 'all_funding_rates.csv'))),
+        mock.patch.object(web_server, 'POSITION_SNAPSHOT_FILE', snapshot_file),
+        mock.patch.object(trading_bot, 'position_snapshot', PositionSnapshotWriter(snapshot_file)),
+        # Never pick up config snapshots published to the real bot
+        mock.patch.object(trading_bot, 'config_listener', ConfigListener(
+            os.path.join(workdir, 'config_snapshot.json'), os.path.join(workdir, 'config_applied.json'),
+            os.path.join(workdir, 'bot_control.sock'))),
+        mock.patch.object(metrics, 'export_to_file',
+                          partial(metrics.export_to_file, os.path.join(workdir, 'metrics_bot.prom'))),
+    ]
+    for patch in patches:
+        patch.start()
+        test.addCleanup(patch.stop)
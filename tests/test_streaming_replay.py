@@ -0,0 +1,84 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import config
+import trading_bot
+from exchanges.market_stream import CcxtProFeed, QuoteBook, ReplayFeed
+from tests.support import isolate_stores
+from utils.trade_store import get_trade_store
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'stream_replay.jsonl')
+
+
+class StreamingReplayTest(unittest.TestCase):
+    """Drives run_streaming_loop end to end over tests/fixtures/stream_replay.jsonl."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        isolate_stores(self, self.workdir)
+        for state in (trading_bot.open_positions, trading_bot.last_pnl_event):
+            self.addCleanup(state.update, dict(state))
+            self.addCleanup(state.clear)
+            state.clear()
+
+        for name in list(config.DEFAULT_CONFIG) + ['ARBITRAGE_EXCHANGES']:
+            self.addCleanup(setattr, config, name, getattr(config, name))
+        for name, value in config.DEFAULT_CONFIG.items():
+            setattr(config, name, value)
+        config.TRADING_PAIRS = ['BTC/USDT', 'ETH/USDT']
+        config.ARBITRAGE_EXCHANGES = ['gateio', 'bitget']
+
+    def test_replay_opens_and_closes_on_event_time(self):
+        trading_bot.run_streaming_loop(ReplayFeed(FIXTURE))
+
+        trades = get_trade_store().all_trades()
+        events = {(trade['pair'], trade['action']): trade for trade in trades}
+        self.assertEqual(len(trades), 4)
+
+        btc_close = events[('BTC/USDT', 'CLOSE')]
+        self.assertEqual(events[('BTC/USDT', 'OPEN')]['timestamp_utc'], '2025-01-01T00:00:00')
+        self.assertEqual(btc_close['close_reason'], 'RATE_REVERSAL')
+        self.assertEqual(btc_close['timestamp_utc'], '2025-01-01T08:00:00')
+        self.assertEqual(btc_close['trade_id'], 'BTC/USDT_1735689600')
+
+        eth_close = events[('ETH/USDT', 'CLOSE')]
+        self.assertEqual(eth_close['close_reason'], 'MAX_HOLDING_TIME')
+        self.assertEqual(eth_close['timestamp_utc'], '2025-01-08T00:00:00')
+        # Seven days of settlements at 00, 08 and 16 UTC
+        self.assertGreater(float(eth_close['funding_fee_profit']), 0)
+        self.assertEqual(trading_bot.open_positions, {})
+
+
+class QuoteBookTest(unittest.TestCase):
+
+    def test_quote_age_uses_the_given_clock(self):
+        book = QuoteBook(['Gate.io'])
+        book.update('Gate.io', 'BTC/USDT:USDT', timestamp=1000.0, mark_price=1.0, funding_rate=0.0001)
+        self.assertIn('Gate.io', book.get('BTC/USDT:USDT', max_age=30, now=1020.0))
+        self.assertEqual(book.get('BTC/USDT:USDT', max_age=30, now=1031.0), {})
+
+    def test_close_wakes_the_consumer(self):
+        book = QuoteBook(['Gate.io'])
+        book.close()
+        self.assertEqual(book.wait_for_changes(timeout=5.0), [])
+
+
+class _FailingClient:
+    async def watch_tickers(self, symbols):
+        raise ConnectionError('socket closed')
+
+
+class CcxtProFeedTest(unittest.TestCase):
+
+    def test_feed_stops_after_consecutive_errors(self):
+        feed = CcxtProFeed({}, ['BTC/USDT:USDT'], max_consecutive_errors=1)
+        asyncio.run(feed._watch_tickers('Gate.io', _FailingClient(), QuoteBook(['Gate.io'])))
+        self.assertTrue(feed._stop.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,95 +1,117 @@
 import time
 import logging
+from datetime import datetime
 import ccxt
-import os
+import numpy as np
 import pandas as pd
 
 import config
-from utils import trade_logger
-from exchanges.base_api import get_market_data
-
-# --- Configuration Monitoring ---
-last_config_check = 0
-config_check_interval = 30  # Check for config updates every 30 seconds
-
-def check_config_updates():
-    """Check if configuration has been updated and reload if necessary."""
-    global last_config_check
-    
-    current_time = time.time()
-    if current_time - last_config_check < config_check_interval:
-        return
-    
-    last_config_check = current_time
-    
-    try:
-        config_file = '/app/data/config_update.timestamp'
-        if os.path.exists(config_file):
-            logging.info("Configuration update detected, reloading config...")
-            config.reload_config()
-            logging.info(f"Config reloaded. New MAX_HOLDING_DURATION_HOURS: {config.MAX_HOLDING_DURATION_HOURS}")
-            
-            # Remove the notification file
-            os.remove(config_file)
-                
-    except Exception as e:
-        logging.error(f"Error checking config updates: {e}")
+from utils import event_stream, funding_matrix, metrics, trade_logger
+from utils.config_channel import ConfigListener
+from utils.position_snapshot import PositionSnapshotWriter, iso_utc
+from exchanges import registry
+from exchanges.base_api import MarketDataCollector
+from exchanges.market_stream import QuoteBook, ReplayFeed, CcxtProFeed, start_feed
+
+# --- Metrics ---
+BOT_CYCLE_SECONDS = metrics.Histogram(
+    'bot_cycle_seconds', 'Duration of one bot cycle (polling) or one batch of changed quotes (streaming).', ('mode',))
+BOT_MARKET_DATA_SECONDS = metrics.Histogram(
+    'bot_market_data_collect_seconds', 'Time to collect market data for all pairs in a polling cycle.')
+BOT_POSITION_CHECK_SECONDS = metrics.Histogram(
+    'bot_position_check_seconds', 'Time check_and_manage_positions takes for one pair.', ('pair',),
+    buckets=metrics.FAST_BUCKETS)
+BOT_LOOP_ERRORS = metrics.Counter('bot_loop_errors_total', 'Unexpected errors in the bot loop.', ('mode',))
+BOT_INCOMPLETE_QUOTES = metrics.Counter(
+    'bot_incomplete_quotes_total', 'Pair evaluations skipped because a quote was missing.', ('pair',))
+
+# --- Configuration Updates ---
+# Config snapshots published by the web server; applied only between pair evaluations
+config_listener = ConfigListener()
+
+def apply_pending_config():
+    """Applies the newest published config snapshot, if any. Returns True if one was applied."""
+    snapshot = config_listener.poll()
+    if snapshot is None:
+        return False
+    config.apply_config(config.resolve_config(snapshot.values), version=snapshot.version)
+    status = config_listener.report_applied(snapshot)
+    logging.info(f"Applied config version {snapshot.version} "
+                 f"({status['propagation_delay_seconds'] * 1000:.0f} ms after publication). "
+                 f"MAX_HOLDING_DURATION_HOURS: {config.MAX_HOLDING_DURATION_HOURS}")
+    return True
+
+def sleep_until_next_cycle(seconds):
+    """Sleeps between polling cycles, waking up to apply config changes as soon as they are published."""
+    deadline = time.time() + seconds
+    while (remaining := deadline - time.time()) > 0:
+        if config_listener.wait(remaining):
+            apply_pending_config()
 
 # --- Position Management ---
 # A simple dictionary to track our open positions.
 # In a more advanced system, this would be a class or persisted to a database.
-# Format: { 'SNT/USDT': {'short_on': 'gateio', 'long_on': 'bitget'} }
+# Format: { 'SNT/USDT': {'short_on': 'Gate.io', 'long_on': 'Bitget', ...} } (exchange display names)
 open_positions = {}
 
+# Live PnL of open positions is pushed to the dashboard at most this often per pair
+PNL_EVENT_INTERVAL_SECONDS = 1.0
+last_pnl_event = {}
+
+# Open positions with live metrics, published for the web server after each cycle
+position_snapshot = PositionSnapshotWriter()
+# Streaming mode publishes at most this often
+POSITION_SNAPSHOT_INTERVAL_SECONDS = 1.0
+
+def publish_position_snapshot():
+    """Publishes open_positions in the /history/open format plus the live metrics of the last check."""
+    rows = []
+    for pair, position in open_positions.items():
+        rows.append({
+            'trade_id': position['trade_id'],
+            'pair': pair,
+            'action': 'OPEN',
+            'timestamp_utc': iso_utc(position['open_timestamp']),
+            'short_exchange': position['short_on'],
+            'long_exchange': position['long_on'],
+            'size_usdt': position['size'],
+            'short_price': position['open_short_price'],
+            'long_price': position['open_long_price'],
+            'funding_rate_diff_annualized_percent': position['initial_rate_difference'] * 100,
+            **position.get('live', {}),
+        })
+    position_snapshot.publish(rows)
+
 def rebuild_state_from_history():
     """
-    Rebuilds the in-memory 'open_positions' state from the trade history file
+    Rebuilds the in-memory 'open_positions' state from the trade store
     on startup. This makes the bot resilient to restarts.
     """
     global open_positions
-    trade_history_file = trade_logger.LOG_FILE # Use the correct path from trade_logger
     try:
-        if not os.path.exists(trade_history_file):
-            logging.info(f"No trading history file found at {trade_history_file}. Starting with a clean state.")
-            return
-
-        df = pd.read_csv(trade_history_file)
-        if df.empty:
-            logging.info("Trading history is empty. Starting with a clean state.")
-            return
-
         logging.info("Rebuilding state from trading history...")
-        if 'trade_id' not in df.columns or 'action' not in df.columns:
-            logging.warning("History file is missing 'trade_id' or 'action' column. Cannot rebuild state.")
+        # Indexed query: only the OPEN rows of trades without a CLOSE are read
+        open_trades = trade_logger.get_trade_store().open_trades()
+        if not open_trades:
+            logging.info("No open positions to rebuild from history.")
             return
+
+        for open_trade in open_trades:
+            pair = open_trade['pair']
+            trade_id = open_trade['trade_id']
+            open_positions[pair] = {
+                'short_on': open_trade['short_exchange'],
+                'long_on': open_trade['long_exchange'],
+                'size': float(open_trade['size_usdt']),
+                'open_short_price': float(open_trade['short_price']),
+                'open_long_price': float(open_trade['long_price']),
+                'trade_id': trade_id,
+                'open_timestamp': pd.to_datetime(open_trade['timestamp_utc']).timestamp(),
+                'initial_rate_difference': float(open_trade['funding_rate_diff_annualized_percent']) / 100.0
+            }
+            logging.info(f"Rebuilt open position for {pair} with trade_id {trade_id}")
         
-        trades_by_id = df.dropna(subset=['trade_id']).groupby('trade_id')
-        rebuilt_count = 0
-        for trade_id, group in trades_by_id:
-            # If a trade_id group does not contain a 'CLOSE' action, it's considered open.
-            is_open = 'CLOSE' not in group['action'].values
-            
-            if is_open and 'OPEN' in group['action'].values:
-                open_trade = group[group['action'] == 'OPEN'].iloc[-1]
-                pair = open_trade['pair']
-                
-                open_positions[pair] = {
-                    'short_on': open_trade['short_exchange'],
-                    'long_on': open_trade['long_exchange'],
-                    'size': float(open_trade['size_usdt']),
-                    'open_short_price': float(open_trade['short_price']),
-                    'open_long_price': float(open_trade['long_price']),
-                    'trade_id': trade_id,
-                    'open_timestamp': pd.to_datetime(open_trade['timestamp_utc']).timestamp(),
-                    'initial_rate_difference': float(open_trade['funding_rate_diff_annualized_percent']) / 100.0
-                }
-                rebuilt_count += 1
-                logging.info(f"Rebuilt open position for {pair} with trade_id {trade_id}")
-        
-        if rebuilt_count > 0:
-            logging.info(f"Successfully rebuilt {rebuilt_count} open positions. Current state: {list(open_positions.keys())}")
-        else:
-            logging.info("No open positions to rebuild from history.")
+        logging.info(f"Successfully rebuilt {len(open_trades)} open positions. Current state: {list(open_positions.keys())}")
 
     except Exception as e:
         logging.error(f"CRITICAL: Failed to rebuild state from history: {e}", exc_info=True)
@@ -106,8 +128,12 @@ def execute_trade(action, exchange_name, pair, position_size):
         # TODO: Add real order execution logic here using the exchange clients.
         return False # Placeholder
 
-def open_arbitrage_position(pair, short_exchange_name, long_exchange_name, position_size, gate_data, bitget_data, rate_difference):
-    """Opens a new arbitrage position and logs the event."""
+def open_arbitrage_position(pair, short_exchange_name, long_exchange_name, position_size, short_data, long_data, rate_difference, now=None):
+    """
+    Opens a new arbitrage position at the mark prices of its two exchanges and logs the event.
+    `now` is the current time in epoch seconds (default: the wall clock).
+    """
+    now = time.time() if now is None else now
     logging.info(f"Attempting to OPEN position for {pair}...")
     
     short_success = execute_trade('short', short_exchange_name, pair, position_size)
@@ -116,10 +142,10 @@ def open_arbitrage_position(pair, short_exchange_name, long_exchange_name, posit
     if short_success and long_success:
         logging.info(f"Successfully OPENED position for {pair}.")
         
-        short_price = gate_data['mark_price']
-        long_price = bitget_data['mark_price'] if long_exchange_name.lower() == 'bitget' else gate_data['mark_price']
+        short_price = short_data['mark_price']
+        long_price = long_data['mark_price']
         
-        trade_id = f"{pair}_{int(time.time())}"
+        trade_id = f"{pair}_{int(now)}"
         
         open_positions[pair] = {
             'short_on': short_exchange_name,
@@ -128,7 +154,7 @@ def open_arbitrage_position(pair, short_exchange_name, long_exchange_name, posit
             'open_short_price': short_price,
             'open_long_price': long_price,
             'trade_id': trade_id,
-            'open_timestamp': time.time(),
+            'open_timestamp': now,
             'initial_rate_difference': rate_difference
         }
         
@@ -136,15 +162,22 @@ def open_arbitrage_position(pair, short_exchange_name, long_exchange_name, posit
             pair=pair, action='OPEN', short_exchange=short_exchange_name, 
             long_exchange=long_exchange_name, size_usdt=position_size, 
             short_price=short_price, long_price=long_price, 
-            rate_diff=rate_difference, trade_id=trade_id
+            rate_diff=rate_difference, trade_id=trade_id, timestamp=datetime.utcfromtimestamp(now)
         )
+        event_stream.publish('position_opened', {
+            'pair': pair, 'trade_id': trade_id,
+            'short_exchange': short_exchange_name, 'long_exchange': long_exchange_name,
+            'size_usdt': position_size, 'short_price': short_price, 'long_price': long_price,
+            'funding_rate_diff_annualized_percent': rate_difference * 100,
+        })
         return True
     else:
         logging.error(f"Failed to fully open position for {pair}. Manual intervention may be required.")
         return False
 
-def close_arbitrage_position(pair, reason, close_short_price, close_long_price, realized_pnl, funding_fee_profit):
-    """Closes an open position and logs the trade."""
+def close_arbitrage_position(pair, reason, close_short_price, close_long_price, realized_pnl, funding_fee_profit, now=None):
+    """Closes an open position and logs the trade at `now` (epoch seconds, default: the wall clock)."""
+    now = time.time() if now is None else now
     if pair not in open_positions:
         logging.error(f"Attempted to close a position that does not exist: {pair}")
         return
@@ -165,11 +198,19 @@ def close_arbitrage_position(pair, reason, close_short_price, close_long_price,
         close_reason=reason,
         realized_pnl=realized_pnl,
         funding_fee_profit=funding_fee_profit,
-        trade_id=position['trade_id']
+        trade_id=position['trade_id'],
+        timestamp=datetime.utcfromtimestamp(now)
     )
 
+    event_stream.publish('position_closed', {
+        'pair': pair, 'trade_id': position['trade_id'], 'close_reason': reason,
+        'short_price': close_short_price, 'long_price': close_long_price,
+        'realized_pnl': realized_pnl, 'funding_fee_profit': funding_fee_profit,
+    })
+
     # Remove from open positions
     del open_positions[pair]
+    last_pnl_event.pop(pair, None)
 
 def count_funding_events(open_timestamp, close_timestamp):
     """
@@ -188,12 +229,16 @@ def count_funding_events(open_timestamp, close_timestamp):
         
     return int(end_event_num - start_event_num)
 
-def calculate_funding_fee_profit(position, current_annual_rate_diff, close_timestamp):
+def calculate_funding_fee_profit(position, current_arbitrage_rate, close_timestamp):
     """
     Calculates the estimated profit from funding fees more accurately.
     - Counts the actual number of funding events.
     - Averages the funding rate between the start and end of the trade.
     - Uses the arbitrage rate (short - long) for profit calculation.
+
+    `current_arbitrage_rate` is the current annualized rate of the position's
+    short exchange minus that of its long exchange, the same direction as
+    position['initial_rate_difference'].
     """
     # 1. Count the number of funding fee settlement events
     num_events = count_funding_events(position['open_timestamp'], close_timestamp)
@@ -201,41 +246,77 @@ def calculate_funding_fee_profit(position, current_annual_rate_diff, close_times
     if num_events == 0:
         return 0.0
 
-    # 2. Calculate current arbitrage rate based on position direction
-    # position['initial_rate_difference'] is already the arbitrage rate (short - long)
-    # We need to calculate current arbitrage rate in the same direction
-    if position['short_on'] == 'Gate.io':
-        # Short Gate.io, Long Bitget: arbitrage_rate = Gate.io_rate - Bitget_rate
-        current_arbitrage_rate = current_annual_rate_diff
-    else:
-        # Short Bitget, Long Gate.io: arbitrage_rate = Bitget_rate - Gate.io_rate = -(Gate.io_rate - Bitget_rate)
-        current_arbitrage_rate = -current_annual_rate_diff
-
-    # 3. Average the start and end arbitrage rates for a better estimate
+    # 2. Average the start and end arbitrage rates for a better estimate
     avg_arbitrage_rate = (position['initial_rate_difference'] + current_arbitrage_rate) / 2
 
-    # 4. De-annualize the rate to get the rate per 8-hour event
+    # 3. De-annualize the rate to get the rate per 8-hour event
     rate_per_event = avg_arbitrage_rate / (365 * 3)
 
-    # 5. Calculate total profit
+    # 4. Calculate total profit
     funding_fee_profit = position['size'] * rate_per_event * num_events
     
     return funding_fee_profit
 
-def check_and_manage_positions(pair, gate_data, bitget_data):
-    """Checks if an open position should be closed, or if a new one should be opened."""
-    
-    gate_annual_rate = gate_data['funding_rate'] * 3 * 365
-    bitget_annual_rate = bitget_data['funding_rate'] * 3 * 365
-    rate_difference = gate_annual_rate - bitget_annual_rate
-    
-    current_short_price = gate_data['mark_price']
-    current_long_price = bitget_data['mark_price']
+def find_opportunities(quotes_by_pair):
+    """
+    Best short/long exchange for every pair, in one vectorized pass.
+
+    Builds the (pair x exchange x exchange) matrix of annualized funding rate
+    differences over the configured exchanges and picks the largest entry per
+    pair among the exchange pairs whose mark prices are within MAX_PRICE_SPREAD.
+
+    Args:
+        quotes_by_pair: { pair: { exchange_name: market_data } }.
+
+    Returns:
+        { pair: (short_exchange_name, long_exchange_name, annualized_rate_difference) },
+        or None for a pair without two usable quotes.
+    """
+    exchange_names = list(registry.configured_exchanges())
+    pairs = list(quotes_by_pair)
+    rates = np.full((len(pairs), len(exchange_names)), np.nan)
+    prices = np.full((len(pairs), len(exchange_names)), np.nan)
+    for row, pair in enumerate(pairs):
+        quotes = quotes_by_pair[pair]
+        for column, exchange_name in enumerate(exchange_names):
+            market_data = quotes.get(exchange_name)
+            if market_data:
+                rates[row, column] = market_data['funding_rate']
+                prices[row, column] = market_data['mark_price']
+
+    short_index, long_index, rate_difference = funding_matrix.best_venue_pairs(
+        rates * 3 * 365, prices, config.MAX_PRICE_SPREAD)
+    return {
+        pair: None if np.isnan(rate_difference[row]) else
+        (exchange_names[short_index[row]], exchange_names[long_index[row]], float(rate_difference[row]))
+        for row, pair in enumerate(pairs)
+    }
+
+def check_and_manage_positions(pair, quotes, opportunity, now=None):
+    """
+    Checks if an open position should be closed, or if a new one should be opened.
+
+    `quotes` maps exchange names to market data; `opportunity` is the pair's
+    entry from find_opportunities(). `now` is the current time in epoch seconds,
+    the event time when quotes are replayed (default: the wall clock).
+    """
+    now = time.time() if now is None else now
 
     # --- Step 1: Manage existing positions ---
     if pair in open_positions:
         position = open_positions[pair]
-        logging.info(f"Managing existing position for {pair}.")
+        logging.info(f"Managing existing position for {pair} ({position['short_on']} short / {position['long_on']} long).")
+        short_data = quotes.get(position['short_on'])
+        long_data = quotes.get(position['long_on'])
+        if not short_data or not long_data:
+            logging.warning(f"Incomplete data for {pair} on {position['short_on']}/{position['long_on']}, skipping management for this cycle.")
+            BOT_INCOMPLETE_QUOTES.labels(pair).inc()
+            return
+
+        # 持倉方向的年化套利費率（做空交易所費率 - 做多交易所費率），轉為負值即表示費率反轉
+        rate_difference = short_data['funding_rate'] * 3 * 365 - long_data['funding_rate'] * 3 * 365
+        current_short_price = short_data['mark_price']
+        current_long_price = long_data['mark_price']
         
         # Pre-calculate metrics for closing checks
         unrealized_pnl = trade_logger.calculate_realized_pnl(
@@ -243,62 +324,71 @@ def check_and_manage_positions(pair, gate_data, bitget_data):
             current_short_price, current_long_price, position['size']
         )
         
-        holding_duration_hours = (time.time() - position['open_timestamp']) / 3600
+        holding_duration_hours = (now - position['open_timestamp']) / 3600
         current_price_spread = abs(current_short_price - current_long_price) / current_short_price
 
         # Check if the sign of the rate difference has flipped
-        # 由於現在記錄的是套利費率（總是正值），需要根據持倉方向來判斷反轉
-        if position['short_on'] == 'Gate.io':
-            # 原本做空 Gate.io，做多 Bitget
-            # 如果現在 Gate.io 費率 < Bitget 費率，表示反轉了
-            rate_reversal = rate_difference < 0
-        else:
-            # 原本做空 Bitget，做多 Gate.io
-            # 如果現在 Bitget 費率 < Gate.io 費率，表示反轉了
-            rate_reversal = rate_difference > 0
+        # 開倉時做空費率較高的交易所，若現在做空交易所的費率低於做多交易所，表示反轉了
+        rate_reversal = rate_difference < 0
 
-        close_timestamp = time.time()
+        close_timestamp = now
         funding_fee_profit = calculate_funding_fee_profit(position, rate_difference, close_timestamp)
 
         logging.info(f"Position Metrics | Unrealized PnL: ${unrealized_pnl:.2f}, Holding Time: {holding_duration_hours:.2f}h, Price Spread: {current_price_spread:.2%}, Rate Diff: {rate_difference:.2%}, Funding Profit: ${funding_fee_profit:.2f}")
+        position['live'] = {
+            'current_short_price': current_short_price,
+            'current_long_price': current_long_price,
+            'unrealized_pnl': unrealized_pnl,
+            'funding_fee_profit': funding_fee_profit,
+            'holding_time': holding_duration_hours,
+            'price_spread': current_price_spread,
+            'current_rate_diff_annualized_percent': rate_difference * 100,
+            'updated_at': close_timestamp,
+        }
+        if close_timestamp - last_pnl_event.get(pair, 0) >= PNL_EVENT_INTERVAL_SECONDS:
+            last_pnl_event[pair] = close_timestamp
+            event_stream.publish('pnl', {
+                'pair': pair, 'trade_id': position['trade_id'],
+                'unrealized_pnl': unrealized_pnl, 'funding_fee_profit': funding_fee_profit,
+                'holding_time': holding_duration_hours, 'price_spread': current_price_spread,
+                'short_price': current_short_price, 'long_price': current_long_price,
+            })
         logging.info(f"Closing Conditions | Max Holding: {config.MAX_HOLDING_DURATION_HOURS}h, Min Reversal: {config.MIN_HOLDING_HOURS_FOR_REVERSAL}h, Stop Loss: ${config.STOP_LOSS_USDT}")
 
         # Closing Condition Checks (in order of priority)
         if unrealized_pnl <= config.STOP_LOSS_USDT:
             logging.info(f"Closing {pair} due to STOP_LOSS: ${unrealized_pnl:.2f} <= ${config.STOP_LOSS_USDT}")
-            close_arbitrage_position(pair, "STOP_LOSS", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit)
+            close_arbitrage_position(pair, "STOP_LOSS", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit, now)
             return
 
         # 檢查當前套利費率是否低於平倉閾值
         current_arbitrage_rate = abs(rate_difference)
         if current_arbitrage_rate <= config.CLOSE_FUNDING_RATE_DIFFERENCE:
             logging.info(f"Closing {pair} due to LOW_ARBITRAGE_RATE: {current_arbitrage_rate:.2%} <= {config.CLOSE_FUNDING_RATE_DIFFERENCE:.2%}")
-            close_arbitrage_position(pair, "LOW_ARBITRAGE_RATE", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit)
+            close_arbitrage_position(pair, "LOW_ARBITRAGE_RATE", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit, now)
             return
 
         # 檢查持倉期間的價格偏差是否超過限制
         if current_price_spread > config.MAX_HOLDING_PRICE_SPREAD:
             logging.info(f"Closing {pair} due to MAX_HOLDING_PRICE_SPREAD: {current_price_spread:.2%} > {config.MAX_HOLDING_PRICE_SPREAD:.2%}")
-            close_arbitrage_position(pair, "MAX_HOLDING_PRICE_SPREAD", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit)
+            close_arbitrage_position(pair, "MAX_HOLDING_PRICE_SPREAD", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit, now)
             return
 
         if rate_reversal and holding_duration_hours > config.MIN_HOLDING_HOURS_FOR_REVERSAL:
             logging.info(f"Closing {pair} due to RATE_REVERSAL: {holding_duration_hours:.2f}h > {config.MIN_HOLDING_HOURS_FOR_REVERSAL}h")
-            close_arbitrage_position(pair, "RATE_REVERSAL", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit)
+            close_arbitrage_position(pair, "RATE_REVERSAL", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit, now)
             return
 
         if holding_duration_hours >= config.MAX_HOLDING_DURATION_HOURS:
             logging.info(f"Closing {pair} due to MAX_HOLDING_TIME: {holding_duration_hours:.2f}h >= {config.MAX_HOLDING_DURATION_HOURS}h")
-            close_arbitrage_position(pair, "MAX_HOLDING_TIME", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit)
+            close_arbitrage_position(pair, "MAX_HOLDING_TIME", current_short_price, current_long_price, unrealized_pnl, funding_fee_profit, now)
             return
         else:
             logging.info(f"Position {pair} not ready to close: {holding_duration_hours:.2f}h < {config.MAX_HOLDING_DURATION_HOURS}h")
 
     # --- Step 2: Look for new positions to open ---
     if pair not in open_positions:
-        price_spread = abs(gate_data['mark_price'] - bitget_data['mark_price']) / gate_data['mark_price']
-        
-        logging.info(f"Prices | Gate.io Mark: {current_short_price}, Bitget Mark: {current_long_price}, Spread: {price_spread:.2%}")
+        logging.info("Prices | " + ", ".join(f"{name} Mark: {market_data['mark_price']}" for name, market_data in quotes.items()))
 
         # 檢查總風險敞口是否超過限制
         total_exposure = sum(position['size'] for position in open_positions.values())
@@ -306,86 +396,217 @@ def check_and_manage_positions(pair, gate_data, bitget_data):
             logging.info(f"Skipping {pair} due to MAX_TOTAL_EXPOSURE: ${total_exposure + config.POSITION_SIZE_USDT:.2f} > ${config.MAX_TOTAL_EXPOSURE_USDT}")
             return
 
-        if abs(rate_difference) >= config.MIN_FUNDING_RATE_DIFFERENCE and price_spread <= config.MAX_PRICE_SPREAD:
-            logging.info("!!! NEW ARBITRAGE OPPORTUNITY DETECTED !!!")
-            if rate_difference > 0: # Gate rate is higher, short Gate, long Bitget
-                # 做空 Gate.io，做多 Bitget：獲得的年化費率差 = Gate.io費率 - Bitget費率 = 正值
-                arbitrage_rate = rate_difference
-                open_arbitrage_position(pair, "Gate.io", "Bitget", config.POSITION_SIZE_USDT, gate_data, bitget_data, arbitrage_rate)
-            else: # Bitget rate is higher, short Bitget, long Gate
-                # 做空 Bitget，做多 Gate.io：獲得的年化費率差 = Bitget費率 - Gate.io費率 = 正值
-                arbitrage_rate = -rate_difference
-                open_arbitrage_position(pair, "Bitget", "Gate.io", config.POSITION_SIZE_USDT, gate_data, bitget_data, arbitrage_rate)
+        # opportunity 已是價差在 MAX_PRICE_SPREAD 內、費率差最大的交易所組合：做空費率最高者，做多費率最低者
+        if opportunity is not None and opportunity[2] >= config.MIN_FUNDING_RATE_DIFFERENCE:
+            short_exchange_name, long_exchange_name, arbitrage_rate = opportunity
+            logging.info(f"!!! NEW ARBITRAGE OPPORTUNITY DETECTED: short {short_exchange_name}, long {long_exchange_name}, {arbitrage_rate:.2%} !!!")
+            open_arbitrage_position(pair, short_exchange_name, long_exchange_name, config.POSITION_SIZE_USDT,
+                                    quotes[short_exchange_name], quotes[long_exchange_name], arbitrage_rate, now)
         else:
             logging.info("No profitable arbitrage opportunity found.")
 
-def main():
-    """The main function to run the trading bot."""
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-    logging.info("Starting trading bot...")
-
-    # Load config
-    config.reload_config()
-
-    # Initialize trade log file
-    trade_logger.initialize_trade_log()
-
-    # Rebuild state from history before doing anything else
-    rebuild_state_from_history()
-
+def get_exchange_params():
+    """Returns { exchange_name: (ccxt_id, client_config) } for the exchanges the bot trades on (ARBITRAGE_EXCHANGES)."""
+    return {
+        name: (ccxt_id, {
+            **config.exchange_credentials(ccxt_id),
+            'options': {
+                'defaultType': 'swap',
+                'adjustForTimeDifference': True,
+            },
+        })
+        for name, ccxt_id in registry.configured_exchanges().items()
+    }
+
+def evaluate_pair(pair, quotes, opportunities=None, now=None):
+    """
+    Runs the open/close checks for one pair given { exchange_name: market_data }.
+    `opportunities` is find_opportunities() output for the whole cycle, if already computed;
+    `now` is passed on to check_and_manage_positions().
+    """
+    # Exchanges whose request failed are reported as None
+    quotes = {name: market_data for name, market_data in quotes.items() if market_data}
+    if len(quotes) < 2:
+        logging.warning(f"Incomplete data for {pair}, skipping management for this cycle.")
+        BOT_INCOMPLETE_QUOTES.labels(pair).inc()
+        return
+    started = time.perf_counter()
+    if opportunities is None:
+        opportunities = find_opportunities({pair: quotes})
+    check_and_manage_positions(pair, quotes, opportunities.get(pair), now)
+    BOT_POSITION_CHECK_SECONDS.labels(pair).observe(time.perf_counter() - started)
+
+def run_polling_cycle(collector):
+    """One polling iteration: collects market data for all configured pairs, evaluates them and publishes the snapshot."""
+    cycle_started = time.perf_counter()
+    trading_pairs = list(config.TRADING_PAIRS)
+    collect_started = time.time()
+    snapshot = collector.collect([f"{pair}:USDT" for pair in trading_pairs])
+    BOT_MARKET_DATA_SECONDS.observe(time.time() - collect_started)
+    logging.info(f"Collected market data for {len(trading_pairs)} pairs in {time.time() - collect_started:.2f}s")
+
+    # Venue selection for every pair at once; the checks below then run pair by pair, in order
+    quotes_by_pair = {
+        pair: {name: market_data for name, market_data in snapshot.get(f"{pair}:USDT", {}).items() if market_data}
+        for pair in trading_pairs
+    }
+    opportunities = find_opportunities(quotes_by_pair)
+
+    for pair in trading_pairs:
+        apply_pending_config()
+        logging.info(f"----- Checking pair: {pair} -----")
+        evaluate_pair(pair, quotes_by_pair[pair], opportunities)
+    publish_position_snapshot()
+    BOT_CYCLE_SECONDS.labels('polling').observe(time.perf_counter() - cycle_started)
+
+def create_exchange_clients():
+    """CCXT clients for the exchanges the bot trades on, or local mock exchanges when EXCHANGE_BACKEND is 'mock'."""
+    if config.EXCHANGE_BACKEND == 'mock':
+        from exchanges.mock_exchange import create_mock_clients
+        logging.warning("EXCHANGE_BACKEND=mock: trading against local mock exchanges, no network access.")
+        return create_mock_clients(registry.configured_exchanges(), config.MOCK_EXCHANGE_SETTINGS or None)
+    return {
+        name: getattr(ccxt, ccxt_id)(client_config)
+        for name, (ccxt_id, client_config) in get_exchange_params().items()
+    }
+
+def run_polling_loop():
+    """Polls all exchanges every LOOP_INTERVAL_SECONDS and evaluates all pairs on a complete snapshot."""
     # Initialize exchanges
-    gateio_exchange = getattr(ccxt, 'gateio')({
-        'apiKey': config.GATEIO_API_KEY,
-        'secret': config.GATEIO_SECRET_KEY,
-        'options': {
-            'defaultType': 'swap',
-            'adjustForTimeDifference': True,
-        },
-    })
-
-    bitget_exchange = getattr(ccxt, 'bitget')({
-        'apiKey': config.BITGET_API_KEY,
-        'secret': config.BITGET_SECRET_KEY,
-        'password': config.BITGET_API_PASSPHRASE,
-        'options': {
-            'defaultType': 'swap',
-            'adjustForTimeDifference': True,
-        },
-    })
+    exchange_clients = create_exchange_clients()
 
     # Load markets to ensure all symbols are available
     try:
         logging.info("Loading markets for all exchanges...")
-        gateio_exchange.load_markets()
-        bitget_exchange.load_markets()
+        for exchange in exchange_clients.values():
+            exchange.load_markets()
         logging.info("Markets loaded successfully.")
     except ccxt.BaseError as e:
         logging.error(f"Failed to load markets: {e}")
         return
 
+    # The exchanges are queried concurrently, each within its own rate limit
+    collector = MarketDataCollector(exchange_clients, max_workers_per_exchange=config.MARKET_DATA_MAX_WORKERS)
+
     while True:
         try:
-            # Check for configuration updates
-            check_config_updates()
+            apply_pending_config()
             
             logging.info("--- New iteration ---")
-            for pair in config.TRADING_PAIRS:
-                logging.info(f"----- Checking pair: {pair} -----")
-                ccxt_swap_symbol = f"{pair}:USDT"
-                gate_market_data = get_market_data(gateio_exchange, ccxt_swap_symbol)
-                bitget_market_data = get_market_data(bitget_exchange, ccxt_swap_symbol)
-                if not gate_market_data or not bitget_market_data:
-                    logging.warning(f"Incomplete data for {pair}, skipping management for this cycle.")
-                    continue
-                check_and_manage_positions(pair, gate_market_data, bitget_market_data)
+            run_polling_cycle(collector)
+            metrics.export_to_file()
             logging.info(f"--- Iteration complete. Sleeping for {config.LOOP_INTERVAL_SECONDS} seconds... ---")
-            time.sleep(config.LOOP_INTERVAL_SECONDS)
+            sleep_until_next_cycle(config.LOOP_INTERVAL_SECONDS)
         except KeyboardInterrupt:
             logging.info("Trading bot stopped by user.")
+            collector.close()
             break
         except Exception as e:
             logging.error(f"An unexpected error occurred in the main loop: {e}", exc_info=True)
+            BOT_LOOP_ERRORS.labels('polling').inc()
             time.sleep(60)
 
+def create_stream_feed():
+    """Builds the streaming feed: a local replay file if STREAM_REPLAY_FILE is set, otherwise live websockets."""
+    symbols = [f"{pair}:USDT" for pair in config.TRADING_PAIRS]
+    if config.STREAM_REPLAY_FILE:
+        logging.info(f"Streaming mode: replaying quotes from {config.STREAM_REPLAY_FILE}")
+        return ReplayFeed(config.STREAM_REPLAY_FILE, speed=config.STREAM_REPLAY_SPEED)
+    logging.info(f"Streaming mode: subscribing to websocket tickers for {len(symbols)} symbols")
+    return CcxtProFeed(get_exchange_params(), symbols, funding_refresh_seconds=config.STREAM_FUNDING_REFRESH_SECONDS)
+
+def run_streaming_loop(feed):
+    """
+    Event-driven loop: evaluates a pair as soon as any of its quotes changes.
+    Returns when the feed stops (end of a replay file, or a dead websocket feed).
+
+    Quote ages, holding times and trade timestamps follow `feed.now()`, so a
+    replay behaves as it did when the quotes were recorded.
+    """
+    book = QuoteBook(get_exchange_params().keys())
+    feed_thread = start_feed(feed, book)
+    last_full_sweep = feed.now()
+    last_snapshot = 0.0
+    snapshot_pending = False
+
+    while True:
+        try:
+            apply_pending_config()
+
+            # Keep websocket subscriptions in sync with the configured pairs
+            symbols = [f"{pair}:USDT" for pair in config.TRADING_PAIRS]
+            if isinstance(feed, CcxtProFeed) and feed.symbols != symbols:
+                feed.symbols = symbols
+
+            changed_symbols = book.wait_for_changes(timeout=1.0)
+            if not changed_symbols and (book.closed or not feed_thread.is_alive()):
+                return
+
+            # Time-based exits (e.g. MAX_HOLDING_TIME) must fire even when a quiet pair stops ticking
+            feed_now = feed.now()
+            if feed_now - last_full_sweep >= config.LOOP_INTERVAL_SECONDS:
+                changed_symbols = set(changed_symbols) | set(symbols)
+                last_full_sweep = feed_now
+
+            batch_started = time.perf_counter()
+            trading_pairs = set(config.TRADING_PAIRS)
+            for symbol in changed_symbols:
+                pair = symbol.split(':')[0]
+                if pair not in trading_pairs:
+                    continue
+                apply_pending_config()
+                evaluate_pair(pair, book.get(symbol, max_age=config.STREAM_MAX_QUOTE_AGE_SECONDS, now=feed_now), now=feed_now)
+
+            if changed_symbols:
+                BOT_CYCLE_SECONDS.labels('streaming').observe(time.perf_counter() - batch_started)
+
+            # Republish after evaluations, and at least once per sweep so an idle bot does not look stale
+            snapshot_pending = snapshot_pending or bool(changed_symbols)
+            now = time.time()
+            if (snapshot_pending and now - last_snapshot >= POSITION_SNAPSHOT_INTERVAL_SECONDS) \
+                    or now - last_snapshot >= config.LOOP_INTERVAL_SECONDS:
+                publish_position_snapshot()
+                metrics.export_to_file()
+                last_snapshot = now
+                snapshot_pending = False
+        except KeyboardInterrupt:
+            logging.info("Trading bot stopped by user.")
+            feed.stop()
+            raise
+        except Exception as e:
+            logging.error(f"An unexpected error occurred in the streaming loop: {e}", exc_info=True)
+            BOT_LOOP_ERRORS.labels('streaming').inc()
+            time.sleep(1)
+
+def main():
+    """The main function to run the trading bot."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.info("Starting trading bot...")
+
+    # Load config, then switch to the newest published snapshot (if any) and listen for new ones
+    config.reload_config()
+    config_listener.start()
+    apply_pending_config()
+
+    # Initialize trade log file
+    trade_logger.initialize_trade_log()
+
+    # Rebuild state from history before doing anything else
+    rebuild_state_from_history()
+    publish_position_snapshot()
+
+    if config.MARKET_DATA_MODE == 'streaming' and config.EXCHANGE_BACKEND == 'mock' and not config.STREAM_REPLAY_FILE:
+        logging.warning("The mock exchanges have no websocket feed, using polling mode (or set STREAM_REPLAY_FILE).")
+    elif config.MARKET_DATA_MODE == 'streaming':
+        try:
+            run_streaming_loop(create_stream_feed())
+        except KeyboardInterrupt:
+            return
+        if config.STREAM_REPLAY_FILE:
+            return
+        logging.warning("Streaming feed stopped, falling back to polling mode.")
+
+    run_polling_loop()
+
 if __name__ == '__main__':
     main() 
\ No newline at end of file
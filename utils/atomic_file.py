@@ -0,0 +1,44 @@
+import json
+import os
+import stat
+import tempfile
+
+# os.umask can only be read by setting it, so read it once at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _file_mode(path):
+    """Mode of the existing `path`, or the mode open() would create it with."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+def atomic_write(path, data, encoding='utf-8'):
+    """
+    Replaces `path` with `data` (str or bytes) in one step.
+
+    The data is written to a temporary file in the same directory, flushed to
+    disk and renamed over `path`, so readers see either the old or the new
+    contents, never a partially written file. The file keeps its permissions
+    (mkstemp would create it owner-only), so other services sharing the data
+    directory can still read it.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode(encoding) if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def atomic_write_json(path, obj, **dump_kwargs):
+    atomic_write(path, json.dumps(obj, **dump_kwargs))
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from types import MappingProxyType
+
+import config
+from utils.atomic_file import atomic_write_json
+from utils.file_cache import file_version
+
+SNAPSHOT_FILE = os.path.join(config.DATA_DIR, 'config_snapshot.json')
+STATUS_FILE = os.path.join(config.DATA_DIR, 'config_applied.json')
+SOCKET_PATH = os.path.join(config.DATA_DIR, 'bot_control.sock')
+
+
+class ConfigSnapshot:
+    """
+    An immutable, versioned set of strategy parameters (the config.json values).
+
+    `version` is the publication time in nanoseconds, so later publications
+    always have higher versions, and `published_at` (epoch seconds) is used to
+    measure how long the bot took to apply it.
+    """
+
+    __slots__ = ('version', 'published_at', 'values')
+
+    def __init__(self, version, published_at, values):
+        object.__setattr__(self, 'version', int(version))
+        object.__setattr__(self, 'published_at', float(published_at))
+        object.__setattr__(self, 'values', MappingProxyType(dict(values)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ConfigSnapshot is immutable')
+
+    def to_dict(self):
+        return {'version': self.version, 'published_at': self.published_at, 'values': dict(self.values)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['version'], data['published_at'], data['values'])
+
+
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def read_snapshot(path=SNAPSHOT_FILE):
+    data = read_json(path)
+    return ConfigSnapshot.from_dict(data) if data else None
+
+def read_status(path=STATUS_FILE):
+    """The bot's last applied version and its propagation delay, or None."""
+    return read_json(path)
+
+def publish(values, snapshot_path=SNAPSHOT_FILE, socket_path=SOCKET_PATH):
+    """
+    Writes a new snapshot atomically and notifies the bot through its socket.
+    Returns (snapshot, notified); notified is False when no bot is listening,
+    in which case the bot picks the snapshot up at its next cycle.
+    """
+    now = time.time()
+    snapshot = ConfigSnapshot(time.time_ns(), now, values)
+    atomic_write_json(snapshot_path, snapshot.to_dict(), indent=4)
+    notified = False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(str(snapshot.version).encode(), socket_path)
+        notified = True
+    except (OSError, AttributeError):  # no listener, or no unix sockets on this platform
+        pass
+    return snapshot, notified
+
+
+class ConfigListener:
+    """
+    Bot side of the channel: receives publications and hands out new snapshots.
+
+    A background thread blocks on a unix datagram socket and only records that
+    something was published; the bot applies snapshots itself at safe points
+    by calling `poll()`, and sleeps with `wait()` so a publication wakes it
+    immediately. `poll()` also compares the snapshot file's version, so
+    publications are never missed when the socket cannot be used (e.g. the web
+    server runs in another container that only shares the data directory).
+    """
+
+    def __init__(self, snapshot_path=SNAPSHOT_FILE, status_path=STATUS_FILE, socket_path=SOCKET_PATH):
+        self.snapshot_path = snapshot_path
+        self.status_path = status_path
+        self.socket_path = socket_path
+        self.applied_version = 0
+        self._seen_file_version = None
+        self._notified = threading.Event()
+        self._sock = None
+
+    def start(self):
+        """
+        Binds the socket and starts the receiving thread. Returns False if unavailable.
+
+        The version applied before a restart is read back from the status file, so
+        the last snapshot is not applied and reported again with the downtime as
+        its propagation delay.
+        """
+        try:
+            status = read_status(self.status_path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read config status {self.status_path}: {e}")
+            status = None
+        if status and 'version' in status:
+            self.applied_version = max(self.applied_version, int(status['version']))
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                os.unlink(self.socket_path)  # left behind by a previous run
+            except FileNotFoundError:
+                pass
+            sock.bind(self.socket_path)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"Config socket unavailable ({e}), config changes are picked up once per cycle")
+            return False
+        self._sock = sock
+        threading.Thread(target=self._receive, name='config-listener', daemon=True).start()
+        return True
+
+    def _receive(self):
+        while True:
+            try:
+                self._sock.recv(64)
+            except OSError as e:
+                logging.error(f"Config socket closed: {e}")
+                return
+            self._notified.set()
+
+    def wait(self, timeout):
+        """Sleeps up to `timeout` seconds. Returns True early if a publication arrived."""
+        return self._notified.wait(timeout)
+
+    def poll(self):
+        """The newest snapshot if it has not been applied yet, otherwise None."""
+        self._notified.clear()
+        version = file_version(self.snapshot_path)
+        if version is None or version == self._seen_file_version:
+            return None
+        try:
+            snapshot = read_snapshot(self.snapshot_path)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Could not read config snapshot {self.snapshot_path}: {e}")
+            return None
+        self._seen_file_version = version
+        if snapshot is None or snapshot.version <= self.applied_version:
+            return None
+        return snapshot
+
+    def report_applied(self, snapshot):
+        """Records the applied version and its propagation delay for the web UI."""
+        self.applied_version = snapshot.version
+        applied_at = time.time()
+        status = {
+            'version': snapshot.version,
+            'published_at': snapshot.published_at,
+            'applied_at': applied_at,
+            'propagation_delay_seconds': applied_at - snapshot.published_at,
+        }
+        try:
+            atomic_write_json(self.status_path, status)
+        except OSError as e:
+            logging.error(f"Could not write config status {self.status_path}: {e}")
+        return status
@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import config
+
+SPOOL_FILE = os.path.join(config.DATA_DIR, 'events.jsonl')
+# The spool is rotated to events.jsonl.1 once it grows past this size
+SPOOL_MAX_BYTES = 5 * 1024 * 1024
+
+
+class EventSpool:
+    """
+    Append-only JSON-lines file the trading bot publishes events to.
+
+    Every event gets an increasing integer id (nanoseconds, so ids keep
+    increasing across restarts) that browsers send back as Last-Event-ID when
+    they reconnect. The web server tails the file with an EventHub, which
+    works whether the bot runs in the same process or in its own.
+    """
+
+    def __init__(self, path=SPOOL_FILE, max_bytes=SPOOL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._last_id = 0
+
+    def publish(self, event_type, data):
+        """Appends one event. Errors are logged, never raised: trading must not depend on the dashboard."""
+        try:
+            with self._lock:
+                self._last_id = max(self._last_id + 1, time.time_ns())
+                line = json.dumps({'id': self._last_id, 'type': event_type, 'time': time.time(), 'data': data},
+                                  default=str)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+                    size = f.tell()
+                if size > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+        except (OSError, TypeError, ValueError) as e:
+            logging.error(f"Failed to publish {event_type} event: {e}")
+
+
+class Subscription:
+    """One connected client: a bounded queue the hub pushes events into."""
+
+    def __init__(self, hub, max_pending):
+        self._hub = hub
+        self._pending = deque(maxlen=max_pending)  # a stalled client drops its oldest events
+        self._cond = threading.Condition()
+
+    def push(self, events):
+        with self._cond:
+            self._pending.extend(events)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Blocks until events are available (or timeout) and returns them all."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            events = list(self._pending)
+            self._pending.clear()
+            return events
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Server-side fan-out of the bot's events to any number of SSE clients.
+
+    A single background thread tails the spool file (following rotation) and
+    hands every new event to all subscriptions, so the cost per event does not
+    depend on how each client is served. The most recent events are kept so a
+    reconnecting client can resume from its Last-Event-ID without a gap.
+    """
+
+    def __init__(self, path=SPOOL_FILE, poll_interval=0.2, history=1000, max_pending=1000):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self._recent = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Starts the tailing thread (idempotent)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+                self._thread.start()
+
+    def subscribe(self, last_event_id=None):
+        """
+        New subscription. With `last_event_id`, the retained events after it are
+        queued first; without one, only events published from now on are delivered.
+        """
+        self.start()
+        subscription = Subscription(self, self.max_pending)
+        with self._lock:
+            if last_event_id is not None:
+                subscription.push([event for event in self._recent if event['id'] > last_event_id])
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _dispatch(self, lines):
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logging.warning(f"Skipping malformed event line in {self.path}")
+        if not events:
+            return
+        with self._lock:
+            self._recent.extend(events)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(events)
+
+    def _run(self):
+        f = None
+        inode = None
+        buffered = ''
+        # Events published before the server started are not replayed
+        skip_existing = os.path.exists(self.path)
+        while True:
+            try:
+                if f is None:
+                    try:
+                        f = open(self.path, 'r', encoding='utf-8')
+                    except FileNotFoundError:
+                        time.sleep(self.poll_interval)
+                        continue
+                    inode = os.fstat(f.fileno()).st_ino
+                    if skip_existing:
+                        f.seek(0, os.SEEK_END)
+                        skip_existing = False
+
+                chunk = f.read()
+                if chunk:
+                    buffered += chunk
+                    complete, _, buffered = buffered.rpartition('\n')
+                    if complete:
+                        self._dispatch(complete.split('\n'))
+                    continue
+
+                # At end of file: follow a rotation once the old file is drained
+                try:
+                    rotated = os.stat(self.path).st_ino != inode
+                except FileNotFoundError:
+                    rotated = False
+                if rotated:
+                    f.close()
+                    f = None
+                    buffered = ''
+                    continue
+                time.sleep(self.poll_interval)
+            except Exception as e:
+                logging.error(f"Event hub error while tailing {self.path}: {e}", exc_info=True)
+                if f is not None:
+                    f.close()
+                f = None
+                buffered = ''
+                skip_existing = True
+                time.sleep(1)
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+def publish(event_type, data):
+    """Publishes an event to the default spool file."""
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = EventSpool()
+    _spool.publish(event_type, data)
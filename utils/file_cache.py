@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+def file_version(path):
+    """Identity of a file's current contents: (mtime_ns, size, inode), or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def estimate_size(value):
+    """Rough in-memory size of a cached value in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value[:100]) * max(1, len(value) // 100)
+    return sys.getsizeof(value)
+
+class FileCache:
+    """
+    Thread-safe LRU cache for data parsed or derived from files.
+
+    Every entry remembers the version (mtime, size, inode) of the files it was
+    built from and is rebuilt only when one of them changes. Concurrent misses
+    on the same key load once. Entries are evicted least-recently-used first
+    when either `max_entries` or `max_bytes` is exceeded. Cached values are
+    shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (version, value, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+        return False, None
+
+    def get(self, key, paths, loader):
+        """Return the cached value for `key`, calling `loader()` if any file in `paths` changed."""
+        version = tuple(file_version(path) for path in paths)
+        found, value = self._lookup(key, version)
+        if found:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another thread may have loaded it while we waited
+            found, value = self._lookup(key, version)
+            if found:
+                return value
+            value = loader()
+            self._store(key, version, value)
+            return value
+
+    def _store(self, key, version, value):
+        size = estimate_size(value)
+        with self._lock:
+            self.misses += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[2]
+            self._entries[key] = (version, value, size)
+            self._total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted[2]
+                self._key_locks.pop(evicted_key, None)
+                self.evictions += 1
+                if evicted_key == key:
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,46 @@
+"""
+Funding rate differences between every pair of exchanges, for many symbols at once.
+
+Rates come as arrays whose last axis has one column per exchange (NaN where an
+exchange has no quote). Entry [..., i, j] of the difference matrix is the rate
+a position collects by going short on exchange i and long on exchange j
+(rate_i - rate_j), so the best position for a symbol is the largest entry of
+its matrix. Adding an exchange adds a row and a column, not a code path.
+"""
+import numpy as np
+
+def rate_difference_matrix(rates):
+    """(..., E) rates -> (..., E, E) short-minus-long differences, NaN on the diagonal and where a rate is missing."""
+    rates = np.asarray(rates, dtype=float)
+    diff = rates[..., :, None] - rates[..., None, :]
+    diagonal = np.arange(rates.shape[-1])
+    diff[..., diagonal, diagonal] = np.nan
+    return diff
+
+def price_spread_matrix(prices):
+    """(..., E) mark prices -> (..., E, E) price spreads |p_i - p_j| / p_i, relative to the short leg."""
+    prices = np.asarray(prices, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.abs(prices[..., :, None] - prices[..., None, :]) / prices[..., :, None]
+
+def best_venue_pairs(rates, prices=None, max_price_spread=None):
+    """
+    Picks the best short and long exchange for every row of `rates` in one pass.
+
+    With `max_price_spread`, only exchange pairs whose price spread (see
+    price_spread_matrix) is at most that are considered. Ties go to the first
+    pair in (short, long) order of the columns.
+
+    Returns:
+        (short_index, long_index, rate_difference) arrays shaped like `rates`
+        without its last axis. rate_difference is NaN where no pair of exchanges
+        qualifies (fewer than two quotes); the indices are 0 there.
+    """
+    diff = rate_difference_matrix(rates)
+    if max_price_spread is not None:
+        diff[~(price_spread_matrix(prices) <= max_price_spread)] = np.nan
+    num_exchanges = diff.shape[-1]
+    flat = diff.reshape(diff.shape[:-2] + (num_exchanges * num_exchanges,))
+    best = np.argmax(np.where(np.isnan(flat), -np.inf, flat), axis=-1)
+    best_diff = np.take_along_axis(flat, best[..., None], axis=-1)[..., 0]
+    return best // num_exchanges, best % num_exchanges, best_diff
@@ -0,0 +1,129 @@
+import csv
+import logging
+import os
+import sqlite3
+import threading
+
+import config
+from utils.timestamps import parse_timestamp
+
+DB_FILE = os.path.join(config.DATA_DIR, 'funding_rates.db')
+LEGACY_CSV_FILE = os.path.join(config.DATA_DIR, 'all_funding_rates.csv')
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS funding_rates (
+    symbol TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    funding_rate REAL NOT NULL,
+    PRIMARY KEY (symbol, exchange, timestamp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_funding_rates_timestamp ON funding_rates (timestamp);
+"""
+
+class FundingRateStore:
+    """
+    Funding rate history in SQLite, clustered on (symbol, exchange, timestamp).
+
+    Because the table is stored in primary-key order, reading one symbol is a
+    range scan that costs O(rows for that symbol), and replacing one symbol's
+    history touches only that symbol's rows. The database runs in WAL mode so
+    the web server can read while the updater writes. On first use, rows from
+    the legacy all_funding_rates.csv are imported once.
+    """
+
+    def __init__(self, path=DB_FILE, legacy_csv=LEGACY_CSV_FILE):
+        self.path = path
+        self.legacy_csv = legacy_csv
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    self._import_legacy_csv(conn)
+                    self._initialized = True
+        return conn
+
+    def _import_legacy_csv(self, conn):
+        if not self.legacy_csv or not os.path.exists(self.legacy_csv):
+            return
+        if conn.execute("SELECT 1 FROM funding_rates LIMIT 1").fetchone():
+            return
+        try:
+            with open(self.legacy_csv, 'r', encoding='utf-8') as f:
+                rows = [
+                    (row['symbol'], row['exchange'], parse_timestamp(row['timestamp']), float(row['funding_rate']))
+                    for row in csv.DictReader(f)
+                ]
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO funding_rates VALUES (?, ?, ?, ?)", rows)
+            logging.info(f"Imported {len(rows)} funding rate records from {self.legacy_csv}")
+        except Exception as e:
+            logging.error(f"Failed to import legacy funding rate CSV {self.legacy_csv}: {e}", exc_info=True)
+
+    def replace_symbol(self, symbol, rows):
+        """Replaces the stored history of one symbol with `rows` (dicts with epoch-second timestamps)."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM funding_rates WHERE symbol = ?", (symbol,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO funding_rates VALUES (?, ?, ?, ?)",
+                [(symbol, row['exchange'], int(row['timestamp']), float(row['funding_rate'])) for row in rows]
+            )
+
+    def delete_before(self, timestamp):
+        """Drops rows older than `timestamp` and returns the set of symbols that lost rows."""
+        conn = self._connect()
+        with conn:
+            symbols = {r[0] for r in conn.execute("SELECT DISTINCT symbol FROM funding_rates WHERE timestamp < ?", (timestamp,))}
+            conn.execute("DELETE FROM funding_rates WHERE timestamp < ?", (timestamp,))
+        return symbols
+
+    def delete_symbols_except(self, symbols):
+        """Drops every symbol not in `symbols` and returns the dropped symbols."""
+        conn = self._connect()
+        keep = set(symbols)
+        with conn:
+            dropped = self.symbols() - keep
+            conn.executemany("DELETE FROM funding_rates WHERE symbol = ?", [(s,) for s in dropped])
+        return dropped
+
+    def high_water_marks(self):
+        """Latest stored settlement timestamp per (symbol, exchange)."""
+        rows = self._connect().execute(
+            "SELECT symbol, exchange, MAX(timestamp) FROM funding_rates GROUP BY symbol, exchange"
+        )
+        return {(symbol, exchange): ts for symbol, exchange, ts in rows}
+
+    def symbol_rows(self, symbol):
+        """All stored rows of one symbol, oldest first."""
+        rows = self._connect().execute(
+            "SELECT symbol, exchange, timestamp, funding_rate FROM funding_rates WHERE symbol = ? ORDER BY timestamp",
+            (symbol,)
+        )
+        return [_row_dict(row) for row in rows]
+
+    def all_rows(self):
+        rows = self._connect().execute("SELECT symbol, exchange, timestamp, funding_rate FROM funding_rates")
+        return [_row_dict(row) for row in rows]
+
+    def symbols(self):
+        return {r[0] for r in self._connect().execute("SELECT DISTINCT symbol FROM funding_rates")}
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM funding_rates").fetchone()[0]
+
+
+def _row_dict(row):
+    return {'symbol': row[0], 'exchange': row[1], 'timestamp': row[2], 'funding_rate': row[3]}
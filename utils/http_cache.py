@@ -0,0 +1,59 @@
+import gzip
+import hashlib
+import os
+import time
+
+from utils.file_cache import file_version
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used when brotli is not installed
+    brotli = None
+
+# Changes on every start so clients never reuse a response rendered by older code
+PROCESS_TOKEN = f"{os.getpid()}-{time.time_ns()}"
+
+# Smaller bodies are sent uncompressed (the headers would cost more than the savings)
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain'}
+
+def data_etag(paths, *parts):
+    """
+    Entity tag of a response derived from the files in `paths`.
+
+    Built from the file versions (mtime, size, inode) plus `parts` (e.g. the
+    query string), so it can be computed with a few stat() calls before doing
+    any of the work needed to render the response.
+    """
+    versions = tuple(file_version(path) for path in paths)
+    return hashlib.sha1(repr((PROCESS_TOKEN, versions, parts)).encode()).hexdigest()[:20]
+
+def choose_encoding(accept_encodings):
+    """Best supported content coding for a request's Accept-Encoding, or None."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response, accept_encodings):
+    """
+    Compresses a buffered response body in place when the client accepts it
+    and the body is large enough. Streamed responses are left untouched.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=5))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,161 @@
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class Job:
+    """
+    A background job and its progress.
+
+    The job function receives the Job and reports progress with `update()`;
+    readers get a consistent view with `snapshot()`. `params` holds the keyword
+    arguments the job was submitted with.
+    """
+
+    def __init__(self, key, name, params=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.name = name
+        self.params = dict(params or {})
+        self.status = 'running'
+        self.stage = 'queued'
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._stage_started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def update(self, stage=None, done=None, total=None):
+        """Reports progress. Changing the stage resets the done/total counters."""
+        with self._lock:
+            if stage is not None and stage != self.stage:
+                self.stage = stage
+                self.done = 0
+                self.total = None
+                self._stage_started_at = time.monotonic()
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+        self._finished.set()
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished. Returns False on timeout."""
+        return self._finished.wait(timeout)
+
+    @property
+    def running(self):
+        return not self._finished.is_set()
+
+    def eta_seconds(self):
+        """Remaining time of the current stage, extrapolated from its progress so far."""
+        if not self.running or not self.total or not self.done:
+            return None
+        elapsed = time.monotonic() - self._stage_started_at
+        return elapsed / self.done * (self.total - self.done)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'name': self.name,
+                'status': self.status,
+                'stage': self.stage,
+                'done': self.done,
+                'total': self.total,
+                'eta_seconds': self.eta_seconds(),
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'result': self.result,
+                'error': self.error,
+            }
+
+
+class JobConflict(Exception):
+    """Raised by JobRunner.submit when the running job of the key cannot stand in for the new one."""
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.id} ({job.name}) is already running")
+        self.job = job
+
+
+class JobRunner:
+    """
+    Runs jobs on background threads, at most one per key.
+
+    Submitting a key whose job is still running returns that job instead of
+    starting another, so concurrent triggers (an API call and the hourly
+    updater, or a double click) share one run. Finished jobs are kept for
+    inspection up to `history` entries.
+    """
+
+    def __init__(self, history=20):
+        self.history = history
+        self._jobs = OrderedDict()  # job_id -> Job
+        self._running = {}  # key -> Job
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def submit(self, key, func, *args, name=None, joins=None, **kwargs):
+        """
+        Starts `func(job, *args, **kwargs)` in the background unless a job with
+        the same key is running. Returns (job, created).
+
+        `joins(running_job)` decides whether the running job also serves this
+        request; if it returns False, JobConflict is raised instead.
+        """
+        with self._lock:
+            job = self._running.get(key)
+            if job is not None:
+                if joins is not None and not joins(job):
+                    raise JobConflict(job)
+                return job, False
+            job = Job(key, name or key, params=kwargs)
+            self._running[key] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.running:
+                    break
+                del self._jobs[oldest_id]
+
+        thread = threading.Thread(target=self._run, args=(job, func, args, kwargs),
+                                  name=f"job-{key}-{next(self._counter)}", daemon=True)
+        thread.start()
+        return job, True
+
+    def _run(self, job, func, args, kwargs):
+        logging.info(f"Job {job.id} ({job.name}) started")
+        status, result, error = 'succeeded', None, None
+        try:
+            result = func(job, *args, **kwargs)
+        except Exception as e:
+            logging.error(f"Job {job.id} ({job.name}) failed: {e}", exc_info=True)
+            status, error = 'failed', str(e)
+        # Release the key before reporting completion, so a submit after wait() starts a new run
+        with self._lock:
+            if self._running.get(job.key) is job:
+                del self._running[job.key]
+        job._finish(status, result=result, error=error)
+        logging.info(f"Job {job.id} ({job.name}) {status} in {job.finished_at - job.started_at:.1f}s")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def running(self, key):
+        with self._lock:
+            return self._running.get(key)
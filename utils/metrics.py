@@ -0,0 +1,222 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+import config
+from utils.atomic_file import atomic_write
+
+# Metrics of a bot running in its own process, merged into the web server's /metrics
+BOT_METRICS_FILE = os.path.join(config.DATA_DIR, 'metrics_bot.prom')
+# The bot exports at least once per LOOP_INTERVAL_SECONDS; an older file is from a bot that stopped
+STALE_EXPORT_INTERVALS = 3
+
+# Default histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Identifies this process in exported files (pids repeat across containers)
+PROCESS_TOKEN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _HistogramChild:
+    """Bucket counts of one label combination, allocated once."""
+
+    __slots__ = ('_bounds', '_counts', '_sum', '_lock')
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def _collect(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _CounterChild:
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def _collect(self):
+        return self._value
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        """
+        The child for one label combination. Children are created on first use
+        and then reused; hot paths should keep the child instead of calling this
+        on every observation.
+        """
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        with self._lock:
+            children = sorted(self._children.items())
+        if not children:
+            return []
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Histogram(_Metric):
+    """Prometheus histogram with fixed, pre-allocated buckets."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        counts, total = child._collect()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = _format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {_format_value(total)}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def total(self):
+        """Sum over every label combination."""
+        with self._lock:
+            children = list(self._children.values())
+        return sum(child._collect() for child in children)
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child._collect())}"
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n' if lines else ''
+
+REGISTRY = Registry()
+
+LAST_EXPORT_TIMESTAMP = Gauge(
+    'bot_metrics_last_export_timestamp', 'Unix time the bot last exported its metrics to the shared data directory.')
+
+def export_to_file(path=BOT_METRICS_FILE, registry=REGISTRY):
+    """Writes the registry to `path` (atomically), tagged with this process. Errors are logged."""
+    LAST_EXPORT_TIMESTAMP.set(time.time())
+    try:
+        atomic_write(path, f"# process {PROCESS_TOKEN}\n" + registry.render())
+    except OSError as e:
+        logging.error(f"Failed to export metrics to {path}: {e}")
+
+def read_exported(path=BOT_METRICS_FILE, max_age=None):
+    """
+    Metrics exported by another process, or '' if there are none. A file
+    written by this process is ignored: its metrics are already in REGISTRY
+    (bot and web server running in one process, as with simple_start.py).
+    So is a file older than `max_age` seconds (default STALE_EXPORT_INTERVALS
+    loop intervals), so a dead bot does not keep reporting its last values.
+    """
+    if max_age is None:
+        max_age = STALE_EXPORT_INTERVALS * config.LOOP_INTERVAL_SECONDS
+    try:
+        if time.time() - os.path.getmtime(path) > max_age:
+            return ''
+        with open(path, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            if header.strip() == f"# process {PROCESS_TOKEN}":
+                return ''
+            return f.read()
+    except FileNotFoundError:
+        return ''
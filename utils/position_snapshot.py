@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import config
+from utils.atomic_file import atomic_write
+
+SNAPSHOT_FILE = os.path.join(config.DATA_DIR, 'positions_snapshot.json')
+
+
+class PositionSnapshotWriter:
+    """
+    Publishes the bot's open positions with their live metrics for the web server.
+
+    The snapshot is one small JSON document, already in the shape /history/open
+    returns, replaced atomically (temp file + rename) after every cycle. The
+    web server serves its bytes as they are and uses the file's mtime as its
+    age, so a stalled bot shows up as a stale snapshot. `version` increases
+    with every publish, also across restarts.
+    """
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self.version = 0
+
+    def publish(self, positions):
+        """Writes the snapshot. Errors are logged, never raised."""
+        self.version = max(self.version + 1, time.time_ns())
+        snapshot = {
+            'source': 'bot',
+            'version': self.version,
+            'generated_at': time.time(),
+            'positions': positions,
+        }
+        try:
+            atomic_write(self.path, json.dumps(snapshot, default=str))
+        except (OSError, TypeError, ValueError) as e:
+            logging.error(f"Failed to publish position snapshot: {e}")
+
+def snapshot_mtime(path=SNAPSHOT_FILE):
+    """Epoch seconds of the last snapshot write, or None if there is none."""
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+def snapshot_age(path=SNAPSHOT_FILE):
+    """Seconds since the snapshot was last written, or None if there is none."""
+    mtime = snapshot_mtime(path)
+    return None if mtime is None else max(0.0, time.time() - mtime)
+
+def iso_utc(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).isoformat()
@@ -0,0 +1,233 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+# Longest a sampling run may last before it stops by itself (a forgotten profiler costs CPU)
+MAX_PROFILE_SECONDS = 600
+# tracemalloc snapshots kept for diffing (each one holds every traced allocation site)
+MAX_MEMORY_SNAPSHOTS = 5
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler over all threads of the process.
+
+    While running, a background thread wakes every `interval` seconds, takes
+    the current stack of every other thread (sys._current_frames) and counts
+    it. Nothing is installed in the profiled threads, so the overhead is the
+    sampler's own CPU time, and there is none at all when it is not running.
+    Results are in the collapsed-stack format read by flamegraph.pl and
+    speedscope: one `thread;outer;...;inner count` line per distinct stack.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.interval = None
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01, duration=60):
+        """Starts a new run (discarding the previous results). Returns False if one is running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self.samples = 0
+            self.interval = interval
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval, min(duration, MAX_PROFILE_SECONDS)),
+                                            name='sampling-profiler', daemon=True)
+            self._thread.start()
+        logging.info(f"Sampling profiler started (interval {interval * 1000:.1f}ms, up to {duration}s)")
+        return True
+
+    def stop(self):
+        """Stops the run and waits for the sampler thread. Returns the status."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.status()
+
+    def _run(self, interval, duration):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                stacks.append(';'.join(reversed(labels)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+        self.stopped_at = time.time()
+        logging.info(f"Sampling profiler stopped after {self.samples} samples")
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'interval': self.interval,
+                'samples': self.samples,
+                'stacks': len(self._stacks),
+                'started_at': self.started_at,
+                'stopped_at': self.stopped_at,
+            }
+
+    def collapsed(self):
+        """The samples so far in collapsed-stack format (also while running)."""
+        with self._lock:
+            items = self._stacks.most_common()
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+
+class MemoryProfiler:
+    """
+    tracemalloc snapshots, kept in memory to be diffed.
+
+    Tracing slows every allocation down, so it only runs between `start()` and
+    `stop()`; snapshots are numbered and only the most recent
+    MAX_MEMORY_SNAPSHOTS are kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()  # id -> (taken_at, Snapshot)
+        self._next_id = 1
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=10):
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(frames)
+        logging.info(f"tracemalloc started ({frames} frames per allocation)")
+        return True
+
+    def stop(self):
+        """Stops tracing and drops the snapshots."""
+        with self._lock:
+            self._snapshots.clear()
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        logging.info("tracemalloc stopped")
+        return True
+
+    def take_snapshot(self):
+        """Takes a snapshot and returns its summary. Raises RuntimeError if not tracing."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc is not running')
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > MAX_MEMORY_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return self._describe(snapshot_id)
+
+    def _describe(self, snapshot_id):
+        taken_at, snapshot = self._snapshots[snapshot_id]
+        return {
+            'id': snapshot_id,
+            'taken_at': taken_at,
+            'traced_bytes': sum(stat.size for stat in snapshot.statistics('filename')),
+        }
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        with self._lock:
+            snapshots = [self._describe(snapshot_id) for snapshot_id in self._snapshots]
+        return {'tracing': self.tracing, 'current_bytes': current, 'peak_bytes': peak, 'snapshots': snapshots}
+
+    def top(self, snapshot_id, base_id=None, key_type='lineno', limit=25):
+        """
+        The largest allocation sites of a snapshot, or the largest changes since
+        `base_id` if given. Raises KeyError for unknown (or discarded) snapshot ids.
+        """
+        with self._lock:
+            snapshot = self._snapshots[snapshot_id][1]
+            base = self._snapshots[base_id][1] if base_id is not None else None
+        if base is None:
+            stats = snapshot.statistics(key_type)
+            return [{'location': _trace_location(stat.traceback), 'size_bytes': stat.size,
+                     'count': stat.count} for stat in stats[:limit]]
+        stats = snapshot.compare_to(base, key_type)
+        return [{'location': _trace_location(stat.traceback), 'size_bytes': stat.size,
+                 'size_diff_bytes': stat.size_diff, 'count': stat.count,
+                 'count_diff': stat.count_diff} for stat in stats[:limit]]
+
+def _trace_location(traceback):
+    frame = traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def thread_cpu_times(sample_seconds=0.0):
+    """
+    CPU time used by each thread since it started, in seconds, and its CPU
+    usage over the next `sample_seconds` if that is positive (blocks that long).
+    cpu_seconds is None where per-thread clocks are unavailable (not Linux/Unix).
+    """
+    def read():
+        times = {}
+        for thread in threading.enumerate():
+            try:
+                times[thread.ident] = time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+            except (AttributeError, OSError, TypeError):  # no per-thread clocks, or the thread just exited
+                times[thread.ident] = None
+        return times
+
+    before = read()
+    if sample_seconds > 0:
+        time.sleep(sample_seconds)
+        after = read()
+    else:
+        after = before
+
+    threads = []
+    for thread in threading.enumerate():
+        cpu = after.get(thread.ident)
+        entry = {
+            'name': thread.name,
+            'ident': thread.ident,
+            'native_id': thread.native_id,
+            'daemon': thread.daemon,
+            'cpu_seconds': cpu,
+        }
+        if sample_seconds > 0:
+            start = before.get(thread.ident)
+            entry['cpu_percent'] = None if cpu is None or start is None else round((cpu - start) / sample_seconds * 100, 1)
+        threads.append(entry)
+    threads.sort(key=lambda entry: entry['cpu_seconds'] or 0, reverse=True)
+    return threads
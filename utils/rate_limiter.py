@@ -0,0 +1,49 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at `rate_per_second` up to `capacity`.
+    `acquire()` blocks the calling thread until enough tokens are available,
+    so callers sharing one bucket are throttled to the configured rate.
+    """
+
+    def __init__(self, rate_per_second, capacity=None):
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be positive")
+        self.rate = float(rate_per_second)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_second))
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` tokens are available, then consume them."""
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+def bucket_for_exchange(api_client, capacity=None):
+    """
+    Build a token bucket from a CCXT client's `rateLimit` (milliseconds between requests).
+    Falls back to 10 requests per second when the client does not declare one.
+    """
+    rate_limit_ms = getattr(api_client, 'rateLimit', None) or 100
+    return TokenBucket(1000.0 / rate_limit_ms, capacity=capacity)
@@ -0,0 +1,14 @@
+"""
+Timestamps are epoch-second integers throughout the funding pipeline; these
+helpers convert them at the edges (CSV files and API responses).
+"""
+from datetime import datetime, timezone
+
+def parse_timestamp(timestamp):
+    """Convert a stored ISO timestamp (e.g. '2024-01-01T08:00:00Z') to epoch seconds."""
+    dt = datetime.fromisoformat(timestamp.replace('Z', ''))
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+def format_timestamp(ts):
+    """Convert epoch seconds to the ISO format used in files and API responses."""
+    return datetime.utcfromtimestamp(ts).isoformat() + 'Z'
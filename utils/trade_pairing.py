@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+LEGACY_CLOSE_REASON = '舊紀錄 (無法配對)'
+
+# 已平倉交易的欄位（/history/closed）
+POSITION_COLUMNS = [
+    'trade_id', 'pair', 'open_time', 'close_time', 'holding_time',
+    'short_exchange', 'long_exchange', 'size_usdt',
+    'open_short_price', 'open_long_price', 'close_short_price', 'close_long_price',
+    'open_funding_rate_diff', 'close_funding_rate_diff',
+    'close_reason', 'realized_pnl', 'funding_fee_profit'
+]
+# 舊紀錄無法配對，保留其原始欄位
+LEGACY_COLUMNS = ['time', 'action', 'short_price', 'long_price', 'funding_rate_diff_annualized_percent']
+# 匯出 CSV 使用的欄位名稱
+EXPORT_RENAMES = {
+    'holding_time': 'holding_time_hours',
+    'open_funding_rate_diff': 'open_funding_rate_diff_percent',
+    'close_funding_rate_diff': 'close_funding_rate_diff_percent',
+    'time': 'timestamp_utc',
+}
+
+OPEN_COLUMNS = ['trade_id', 'pair', 'short_exchange', 'long_exchange', 'size_usdt',
+                'short_price', 'long_price', 'funding_rate_diff_annualized_percent']
+CLOSE_COLUMNS = ['trade_id', 'short_price', 'long_price', 'funding_rate_diff_annualized_percent',
+                 'close_reason', 'realized_pnl', 'funding_fee_profit']
+
+def closed_positions_frame(ledger):
+    """
+    Pairs the OPEN and CLOSE rows of every trade in one merge and returns all
+    closed positions, newest close first.
+
+    `ledger` is a DataFrame with the trade store columns in insertion order
+    (trade ids filled, legacy rows as `legacy_...`). Rows whose timestamp cannot
+    be parsed are dropped. When a trade id has several OPEN or CLOSE rows, the
+    first of each is used. Legacy rows cannot be paired and are returned as
+    closed positions with an unknown open time and a holding time of -1.
+    """
+    if ledger.empty:
+        return pd.DataFrame(columns=POSITION_COLUMNS + LEGACY_COLUMNS)
+
+    times = pd.to_datetime(ledger['timestamp_utc'], format='ISO8601', errors='coerce', utc=True)
+    valid = times.notna().to_numpy()
+    legacy = ledger['trade_id'].astype(str).str.startswith('legacy_').to_numpy()
+    action = ledger['action'].to_numpy()
+
+    is_open = valid & ~legacy & (action == 'OPEN')
+    is_close = valid & ~legacy & (action == 'CLOSE')
+    opens = ledger.loc[is_open, OPEN_COLUMNS].assign(open_time=times[is_open]).drop_duplicates('trade_id')
+    closes = ledger.loc[is_close, CLOSE_COLUMNS].assign(close_time=times[is_close]).drop_duplicates('trade_id')
+    merged = opens.merge(closes, on='trade_id', suffixes=('_open', '_close'))
+
+    paired = pd.DataFrame({
+        'trade_id': merged['trade_id'],
+        'pair': merged['pair'],
+        'open_time': merged['open_time'],
+        'close_time': merged['close_time'],
+        'holding_time': (merged['close_time'] - merged['open_time']).dt.total_seconds() / 3600,
+        'short_exchange': merged['short_exchange'],
+        'long_exchange': merged['long_exchange'],
+        'size_usdt': merged['size_usdt'],
+        'open_short_price': merged['short_price_open'],
+        'open_long_price': merged['long_price_open'],
+        'close_short_price': merged['short_price_close'],
+        'close_long_price': merged['long_price_close'],
+        'open_funding_rate_diff': merged['funding_rate_diff_annualized_percent_open'],
+        'close_funding_rate_diff': merged['funding_rate_diff_annualized_percent_close'],
+        'close_reason': merged['close_reason'],
+        'realized_pnl': merged['realized_pnl'],
+        'funding_fee_profit': merged['funding_fee_profit'],
+    })
+
+    is_legacy = valid & legacy
+    legacy_rows = ledger.loc[is_legacy]
+    legacy_times = times[is_legacy]
+    legacy_positions = pd.DataFrame({
+        'trade_id': legacy_rows['trade_id'],
+        'pair': legacy_rows['pair'],
+        'open_time': pd.Series(pd.NaT, index=legacy_rows.index, dtype=legacy_times.dtype),
+        'close_time': legacy_times,
+        'holding_time': -1.0,
+        'short_exchange': legacy_rows['short_exchange'],
+        'long_exchange': legacy_rows['long_exchange'],
+        'size_usdt': legacy_rows['size_usdt'],
+        'close_reason': legacy_rows['close_reason'].replace('', np.nan).fillna(LEGACY_CLOSE_REASON),
+        'realized_pnl': legacy_rows['realized_pnl'],
+        'funding_fee_profit': legacy_rows['funding_fee_profit'],
+        'time': legacy_times,
+        'action': legacy_rows['action'],
+        'short_price': legacy_rows['short_price'],
+        'long_price': legacy_rows['long_price'],
+        'funding_rate_diff_annualized_percent': legacy_rows['funding_rate_diff_annualized_percent'],
+    })
+
+    frames = [frame for frame in (legacy_positions, paired) if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=POSITION_COLUMNS + LEGACY_COLUMNS)
+    positions = pd.concat(frames, ignore_index=True).reindex(columns=POSITION_COLUMNS + LEGACY_COLUMNS)
+    return positions.sort_values('close_time', ascending=False, kind='stable', ignore_index=True)
+
+def _records(frame):
+    """DataFrame rows as dicts with NaN/NaT replaced by None (JSON compatible)."""
+    # Converting column by column and zipping is about twice as fast as DataFrame.to_dict('records')
+    columns = [frame[name].astype(object).where(frame[name].notna(), None).tolist() for name in frame.columns]
+    names = list(frame.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def position_records(positions):
+    """JSON view: closed positions as returned by /history/closed."""
+    return _records(positions)
+
+def export_frame(positions):
+    """Export view: the same positions with the column names of the CSV export."""
+    return positions.rename(columns=EXPORT_RENAMES)
+
+# --- Filtering and keyset pagination (in-memory, used by the CSV trade store) ---
+
+EPOCH = pd.Timestamp(0, tz='UTC')
+
+def close_seconds(positions):
+    """Close time of every position as epoch seconds."""
+    if positions.empty:
+        return np.empty(0)
+    return (positions['close_time'] - EPOCH).dt.total_seconds().to_numpy()
+
+def filter_positions(positions, filters):
+    """
+    Applies the /history/closed filters: `pair`, `exchange` (either leg),
+    `close_reason` and the close time range [`start`, `end`) in epoch seconds.
+    """
+    if positions.empty:
+        return positions
+    mask = np.ones(len(positions), dtype=bool)
+    if filters.get('pair'):
+        mask &= positions['pair'].to_numpy() == filters['pair']
+    if filters.get('exchange'):
+        mask &= ((positions['short_exchange'].to_numpy() == filters['exchange'])
+                 | (positions['long_exchange'].to_numpy() == filters['exchange']))
+    if filters.get('close_reason'):
+        mask &= positions['close_reason'].to_numpy() == filters['close_reason']
+    if filters.get('start') is not None or filters.get('end') is not None:
+        close_ts = close_seconds(positions)
+        if filters.get('start') is not None:
+            mask &= close_ts >= filters['start']
+        if filters.get('end') is not None:
+            mask &= close_ts < filters['end']
+    return positions[mask]
+
+def sort_positions(positions):
+    """Positions ordered by (close time, trade_id), newest first, with a close_ts column added."""
+    positions = positions.assign(close_ts=close_seconds(positions))
+    return positions.sort_values(['close_ts', 'trade_id'], ascending=False, kind='stable')
+
+def iter_position_chunks(positions, chunk_size):
+    """Sorted positions in slices of `chunk_size` rows."""
+    if positions.empty:
+        return
+    positions = sort_positions(positions).drop(columns='close_ts')
+    for start in range(0, len(positions), chunk_size):
+        yield positions.iloc[start:start + chunk_size]
+
+def page_positions(positions, after=None, limit=50):
+    """
+    One page of positions ordered by (close time, trade_id), newest first.
+    `after` is the (close_ts, trade_id) cursor of the previous page's last row.
+    Returns (records, next_cursor); next_cursor is None on the last page.
+    """
+    if positions.empty:
+        return [], None
+    positions = sort_positions(positions)
+    if after is not None:
+        after_ts, after_id = after
+        close_ts = positions['close_ts'].to_numpy()
+        trade_ids = positions['trade_id'].to_numpy()
+        positions = positions[(close_ts < after_ts) | ((close_ts == after_ts) & (trade_ids < after_id))]
+    page = positions.head(limit + 1)
+    next_cursor = None
+    if len(page) > limit:
+        page = page.head(limit)
+        last = page.iloc[-1]
+        next_cursor = (float(last['close_ts']), last['trade_id'])
+    return position_records(page.drop(columns='close_ts')), next_cursor
+
+def position_totals(positions):
+    """Server-side totals shown on the dashboard."""
+    return {
+        'count': int(len(positions)),
+        'realized_pnl': float(pd.to_numeric(positions['realized_pnl'], errors='coerce').sum()) if len(positions) else 0.0,
+        'funding_fee_profit': float(pd.to_numeric(positions['funding_fee_profit'], errors='coerce').sum()) if len(positions) else 0.0,
+    }
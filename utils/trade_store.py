@@ -0,0 +1,590 @@
+import csv
+import logging
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+import config
+from utils import trade_pairing
+from utils.file_cache import file_version
+
+CSV_FILE = os.path.join(config.DATA_DIR, 'trading_history.csv')
+DB_FILE = os.path.join(config.DATA_DIR, 'trading_history.db')
+
+FIELDNAMES = [
+    'timestamp_utc', 
+    'pair', 
+    'action', # OPEN or CLOSE
+    'short_exchange', 
+    'long_exchange', 
+    'size_usdt',
+    'short_price', # The price at which the action was taken
+    'long_price', # The price at which the action was taken
+    'funding_rate_diff_annualized_percent', # The rate diff at the time of the action
+    'close_reason',  # 新增：平倉理由
+    'realized_pnl',  # 新增：已實現損益
+    'funding_fee_profit',  # 新增：資金費率套利收益
+    'trade_id'       # 新增：用於追蹤開倉/平倉配對
+]
+NUMERIC_FIELDS = {
+    'size_usdt', 'short_price', 'long_price', 'funding_rate_diff_annualized_percent',
+    'realized_pnl', 'funding_fee_profit'
+}
+
+def coerce_row(row):
+    """Normalizes one ledger row: empty cells become None and numeric columns become floats."""
+    result = {}
+    for field in FIELDNAMES:
+        value = row.get(field)
+        if value is None or value == '':
+            result[field] = None
+        elif field in NUMERIC_FIELDS:
+            try:
+                result[field] = float(value)
+            except (TypeError, ValueError):
+                result[field] = None
+        else:
+            result[field] = str(value)
+    return result
+
+def is_legacy_id(trade_id):
+    """Rows written before trade ids existed cannot be paired and are shown as closed."""
+    return trade_id is None or str(trade_id).startswith('legacy_')
+
+
+# --- SQLite backend ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp_utc TEXT,
+    pair TEXT,
+    action TEXT,
+    short_exchange TEXT,
+    long_exchange TEXT,
+    size_usdt REAL,
+    short_price REAL,
+    long_price REAL,
+    funding_rate_diff_annualized_percent REAL,
+    close_reason TEXT,
+    realized_pnl REAL,
+    funding_fee_profit REAL,
+    trade_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_trade_id ON trades (trade_id, action);
+CREATE INDEX IF NOT EXISTS idx_trades_pair ON trades (pair);
+CREATE INDEX IF NOT EXISTS idx_trades_action ON trades (action);
+CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (timestamp_utc);
+"""
+# 1: legacy CSV imported (never imported twice); 2: closed_trades materialized
+SCHEMA_VERSION = 2
+
+LEGACY_PREDICATE = "(trade_id IS NULL OR trade_id LIKE 'legacy\\_%' ESCAPE '\\')"
+
+def _epoch_seconds(column):
+    """SQL expression: ISO timestamp column as epoch seconds (NULL if unparsable)."""
+    return f"((julianday({column}) - 2440587.5) * 86400.0)"
+
+# Closed positions, one row per trade, kept in sync with `trades` by triggers.
+# Columns follow trade_pairing.POSITION_COLUMNS + LEGACY_COLUMNS, plus close_ts
+# (epoch seconds) for keyset pagination.
+CLOSED_COLUMNS = trade_pairing.POSITION_COLUMNS + trade_pairing.LEGACY_COLUMNS
+TIME_COLUMNS = ('open_time', 'close_time', 'time')
+
+CLOSED_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS closed_trades (
+    trade_id TEXT PRIMARY KEY,
+    pair TEXT,
+    open_time TEXT,
+    close_time TEXT,
+    holding_time REAL,
+    short_exchange TEXT,
+    long_exchange TEXT,
+    size_usdt REAL,
+    open_short_price REAL,
+    open_long_price REAL,
+    close_short_price REAL,
+    close_long_price REAL,
+    open_funding_rate_diff REAL,
+    close_funding_rate_diff REAL,
+    close_reason TEXT,
+    realized_pnl REAL,
+    funding_fee_profit REAL,
+    time TEXT,
+    action TEXT,
+    short_price REAL,
+    long_price REAL,
+    funding_rate_diff_annualized_percent REAL,
+    close_ts REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_closed_trades_close ON closed_trades (close_ts, trade_id);
+CREATE INDEX IF NOT EXISTS idx_closed_trades_pair ON closed_trades (pair, close_ts, trade_id);
+CREATE INDEX IF NOT EXISTS idx_closed_trades_reason ON closed_trades (close_reason, close_ts, trade_id);
+CREATE INDEX IF NOT EXISTS idx_closed_trades_short ON closed_trades (short_exchange, close_ts, trade_id);
+CREATE INDEX IF NOT EXISTS idx_closed_trades_long ON closed_trades (long_exchange, close_ts, trade_id);
+
+-- Running totals per (pair, exchanges, close reason, UTC day), updated on every insert
+CREATE TABLE IF NOT EXISTS closed_trade_totals (
+    pair TEXT NOT NULL,
+    short_exchange TEXT NOT NULL,
+    long_exchange TEXT NOT NULL,
+    close_reason TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    trade_count INTEGER NOT NULL,
+    realized_pnl REAL NOT NULL,
+    funding_fee_profit REAL NOT NULL,
+    PRIMARY KEY (day, pair, short_exchange, long_exchange, close_reason)
+) WITHOUT ROWID;
+
+-- Same totals without the day, so unbounded queries read a few rows per pair
+CREATE TABLE IF NOT EXISTS closed_trade_totals_all (
+    pair TEXT NOT NULL,
+    short_exchange TEXT NOT NULL,
+    long_exchange TEXT NOT NULL,
+    close_reason TEXT NOT NULL,
+    trade_count INTEGER NOT NULL,
+    realized_pnl REAL NOT NULL,
+    funding_fee_profit REAL NOT NULL,
+    PRIMARY KEY (pair, short_exchange, long_exchange, close_reason)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS closed_trades_totals AFTER INSERT ON closed_trades BEGIN
+    INSERT INTO closed_trade_totals VALUES (
+        COALESCE(NEW.pair, ''), COALESCE(NEW.short_exchange, ''), COALESCE(NEW.long_exchange, ''),
+        COALESCE(NEW.close_reason, ''), CAST(NEW.close_ts / 86400 AS INTEGER),
+        1, COALESCE(NEW.realized_pnl, 0), COALESCE(NEW.funding_fee_profit, 0)
+    )
+    ON CONFLICT (day, pair, short_exchange, long_exchange, close_reason) DO UPDATE SET
+        trade_count = trade_count + 1,
+        realized_pnl = realized_pnl + excluded.realized_pnl,
+        funding_fee_profit = funding_fee_profit + excluded.funding_fee_profit;
+    INSERT INTO closed_trade_totals_all VALUES (
+        COALESCE(NEW.pair, ''), COALESCE(NEW.short_exchange, ''), COALESCE(NEW.long_exchange, ''),
+        COALESCE(NEW.close_reason, ''), 1, COALESCE(NEW.realized_pnl, 0), COALESCE(NEW.funding_fee_profit, 0)
+    )
+    ON CONFLICT (pair, short_exchange, long_exchange, close_reason) DO UPDATE SET
+        trade_count = trade_count + 1,
+        realized_pnl = realized_pnl + excluded.realized_pnl,
+        funding_fee_profit = funding_fee_profit + excluded.funding_fee_profit;
+END;
+"""
+
+def _insert_paired(condition):
+    """Materializes the closed position of every CLOSE row matching `condition` (first OPEN + first CLOSE)."""
+    return f"""
+INSERT OR IGNORE INTO closed_trades ({', '.join(CLOSED_COLUMNS)}, close_ts)
+SELECT c.trade_id, o.pair, o.timestamp_utc, c.timestamp_utc,
+       (julianday(c.timestamp_utc) - julianday(o.timestamp_utc)) * 24.0,
+       o.short_exchange, o.long_exchange, o.size_usdt,
+       o.short_price, o.long_price, c.short_price, c.long_price,
+       o.funding_rate_diff_annualized_percent, c.funding_rate_diff_annualized_percent,
+       c.close_reason, c.realized_pnl, c.funding_fee_profit,
+       NULL, NULL, NULL, NULL, NULL,
+       {_epoch_seconds('c.timestamp_utc')}
+FROM trades c
+JOIN trades o ON o.trade_id = c.trade_id AND o.action = 'OPEN'
+WHERE c.action = 'CLOSE' AND NOT {LEGACY_PREDICATE.replace('trade_id', 'c.trade_id')}
+  AND julianday(o.timestamp_utc) IS NOT NULL AND julianday(c.timestamp_utc) IS NOT NULL
+  AND o.seq = (SELECT MIN(x.seq) FROM trades x WHERE x.trade_id = o.trade_id AND x.action = 'OPEN')
+  AND c.seq = (SELECT MIN(x.seq) FROM trades x WHERE x.trade_id = c.trade_id AND x.action = 'CLOSE')
+  AND {condition};
+"""
+
+def _insert_legacy(condition):
+    """Materializes legacy rows matching `condition` as unpaired closed positions."""
+    return f"""
+INSERT OR IGNORE INTO closed_trades ({', '.join(CLOSED_COLUMNS)}, close_ts)
+SELECT COALESCE(t.trade_id, 'legacy_r' || t.seq), t.pair, NULL, t.timestamp_utc, -1.0,
+       t.short_exchange, t.long_exchange, t.size_usdt,
+       NULL, NULL, NULL, NULL, NULL, NULL,
+       COALESCE(NULLIF(t.close_reason, ''), '{trade_pairing.LEGACY_CLOSE_REASON}'), t.realized_pnl, t.funding_fee_profit,
+       t.timestamp_utc, t.action, t.short_price, t.long_price, t.funding_rate_diff_annualized_percent,
+       {_epoch_seconds('t.timestamp_utc')}
+FROM trades t
+WHERE {LEGACY_PREDICATE.replace('trade_id', 't.trade_id')} AND julianday(t.timestamp_utc) IS NOT NULL
+  AND {condition};
+"""
+
+TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS trades_pair_close AFTER INSERT ON trades WHEN NEW.action = 'CLOSE' BEGIN
+{_insert_paired('c.seq = NEW.seq')}
+END;
+CREATE TRIGGER IF NOT EXISTS trades_legacy_close AFTER INSERT ON trades
+WHEN {LEGACY_PREDICATE.replace('trade_id', 'NEW.trade_id')} BEGIN
+{_insert_legacy('t.seq = NEW.seq')}
+END;
+"""
+
+# Full rebuild, for databases created before closed_trades existed
+BACKFILL_CLOSED = (
+    "DELETE FROM closed_trades; DELETE FROM closed_trade_totals; DELETE FROM closed_trade_totals_all;"
+    + _insert_paired('1') + _insert_legacy('1')
+)
+
+DAY_SECONDS = 86400
+
+def _closed_filter_clauses(filters, time_column='close_ts'):
+    """WHERE clauses and parameters for the /history/closed filters."""
+    clauses, params = [], []
+    if filters.get('pair'):
+        clauses.append("pair = ?")
+        params.append(filters['pair'])
+    if filters.get('exchange'):
+        clauses.append("(short_exchange = ? OR long_exchange = ?)")
+        params += [filters['exchange'], filters['exchange']]
+    if filters.get('close_reason'):
+        clauses.append("close_reason = ?")
+        params.append(filters['close_reason'])
+    for leg in ('short_exchange', 'long_exchange'):
+        if filters.get(leg):
+            clauses.append(f"{leg} = ?")
+            params.append(filters[leg])
+    if filters.get('start') is not None:
+        clauses.append(f"{time_column} >= ?")
+        params.append(filters['start'])
+    if filters.get('end') is not None:
+        clauses.append(f"{time_column} < ?")
+        params.append(filters['end'])
+    return clauses, params
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+def _select_columns(alias):
+    """Ledger columns in FIELDNAMES order; rows without a trade id get a stable legacy_r<seq> id."""
+    columns = [f"{alias}.{field}" for field in FIELDNAMES[:-1]]
+    columns.append(f"COALESCE({alias}.trade_id, 'legacy_r' || {alias}.seq) AS trade_id")
+    return ", ".join(columns)
+
+OPEN_TRADES_FROM = f"""
+FROM trades o
+WHERE o.action = 'OPEN' AND NOT {LEGACY_PREDICATE.replace('trade_id', 'o.trade_id')}
+  AND NOT EXISTS (SELECT 1 FROM trades c WHERE c.trade_id = o.trade_id AND c.action = 'CLOSE')
+  AND o.seq = (SELECT MAX(x.seq) FROM trades x WHERE x.trade_id = o.trade_id AND x.action = 'OPEN')
+"""
+OPEN_TRADES_QUERY = f"SELECT {_select_columns('o')} {OPEN_TRADES_FROM} ORDER BY o.seq"
+
+class SqliteTradeStore:
+    """
+    Trade ledger in SQLite, indexed on trade_id, pair, action and timestamp.
+
+    Open positions and closed OPEN/CLOSE pairs are answered with indexed
+    queries instead of loading and grouping the whole ledger. The database
+    runs in WAL mode so the web server reads while the bot appends. On first
+    use, rows from the legacy trading_history.csv are imported once; rows
+    without a trade id are reported as `legacy_r<seq>`.
+    """
+
+    def __init__(self, path=DB_FILE, legacy_csv=CSV_FILE):
+        self.path = path
+        self.legacy_csv = legacy_csv
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA + CLOSED_SCHEMA + TRIGGERS)
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    migrated = True
+                    if version < 1:
+                        # The triggers materialize closed_trades while importing
+                        migrated = self._import_legacy_csv(conn)
+                    elif version < 2:
+                        with conn:
+                            conn.executescript(BACKFILL_CLOSED)
+                    # A failed import is retried on the next start
+                    if migrated and version < SCHEMA_VERSION:
+                        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                    self._initialized = True
+        return conn
+
+    def _import_legacy_csv(self, conn):
+        """Imports the legacy CSV ledger in one transaction. Returns False if the import failed."""
+        if not self.legacy_csv or not os.path.exists(self.legacy_csv):
+            return True
+        try:
+            with open(self.legacy_csv, 'r', newline='', encoding='utf-8') as f:
+                rows = [coerce_row(row) for row in csv.DictReader(f)]
+            with conn:
+                self._insert(conn, rows)
+            logging.info(f"Imported {len(rows)} trade records from {self.legacy_csv}")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to import legacy trade history {self.legacy_csv}: {e}", exc_info=True)
+            return False
+
+    def _insert(self, conn, rows):
+        placeholders = ", ".join("?" for _ in FIELDNAMES)
+        conn.executemany(
+            f"INSERT INTO trades ({', '.join(FIELDNAMES)}) VALUES ({placeholders})",
+            [tuple(row[field] for field in FIELDNAMES) for row in rows]
+        )
+
+    def paths(self):
+        """Files whose versions change whenever the ledger changes."""
+        return [self.path, self.path + '-wal']
+
+    def initialize(self):
+        self._connect()
+
+    def append(self, record):
+        conn = self._connect()
+        with conn:
+            self._insert(conn, [coerce_row(record)])
+
+    def all_trades(self):
+        """Every ledger row, oldest first."""
+        rows = self._connect().execute(f"SELECT {_select_columns('t')} FROM trades t ORDER BY t.seq")
+        return [dict(zip(FIELDNAMES, row)) for row in rows]
+
+    def ledger_frame(self):
+        """Every ledger row as a DataFrame (FIELDNAMES columns), oldest first."""
+        return pd.read_sql_query(f"SELECT {_select_columns('t')} FROM trades t ORDER BY t.seq", self._connect())
+
+    def open_trades(self):
+        """The OPEN row of every trade that has not been closed yet."""
+        return [dict(zip(FIELDNAMES, row)) for row in self._connect().execute(OPEN_TRADES_QUERY)]
+
+    def clear_closed(self):
+        """Deletes everything except open trades and returns how many open trades were kept."""
+        conn = self._connect()
+        with conn:
+            kept = conn.execute(f"SELECT COUNT(*) {OPEN_TRADES_FROM}").fetchone()[0]
+            conn.execute(f"DELETE FROM trades WHERE seq NOT IN (SELECT o.seq {OPEN_TRADES_FROM})")
+            conn.execute("DELETE FROM closed_trades")
+            conn.execute("DELETE FROM closed_trade_totals")
+            conn.execute("DELETE FROM closed_trade_totals_all")
+        return kept
+
+    def _closed_rows(self, filters, after, limit):
+        """Up to `limit` closed_trades rows (CLOSED_COLUMNS + close_ts) after the cursor, newest first."""
+        columns = f"{', '.join(CLOSED_COLUMNS)}, close_ts"
+        order = "ORDER BY close_ts DESC, trade_id DESC LIMIT ?"
+
+        def leg_query(leg_filters):
+            clauses, params = _closed_filter_clauses(leg_filters)
+            if after is not None:
+                clauses.append("(close_ts < ? OR (close_ts = ? AND trade_id < ?))")
+                params += [after[0], after[0], after[1]]
+            return f"SELECT {columns} FROM closed_trades {_where(clauses)} {order}", params + [limit]
+
+        exchange = filters.get('exchange')
+        if exchange:
+            # One ordered index scan per leg instead of scanning and sorting on `short OR long`
+            base = {**filters, 'exchange': None}
+            short_sql, short_params = leg_query({**base, 'short_exchange': exchange})
+            long_sql, long_params = leg_query({**base, 'long_exchange': exchange})
+            sql = f"SELECT * FROM (SELECT * FROM ({short_sql}) UNION SELECT * FROM ({long_sql})) {order}"
+            params = short_params + long_params + [limit]
+        else:
+            sql, params = leg_query(filters)
+        return self._connect().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _positions_frame(rows):
+        frame = pd.DataFrame([row[:-1] for row in rows], columns=CLOSED_COLUMNS)
+        for column in TIME_COLUMNS:
+            frame[column] = pd.to_datetime(frame[column], format='ISO8601', errors='coerce', utc=True)
+        return frame
+
+    def closed_page(self, filters, after=None, limit=50):
+        """
+        One page of closed positions ordered by (close_ts, trade_id), newest first.
+        `after` is the (close_ts, trade_id) cursor of the previous page's last row.
+        Returns (records, next_cursor); next_cursor is None on the last page.
+        """
+        rows = self._closed_rows(filters, after, limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1][-1], rows[-1][0])
+        return trade_pairing.position_records(self._positions_frame(rows)), next_cursor
+
+    def iter_closed_chunks(self, filters, chunk_size=5000):
+        """
+        Every closed position matching `filters`, newest first, as DataFrames of
+        at most `chunk_size` rows. Each chunk is one keyset query, so memory stays
+        constant regardless of the history size.
+        """
+        after = None
+        while True:
+            rows = self._closed_rows(filters, after, chunk_size)
+            if not rows:
+                return
+            yield self._positions_frame(rows)
+            if len(rows) < chunk_size:
+                return
+            after = (rows[-1][-1], rows[-1][0])
+
+    def closed_totals(self, filters):
+        """
+        Count, realized PnL and funding profit of the closed positions matching `filters`.
+
+        Totals come from the incrementally maintained closed_trade_totals_all, or
+        for a time range from the per-day closed_trade_totals; only the partial
+        days at the edges of the range are summed from closed_trades.
+        """
+        conn = self._connect()
+        start, end = filters.get('start'), filters.get('end')
+        first_day = None if start is None else -(-start // DAY_SECONDS)
+        last_day = None if end is None else end // DAY_SECONDS
+
+        key_filters = {key: filters.get(key) for key in ('pair', 'exchange', 'close_reason')}
+        clauses, params = _closed_filter_clauses(key_filters)
+        totals_table = 'closed_trade_totals' if start is not None or end is not None else 'closed_trade_totals_all'
+        if first_day is not None:
+            clauses.append("day >= ?")
+            params.append(int(first_day))
+        if last_day is not None:
+            clauses.append("day < ?")
+            params.append(int(last_day))
+        totals = list(conn.execute(
+            f"SELECT COALESCE(SUM(trade_count), 0), COALESCE(SUM(realized_pnl), 0), COALESCE(SUM(funding_fee_profit), 0) "
+            f"FROM {totals_table} {_where(clauses)}", params
+        ).fetchone())
+
+        # Partial days: [start, first full day) and [end of last full day, end)
+        edges = []
+        if first_day is not None and last_day is not None and first_day >= last_day:
+            edges.append((start, end))
+        else:
+            if start is not None:
+                edges.append((start, first_day * DAY_SECONDS))
+            if end is not None:
+                edges.append((last_day * DAY_SECONDS, end))
+        for edge_start, edge_end in edges:
+            clauses, params = _closed_filter_clauses({**key_filters, 'start': edge_start, 'end': edge_end})
+            edge = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(realized_pnl), 0), COALESCE(SUM(funding_fee_profit), 0) "
+                f"FROM closed_trades {_where(clauses)}", params
+            ).fetchone()
+            totals = [a + b for a, b in zip(totals, edge)]
+        return {'count': int(totals[0]), 'realized_pnl': float(totals[1]), 'funding_fee_profit': float(totals[2])}
+
+
+# --- CSV backend ---
+
+class CsvTradeStore:
+    """
+    The original append-only CSV ledger.
+
+    Every query reads and groups the whole file, so this backend is kept for
+    deployments that want a human-readable ledger; `SqliteTradeStore` is the
+    default.
+    """
+
+    def __init__(self, path=CSV_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = None
+
+    def paths(self):
+        return [self.path]
+
+    def initialize(self):
+        """初始化交易日誌文件，如果不存在則創建空的 CSV 文件"""
+        if not os.path.exists(self.path):
+            try:
+                with open(self.path, 'w', newline='', encoding='utf-8') as csvfile:
+                    csv.DictWriter(csvfile, fieldnames=FIELDNAMES).writeheader()
+                logging.info(f"Created empty trade log file: {self.path}")
+            except Exception as e:
+                logging.error(f"Failed to create trade log file: {e}")
+
+    def append(self, record):
+        with self._lock:
+            file_exists = os.path.isfile(self.path)
+            with open(self.path, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+                if not file_exists:
+                    writer.writeheader()
+                writer.writerow(record)
+
+    def all_trades(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            rows = [coerce_row(row) for row in csv.DictReader(f)]
+        # 為每個沒有 trade_id 的舊紀錄生成一個唯一的 ID（以列號區分，不與既有的 legacy_<n> 重複）
+        for index, row in enumerate(rows):
+            if row['trade_id'] is None:
+                row['trade_id'] = f'legacy_r{index}'
+        return rows
+
+    def ledger_frame(self):
+        return pd.DataFrame(self.all_trades(), columns=FIELDNAMES)
+
+    def _rows_by_trade_id(self):
+        groups = {}
+        for row in self.all_trades():
+            if not is_legacy_id(row['trade_id']):
+                groups.setdefault(row['trade_id'], []).append(row)
+        return groups
+
+    def open_trades(self):
+        open_rows = []
+        for rows in self._rows_by_trade_id().values():
+            actions = [row['action'] for row in rows]
+            if 'OPEN' in actions and 'CLOSE' not in actions:
+                open_rows.append([row for row in rows if row['action'] == 'OPEN'][-1])
+        return open_rows
+
+    def _closed_positions(self):
+        """Paired positions of the whole file, rebuilt only when the file changes."""
+        version = file_version(self.path)
+        if self._positions is None or self._positions[0] != version:
+            self._positions = (version, trade_pairing.closed_positions_frame(self.ledger_frame()))
+        return self._positions[1]
+
+    def closed_page(self, filters, after=None, limit=50):
+        positions = trade_pairing.filter_positions(self._closed_positions(), filters)
+        return trade_pairing.page_positions(positions, after, limit)
+
+    def iter_closed_chunks(self, filters, chunk_size=5000):
+        positions = trade_pairing.filter_positions(self._closed_positions(), filters)
+        yield from trade_pairing.iter_position_chunks(positions, chunk_size)
+
+    def closed_totals(self, filters):
+        return trade_pairing.position_totals(trade_pairing.filter_positions(self._closed_positions(), filters))
+
+    def clear_closed(self):
+        open_rows = self.open_trades()
+        with self._lock:
+            with open(self.path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+                writer.writeheader()
+                writer.writerows(open_rows)
+        return len(open_rows)
+
+
+TRADE_STORE_BACKENDS = {
+    'sqlite': lambda: SqliteTradeStore(DB_FILE, legacy_csv=CSV_FILE),
+    'csv': lambda: CsvTradeStore(CSV_FILE),
+}
+
+_trade_store = None
+_trade_store_lock = threading.Lock()
+
+def get_trade_store():
+    """The process-wide trade store selected by TRADE_STORE_BACKEND."""
+    global _trade_store
+    if _trade_store is None:
+        with _trade_store_lock:
+            if _trade_store is None:
+                backend = config.TRADE_STORE_BACKEND
+                if backend not in TRADE_STORE_BACKENDS:
+                    logging.warning(f"Unknown TRADE_STORE_BACKEND '{backend}', using sqlite.")
+                    backend = 'sqlite'
+                _trade_store = TRADE_STORE_BACKENDS[backend]()
+    return _trade_store
@@ -1,15 +1,36 @@
+import base64
+import hmac
+import itertools
 import os
 import pandas as pd
 import numpy as np
-from flask import Flask, jsonify, render_template, abort, request, make_response
+from flask import Flask, Response, jsonify, render_template, abort, request, make_response, stream_with_context
 import logging
 import config
 import requests
-import csv
 import time
 import json
-from datetime import datetime, timedelta
+import threading
+import zlib
+from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial, wraps
+
+from exchanges import registry
+from utils import config_channel, funding_matrix
+from utils.event_stream import EventHub
+from utils.atomic_file import atomic_write_json
+from utils.file_cache import FileCache
+from utils import http_cache, metrics
+from utils.funding_store import FundingRateStore
+from utils.job_runner import JobConflict, JobRunner
+from utils.position_snapshot import SNAPSHOT_FILE as POSITION_SNAPSHOT_FILE, snapshot_age, snapshot_mtime
+from utils.profiler import MemoryProfiler, SamplingProfiler, thread_cpu_times
+from utils.rate_limiter import TokenBucket
+from utils.timestamps import format_timestamp
+from utils import trade_pairing
+from utils.trade_store import get_trade_store
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,201 +43,437 @@ def health_check():
     """Simple health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'Application is running'})
 
-# Define the path to the CSV file
-# This assumes web_server.py is run from the project root directory
-DATA_DIR = '/app/data'
-os.makedirs(DATA_DIR, exist_ok=True)
-TRADE_HISTORY_FILE = os.path.join(DATA_DIR, 'trading_history.csv')
+# Trade ledger shared with the bot (SQLite or CSV, see TRADE_STORE_BACKEND)
+trade_store = get_trade_store()
+
+# Position and PnL events published by the bot, fanned out to every /stream client
+event_hub = EventHub()
+# Comment line sent on idle SSE connections so proxies do not time them out
+STREAM_KEEPALIVE_SECONDS = 15
+
+# --- Metrics (served at /metrics together with the bot's, see utils/metrics.py) ---
+STORE_READ_SECONDS = metrics.Histogram(
+    'store_read_seconds', 'Time spent reading the trade and funding rate stores.', ('store', 'operation'),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+FUNDING_UPDATE_SECONDS = metrics.Histogram(
+    'funding_update_seconds', 'Duration of a funding rate pipeline run.', ('mode',),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800))
+FUNDING_FETCH_SYMBOLS = metrics.Counter('funding_fetch_symbols_total', 'Symbols fetched by the funding rate pipeline.')
+FUNDING_FETCH_RECORDS = metrics.Counter('funding_fetch_records_total', 'New funding rate records fetched.')
+FUNDING_FETCH_ERRORS = metrics.Counter(
+    'funding_fetch_errors_total', 'Failed funding rate history requests (kind: timeout, http or other).',
+    ('exchange', 'kind'))
+FUNDING_FETCH_THROUGHPUT = metrics.Gauge(
+    'funding_fetch_symbols_per_second', 'Fetch throughput of the last funding rate pipeline run.')
+
+def timed_read(store, operation, func, *args, **kwargs):
+    """Calls a store read method, recording its duration."""
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        STORE_READ_SECONDS.labels(store, operation).observe(time.perf_counter() - started)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text format: this process's metrics plus those exported by a separately running bot."""
+    body = metrics.REGISTRY.render() + metrics.read_exported()
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 # --- Funding Rate Analysis Constants ---
-GATE_CONTRACTS_ENDPOINT = "https://api.gateio.ws/api/v4/futures/usdt/contracts"
-BITGET_CONTRACTS_ENDPOINT = "https://api.bitget.com/api/mix/v1/market/contracts?productType=umcbl"
-GATE_FUNDING_ENDPOINT = "https://api.gateio.ws/api/v4/futures/usdt/funding_rate"
-BITGET_FUNDING_ENDPOINT = "https://api.bitget.com/api/mix/v1/market/history-fundRate"
-RAW_DATA_CSV = os.path.join(DATA_DIR, "all_funding_rates.csv")
-ANALYSIS_JSON = os.path.join(DATA_DIR, "analysis_summary.json")
+GATE_CONTRACTS_ENDPOINT = f"{config.GATEIO_REST_URL}/api/v4/futures/usdt/contracts"
+BITGET_CONTRACTS_ENDPOINT = f"{config.BITGET_REST_URL}/api/mix/v1/market/contracts?productType=umcbl"
+GATE_FUNDING_ENDPOINT = f"{config.GATEIO_REST_URL}/api/v4/futures/usdt/funding_rate"
+BITGET_FUNDING_ENDPOINT = f"{config.BITGET_REST_URL}/api/mix/v1/market/history-fundRate"
+RAW_DATA_CSV = os.path.join(config.DATA_DIR, "all_funding_rates.csv")  # legacy format, imported into the store once
+FUNDING_DB_FILE = os.path.join(config.DATA_DIR, "funding_rates.db")
+ANALYSIS_JSON = os.path.join(config.DATA_DIR, "analysis_summary.json")
 OPPORTUNITY_THRESHOLD = 0.0001  # 0.01%
+# Per-exchange request rate (requests/second) for the funding history endpoints
+FUNDING_FETCH_RATE_LIMITS = {'gateio': 10, 'bitget': 10}
+DEFAULT_FUNDING_FETCH_RATE_LIMIT = 5
+
+# Indexed funding rate history (one range scan per symbol)
+funding_store = FundingRateStore(FUNDING_DB_FILE, legacy_csv=RAW_DATA_CSV)
+
+# Parsed files and derived views, invalidated when the underlying files change
+data_cache = FileCache(max_entries=config.DATA_CACHE_MAX_ENTRIES, max_bytes=config.DATA_CACHE_MAX_MB * 1024 * 1024)
 
 # --- Time Range ---
-now = int(time.time())
-start_time = now - 30 * 24 * 60 * 60
+# Rolling retention window for stored funding history
+FUNDING_HISTORY_DAYS = 30
+
+def history_window_start():
+    """Epoch seconds of the oldest settlement kept in the rolling history window."""
+    return int(time.time()) - FUNDING_HISTORY_DAYS * 24 * 60 * 60
+
+# Funding is settled every 8 hours (00, 08, 16 UTC)
+SETTLEMENT_INTERVAL_SECONDS = 8 * 60 * 60
 
 # --- Helper Functions for Funding Rate Analysis ---
+def list_gate_symbols():
+    """USDT perpetual symbols on Gate.io (format: BTC_USDT -> BTCUSDT)."""
+    r_gate = requests.get(GATE_CONTRACTS_ENDPOINT, timeout=10)
+    r_gate.raise_for_status()
+    return {c['name'].replace('_', '') for c in r_gate.json()}
+
+def list_bitget_symbols():
+    """USDT perpetual symbols on Bitget (format: BTCUSDT)."""
+    r_bitget = requests.get(BITGET_CONTRACTS_ENDPOINT, timeout=10)
+    r_bitget.raise_for_status()
+    return {c['symbolName'] for c in r_bitget.json().get('data', [])}
+
+# Public CCXT clients for the exchanges without a dedicated REST fetcher, created on first use
+_ccxt_clients = {}
+_ccxt_clients_lock = threading.Lock()
+
+def ccxt_client(exchange_id):
+    with _ccxt_clients_lock:
+        client = _ccxt_clients.get(exchange_id)
+        if client is None:
+            import ccxt
+            client = getattr(ccxt, exchange_id)({'options': {'defaultType': 'swap'}})
+            client.load_markets()
+            _ccxt_clients[exchange_id] = client
+        return client
+
+def list_ccxt_symbols(exchange_id):
+    """Linear USDT perpetual symbols on any CCXT exchange, in the BTCUSDT format."""
+    return {
+        f"{market['base']}USDT" for market in ccxt_client(exchange_id).markets.values()
+        if market.get('swap') and market.get('linear') and market.get('settle') == 'USDT'
+    }
+
+SYMBOL_LISTERS = {'gateio': list_gate_symbols, 'bitget': list_bitget_symbols}
+
 def get_common_symbols():
-    """Fetch all USDT perpetual symbols from Gate.io and Bitget and find the common ones."""
-    try:
-        # Gate.io symbols (format: BTC_USDT)
-        r_gate = requests.get(GATE_CONTRACTS_ENDPOINT, timeout=10)
-        r_gate.raise_for_status()
-        gate_symbols = {c['name'].replace('_', '') for c in r_gate.json()}
-
-        # Bitget symbols (format: BTCUSDT)
-        r_bitget = requests.get(BITGET_CONTRACTS_ENDPOINT, timeout=10)
-        r_bitget.raise_for_status()
-        bitget_symbols = {c['symbolName'] for c in r_bitget.json().get('data', [])}
-        
-        common = sorted(list(gate_symbols.intersection(bitget_symbols)))
-        logging.info(f"Found {len(common)} common symbols.")
-        return common
-    except Exception as e:
-        logging.error(f"Error fetching symbols: {e}")
+    """
+    Fetch the USDT perpetual symbols of every configured exchange and keep those listed on at least two.
+
+    Returns:
+        { symbol: [exchanges listing it] }, sorted by symbol.
+    """
+    listings = defaultdict(list)
+    for exchange in config.ARBITRAGE_EXCHANGES:
+        lister = SYMBOL_LISTERS.get(exchange) or partial(list_ccxt_symbols, exchange)
+        try:
+            listed = lister()
+        except Exception as e:
+            logging.error(f"Error fetching symbols from {exchange}: {e}")
+            continue
+        for symbol in listed:
+            listings[symbol].append(exchange)
+    common = {symbol: listings[symbol] for symbol in sorted(listings) if len(listings[symbol]) >= 2}
+    logging.info(f"Found {len(common)} symbols listed on at least two exchanges.")
+    return common
+
+# The fetchers below raise on timeouts, HTTP errors and malformed responses;
+# iter_funding_rates logs them and counts them in FUNDING_FETCH_ERRORS.
+def fetch_gate_rates(symbol, since=None):
+    """Fetch funding rates for a specific symbol from Gate.io, settled at or after `since` (epoch seconds)."""
+    since = history_window_start() if since is None else since
+    params = {'contract': f"{symbol[:-4]}_{symbol[-4:]}", 'limit': 1000, 'start_time': since}
+    r = requests.get(GATE_FUNDING_ENDPOINT, params=params, timeout=10)
+    r.raise_for_status()
+    return [
+        {'symbol': symbol, 'exchange': 'gateio', 'timestamp': int(e['t']), 'funding_rate': float(e['r'])}
+        for e in r.json() if int(e['t']) >= since
+    ]
+
+def fetch_bitget_rates(symbol, since=None):
+    """Fetch funding rates for a specific symbol from Bitget, settled at or after `since` (epoch seconds)."""
+    since = history_window_start() if since is None else since
+    params = {'symbol': f"{symbol}_UMCBL", 'pageSize': 100, 'pageNo': 1, 'startTime': since * 1000}
+    r = requests.get(BITGET_FUNDING_ENDPOINT, params=params, timeout=10)
+    r.raise_for_status()
+    return [
+        {'symbol': symbol, 'exchange': 'bitget', 'timestamp': int(e['settleTime']) // 1000, 'funding_rate': float(e['fundingRate'])}
+        for e in r.json().get('data') or [] if int(e['settleTime']) // 1000 >= since
+    ]
+
+def fetch_ccxt_rates(exchange_id, symbol, since=None):
+    """Fetch funding rates for a specific symbol from any CCXT exchange, settled at or after `since` (epoch seconds)."""
+    since = history_window_start() if since is None else since
+    history = ccxt_client(exchange_id).fetch_funding_rate_history(f"{symbol[:-4]}/USDT:USDT", since=since * 1000)
+    rows = [
+        {'symbol': symbol, 'exchange': exchange_id, 'timestamp': int(e['timestamp']) // 1000, 'funding_rate': float(e['fundingRate'])}
+        for e in history if e.get('timestamp') is not None and e.get('fundingRate') is not None
+    ]
+    return [row for row in rows if row['timestamp'] >= since]
+
+def fetch_error_kind(error):
+    """The `kind` label of FUNDING_FETCH_ERRORS: 'timeout', 'http' (error response) or 'other'."""
+    if isinstance(error, requests.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.HTTPError):
+        return 'http'
+    if type(error).__module__.startswith('ccxt'):
+        import ccxt
+        if isinstance(error, ccxt.RequestTimeout):
+            return 'timeout'
+        if isinstance(error, (ccxt.ExchangeError, ccxt.ExchangeNotAvailable, ccxt.DDoSProtection)):
+            return 'http'
+    return 'other'
+
+FUNDING_FETCHERS = {'gateio': fetch_gate_rates, 'bitget': fetch_bitget_rates}
+
+def funding_fetcher(exchange_id):
+    """The funding history fetcher of an exchange: its own REST endpoint if there is one, CCXT otherwise."""
+    return FUNDING_FETCHERS.get(exchange_id) or partial(fetch_ccxt_rates, exchange_id)
+
+def iter_funding_rates(symbols, since=None, max_workers=None):
+    """
+    Fetches the funding history of every symbol on every configured exchange concurrently.
+
+    Requests run on a bounded thread pool and each exchange is throttled by its
+    own token bucket (FUNDING_FETCH_RATE_LIMITS). Yields (symbol, rows, failed) as
+    soon as all exchanges have answered for a symbol, so downstream stages can
+    start before the whole download is finished; `failed` is the set of exchanges
+    whose request for the symbol failed.
+
+    `symbols` is a list, fetched on every exchange, or get_common_symbols()
+    output, fetched only on the exchanges that list each symbol. `since`
+    optionally maps (symbol, exchange) to the first epoch second to fetch;
+    missing keys fetch the whole history window. Failed requests are logged,
+    counted in FUNDING_FETCH_ERRORS and leave that exchange's rows out.
+    """
+    since = since or {}
+    fetchers = {exchange: funding_fetcher(exchange) for exchange in config.ARBITRAGE_EXCHANGES}
+    limiters = {}
+    for exchange in fetchers:
+        rate = FUNDING_FETCH_RATE_LIMITS.get(exchange, DEFAULT_FUNDING_FETCH_RATE_LIMIT)
+        limiters[exchange] = TokenBucket(rate, capacity=rate)
+    max_workers = max_workers or config.FUNDING_FETCH_MAX_WORKERS
+
+    def fetch(exchange, symbol):
+        limiters[exchange].acquire()
+        return fetchers[exchange](symbol, since.get((symbol, exchange)))
+
+    if not isinstance(symbols, dict):
+        symbols = {symbol: list(fetchers) for symbol in symbols}
+    requests_by_symbol = {
+        symbol: [exchange for exchange in exchanges if exchange in fetchers] for symbol, exchanges in symbols.items()
+    }
+    remaining = {symbol: len(exchanges) for symbol, exchanges in requests_by_symbol.items()}
+    for symbol, count in remaining.items():
+        if count == 0:
+            yield symbol, [], set()
+    rows_by_symbol = defaultdict(list)
+    failed_by_symbol = defaultdict(set)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='funding-fetch') as executor:
+        futures = {
+            executor.submit(fetch, exchange, symbol): (symbol, exchange)
+            for symbol, exchanges in requests_by_symbol.items() for exchange in exchanges
+        }
+        for future in as_completed(futures):
+            symbol, exchange = futures[future]
+            try:
+                rows_by_symbol[symbol].extend(future.result())
+            except Exception as e:
+                logging.error(f"Error fetching {exchange} funding rates for {symbol}: {e}")
+                FUNDING_FETCH_ERRORS.labels(exchange, fetch_error_kind(e)).inc()
+                failed_by_symbol[symbol].add(exchange)
+            remaining[symbol] -= 1
+            if remaining[symbol] == 0:
+                yield symbol, rows_by_symbol.pop(symbol, []), failed_by_symbol.pop(symbol, set())
+
+def funding_columns(data, fields=('symbol', 'exchange', 'timestamp', 'funding_rate')):
+    """
+    Return funding rate data as NumPy column arrays keyed by field name.
+    Accepts either a list of row dicts or a DataFrame with the same columns.
+    """
+    if isinstance(data, pd.DataFrame):
+        return {name: data[name].to_numpy() for name in fields}
+    dtypes = {'symbol': object, 'exchange': object, 'timestamp': None, 'funding_rate': float}
+    return {name: np.array([row[name] for row in data], dtype=dtypes[name]) for name in fields}
+
+def filter_to_settlement_times(data):
+    """
+    Filter data to keep only the record closest to each settlement time (00, 08, 16 UTC).
+
+    Timestamps (epoch seconds) are snapped to the nearest 8h slot with integer arithmetic,
+    and the closest record per (symbol, exchange, slot) is picked with a sort-based
+    group-by argmin. Accepts a list of row dicts or a DataFrame and returns the same type.
+    """
+    if len(data) == 0:
+        return data
+
+    columns = funding_columns(data, fields=('symbol', 'exchange', 'timestamp'))
+    ts = columns['timestamp'].astype(np.int64)
+    slots = (ts + SETTLEMENT_INTERVAL_SECONDS // 2) // SETTLEMENT_INTERVAL_SECONDS
+    distance = np.abs(ts - slots * SETTLEMENT_INTERVAL_SECONDS)
+    symbol_codes, _ = pd.factorize(columns['symbol'])
+    exchange_codes, _ = pd.factorize(columns['exchange'])
+
+    # Sort by group, then by distance (input order breaks ties); the first row of each group wins
+    order = np.lexsort((np.arange(len(ts)), distance, slots, exchange_codes, symbol_codes))
+    group_keys = np.stack([symbol_codes[order], exchange_codes[order], slots[order]])
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = np.any(group_keys[:, 1:] != group_keys[:, :-1], axis=0)
+    selected = np.sort(order[is_first])
+
+    if isinstance(data, pd.DataFrame):
+        return data.iloc[selected]
+    return [data[i] for i in selected]
+
+def perform_analysis(data, exchanges=None):
+    """
+    Perform analysis on funding rate data (a list of row dicts or a DataFrame).
+
+    Rows are encoded as integer (symbol, settlement) keys and pivoted into one
+    rate column per exchange (`exchanges`, default ARBITRAGE_EXCHANGES).
+    Settlements quoted on at least two exchanges count, with the spread between
+    their highest and lowest rate. Per symbol, the short/long exchange pair with
+    the highest mean rate difference is reported together with the standard
+    deviation of that difference. Every statistic is computed for all symbols at
+    once with NumPy group sums instead of a Python loop per symbol.
+    """
+    if len(data) == 0:
         return []
 
-def fetch_gate_rates(symbol):
-    """Fetch funding rates for a specific symbol from Gate.io."""
-    params = {'contract': f"{symbol[:-4]}_{symbol[-4:]}", 'limit': 1000, 'start_time': start_time}
-    try:
-        r = requests.get(GATE_FUNDING_ENDPOINT, params=params, timeout=10)
-        if r.status_code != 200: return []
-        return [
-            {'symbol': symbol, 'exchange': 'gateio', 'timestamp': datetime.utcfromtimestamp(e['t']).isoformat() + 'Z', 'funding_rate': e['r']}
-            for e in r.json()
-        ]
-    except Exception:
+    exchanges = list(exchanges or config.ARBITRAGE_EXCHANGES)
+    num_exchanges = len(exchanges)
+    columns = funding_columns(data)
+    symbol_codes, symbols = pd.factorize(columns['symbol'])
+    ts_codes, timestamps = pd.factorize(columns['timestamp'])
+    exchange_codes = pd.Index(exchanges).get_indexer(columns['exchange'])
+    rates = columns['funding_rate'].astype(float)
+    keys = symbol_codes.astype(np.int64) * len(timestamps) + ts_codes
+
+    # Latest rate per (key, exchange); reversed first so np.unique's first occurrence
+    # is the last row, like a dict overwrite
+    known = exchange_codes >= 0
+    cell_keys = (keys[known] * num_exchanges + exchange_codes[known])[::-1]
+    unique_cells, first_index = np.unique(cell_keys, return_index=True)
+    row_keys, rows = np.unique(unique_cells // num_exchanges, return_inverse=True)
+    matrix = np.full((len(row_keys), num_exchanges), np.nan)
+    matrix[rows, unique_cells % num_exchanges] = rates[known][::-1][first_index]
+
+    quoted = np.count_nonzero(~np.isnan(matrix), axis=1) >= 2
+    matrix, row_keys = matrix[quoted], row_keys[quoted]
+    if len(row_keys) == 0:
         return []
 
-def fetch_bitget_rates(symbol):
-    """Fetch funding rates for a specific symbol from Bitget."""
-    params = {'symbol': f"{symbol}_UMCBL", 'pageSize': 100, 'pageNo': 1, 'startTime': start_time * 1000}
+    spreads = np.nanmax(matrix, axis=1) - np.nanmin(matrix, axis=1)
+    diff_symbols = row_keys // len(timestamps)
+
+    num_symbols = len(symbols)
+    counts = np.bincount(diff_symbols, minlength=num_symbols)
+    present = np.flatnonzero(counts)
+    counts = counts[present]
+
+    def sum_by_symbol(values):
+        return np.bincount(diff_symbols, weights=values, minlength=num_symbols)[present]
+
+    mean_abs_diff = sum_by_symbol(spreads) / counts
+    opportunity_freq = sum_by_symbol((spreads > OPPORTUNITY_THRESHOLD).astype(float)) / counts
+    avg_annualized_return = mean_abs_diff * 3 * 365
+
+    # Mean of every (short, long) entry of the difference matrix per symbol; rows are
+    # sorted by symbol, so each symbol is one contiguous block
+    differences = funding_matrix.rate_difference_matrix(matrix).reshape(len(matrix), -1)
+    has_pair = ~np.isnan(differences)
+    starts = np.searchsorted(diff_symbols, present)
+    pair_counts = np.add.reduceat(has_pair.astype(np.int64), starts, axis=0)
+    pair_sums = np.add.reduceat(np.where(has_pair, differences, 0.0), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pair_means = np.where(pair_counts > 0, pair_sums / pair_counts, -np.inf)
+    best_pair = np.argmax(pair_means, axis=1)
+    symbol_index = np.arange(len(present))
+    mean_diff = pair_means[symbol_index, best_pair]
+
+    row_symbol = np.repeat(symbol_index, counts)
+    chosen = differences[np.arange(len(differences)), best_pair[row_symbol]]
+    deviations = np.where(np.isnan(chosen), 0.0, chosen - mean_diff[row_symbol])
+    std_dev = np.sqrt(sum_by_symbol(deviations ** 2) / pair_counts[symbol_index, best_pair])
+
+    # Symbols keep their input order for ties, like the original per-symbol loop
+    order = np.argsort(-avg_annualized_return, kind='stable')
+    return [
+        {
+            "symbol": symbols[present[i]],
+            "avg_annualized_return": float(avg_annualized_return[i]),
+            "opportunity_frequency": float(opportunity_freq[i]),
+            "std_dev": float(std_dev[i]),
+            "data_points": int(counts[i]),
+            "short_exchange": exchanges[best_pair[i] // num_exchanges],
+            "long_exchange": exchanges[best_pair[i] % num_exchanges]
+        }
+        for i in order
+    ]
+
+def analysis_paths():
+    return [ANALYSIS_JSON]
+
+def load_analysis_summary():
+    """Load the analysis summary JSON (cached until the file changes)."""
+    return data_cache.get('analysis_summary', [ANALYSIS_JSON], _read_analysis_summary)
+
+def _read_analysis_summary():
+    if not os.path.exists(ANALYSIS_JSON):
+        return []
     try:
-        r = requests.get(BITGET_FUNDING_ENDPOINT, params=params, timeout=10)
-        if r.status_code != 200 or not r.json().get('data'): return []
-        return [
-            {'symbol': symbol, 'exchange': 'bitget', 'timestamp': datetime.utcfromtimestamp(int(e['settleTime']) / 1000).isoformat() + 'Z', 'funding_rate': e['fundingRate']}
-            for e in r.json()['data']
-        ]
-    except Exception:
+        with open(ANALYSIS_JSON, 'r', encoding='utf-8') as f:
+            analysis_data = json.load(f)
+        logging.info(f"Loaded analysis data for {len(analysis_data)} symbols")
+        return analysis_data
+    except Exception as e:
+        logging.error(f"Error loading analysis data: {e}")
         return []
 
-def filter_to_settlement_times(data):
-    """Filter data to keep only the record closest to each settlement time (00, 08, 16 UTC)."""
-    def round_to_nearest_8h(dt):
-        hour = dt.hour
-        nearest = min([0, 8, 16], key=lambda h: abs(hour - h))
-        return dt.replace(hour=nearest, minute=0, second=0, microsecond=0)
-
-    grouped = defaultdict(list)
-    for row in data:
-        dt = datetime.fromisoformat(row['timestamp'].replace('Z', ''))
-        slot_dt = round_to_nearest_8h(dt)
-        key = (row['symbol'], row['exchange'], slot_dt.date(), slot_dt.hour)
-        grouped[key].append((abs((dt - slot_dt).total_seconds()), row))
-
-    filtered = []
-    for v in grouped.values():
-        v.sort(key=lambda x: x[0])
-        filtered.append(v[0][1])
-    return filtered
-
-def perform_analysis(data):
-    """Perform analysis on funding rate data."""
-    analysis_results = []
-    data_by_symbol = defaultdict(list)
-    for row in data:
-        data_by_symbol[row['symbol']].append(row)
-
-    for symbol, rows in data_by_symbol.items():
-        grouped_by_ts = defaultdict(dict)
-        for row in rows:
-            grouped_by_ts[row['timestamp']][row['exchange']] = float(row['funding_rate'])
-        
-        diffs = [exchanges['bitget'] - exchanges['gateio'] for exchanges in grouped_by_ts.values() if 'gateio' in exchanges and 'bitget' in exchanges]
-        if not diffs: continue
+def conditional(paths, extra=None):
+    """
+    Makes a GET JSON endpoint answer If-None-Match with 304 Not Modified.
 
-        count = len(diffs)
-        mean_abs_diff = sum(map(abs, diffs)) / count
-        avg_annualized_return = mean_abs_diff * 3 * 365
-        
-        variance = sum([(d - (sum(diffs) / count))**2 for d in diffs]) / count
-        std_dev = variance**0.5
-        
-        opportunity_count = sum(1 for d in diffs if abs(d) > OPPORTUNITY_THRESHOLD)
-        opportunity_freq = opportunity_count / count
-
-        analysis_results.append({
-            "symbol": symbol,
-            "avg_annualized_return": avg_annualized_return,
-            "opportunity_frequency": opportunity_freq,
-            "std_dev": std_dev,
-            "data_points": count
-        })
-    
-    analysis_results.sort(key=lambda x: x['avg_annualized_return'], reverse=True)
-    return analysis_results
+    The ETag is derived from the versions of the files returned by `paths()`,
+    the request's query string and `extra()` if given (state that changes the
+    response without changing a file), so an unchanged poll is answered after
+    a few stat() calls without running the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = http_cache.data_etag(paths(), request.full_path, extra() if extra else None)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # Browsers must revalidate every time, the 304 keeps that cheap
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
 
-def load_funding_data():
-    """Load existing funding rate data from files."""
-    analysis_data = []
-    raw_data = []
-    
-    # Load analysis summary
-    if os.path.exists(ANALYSIS_JSON):
-        try:
-            with open(ANALYSIS_JSON, 'r', encoding='utf-8') as f:
-                analysis_data = json.load(f)
-            logging.info(f"Loaded analysis data for {len(analysis_data)} symbols")
-        except Exception as e:
-            logging.error(f"Error loading analysis data: {e}")
-    
-    # Load raw data
-    if os.path.exists(RAW_DATA_CSV):
-        try:
-            with open(RAW_DATA_CSV, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                raw_data = list(reader)
-            logging.info(f"Loaded raw data: {len(raw_data)} records")
-        except Exception as e:
-            logging.error(f"Error loading raw data: {e}")
-    
-    return analysis_data, raw_data
+@app.after_request
+def compress(response):
+    """gzip/brotli large JSON and CSV responses"""
+    return http_cache.compress_response(response, request.accept_encodings)
 
-def get_trade_data():
-    """讀取並處理交易歷史數據"""
-    if not os.path.exists(TRADE_HISTORY_FILE):
-        logging.info(f"'{TRADE_HISTORY_FILE}' not found. This is normal for first run or test mode.")
-        return pd.DataFrame()
+def trade_data_paths():
+    """Files whose versions determine every view derived from the trade history."""
+    return trade_store.paths()
+
+def trade_frame(records):
+    """將交易紀錄轉為 DataFrame：解析時間、移除損壞資料並依時間降序排序"""
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
     
     try:
-        df = pd.read_csv(TRADE_HISTORY_FILE)
-        logging.info(f"Loaded CSV. Shape: {df.shape}. Columns: {df.columns.tolist()}")
-        
-        if df.empty:
-            logging.info("CSV is empty after loading.")
-            return df
-        
-        # 檢查必要的欄位是否存在
-        required_columns = ['timestamp_utc', 'pair', 'action']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            logging.error(f"Missing required columns in CSV: {missing_columns}")
-            logging.error(f"Available columns: {df.columns.tolist()}")
-            return pd.DataFrame()
-            
-        # --- 向下兼容處理 ---
-        # 確保所有新版欄位都存在，若不存在則補上空值
-        for col in ['trade_id', 'close_reason', 'realized_pnl']:
-            if col not in df.columns:
-                df[col] = pd.NA
-        
-        # 填充空的 trade_id，以便識別和處理舊紀錄
-        legacy_mask = df['trade_id'].isna()
-        num_legacy = legacy_mask.sum()
-        if num_legacy > 0:
-            # 為每個 legacy 紀錄生成一個唯一的 ID
-            df.loc[legacy_mask, 'trade_id'] = [f'legacy_{i}' for i in range(num_legacy)]
-        logging.info(f"Processed trade_ids. Found {num_legacy} legacy records.")
-
         # --- 數據清洗 ---
         # 確保時間欄位格式正確, 對於無法解析的日期，將其設為 NaT (Not a Time)
         original_rows = len(df)
         # 加上 utc=True，讓所有時間都變成有時區的 (tz-aware) UTC 時間
-        df['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'], errors='coerce', utc=True)
+        df['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'], format='ISO8601', errors='coerce', utc=True)
         
         # 移除時間格式不正確的損壞資料行
         df.dropna(subset=['timestamp_utc'], inplace=True)
         
         if len(df) < original_rows:
-            logging.warning(f"Removed {original_rows - len(df)} rows with invalid datetime format from CSV.")
+            logging.warning(f"Removed {original_rows - len(df)} rows with invalid datetime format from trade history.")
 
         if df.empty:
             logging.info("DataFrame is empty after removing corrupted rows.")
@@ -230,154 +487,188 @@ def get_trade_data():
 
         return df
     except Exception as e:
-        logging.error(f"CRITICAL: Error in get_trade_data: {e}", exc_info=True)
+        logging.error(f"CRITICAL: Error in trade_frame: {e}", exc_info=True)
         return pd.DataFrame()
 
 @app.route('/')
 def index():
     """提供主頁面"""
-    return render_template('index.html')
+    return render_template('index.html', exchanges=registry.configured_exchanges())
 
 @app.route('/funding-rates')
 def funding_rates():
     """提供資金費率分析頁面"""
-    return render_template('funding_rates.html')
+    return render_template('funding_rates.html', exchanges=registry.configured_exchanges())
+
+def build_open_positions():
+    """未平倉交易列表（持倉時間隨時間變動，於回應時才計算）"""
+    # 索引查詢：只讀取尚未平倉交易的 OPEN 紀錄（舊紀錄無法判斷是否為未平倉，因此排除）
+    df = trade_frame(timed_read('trades', 'open_trades', trade_store.open_trades))
+    if df.empty:
+        logging.info("get_open_positions: no open trades in the trade store.")
+        return []
+    return df.to_dict('records')
+
+def snapshot_is_fresh():
+    """True while the bot keeps its position snapshot up to date."""
+    age = snapshot_age(POSITION_SNAPSHOT_FILE)
+    return age is not None and age <= config.POSITION_SNAPSHOT_MAX_AGE_SECONDS
+
+def open_positions_paths():
+    return trade_data_paths() + [POSITION_SNAPSHOT_FILE]
 
 @app.route('/history/open')
+@conditional(open_positions_paths, extra=snapshot_is_fresh)
 def get_open_positions():
-    """提供當前未平倉的交易"""
-    df = get_trade_data()
-    if df.empty:
-        logging.info("get_open_positions: DataFrame is empty from get_trade_data.")
-        return jsonify([])
-    
+    """
+    提供當前未平倉的交易
+
+    Returns {source, version, generated_at, positions}. While the bot's
+    snapshot is fresh, its bytes are served as they are (source "bot",
+    positions include live PnL and prices). Otherwise positions come from the
+    trade store (source "store") and snapshot_updated_at is the time of the
+    last (stale) snapshot, or null if the bot never wrote one.
+
+    holding_time is as of generated_at (snapshot) or of the response (store);
+    a 304 revalidation keeps the earlier value, so clients that display it
+    should recompute it from timestamp_utc.
+    """
     try:
-        open_positions = []
-        # 舊紀錄無法判斷是否為未平倉，因此直接排除
-        trades_by_id = df[~df['trade_id'].astype(str).str.startswith('legacy_')].groupby('trade_id')
-        
-        for trade_id, group in trades_by_id:
-            # 未平倉交易 = 只有一筆 OPEN 紀錄
-            if len(group) == 1 and group.iloc[0]['action'] == 'OPEN':
-                trade = group.iloc[0].to_dict()
-                trade['holding_time'] = (pd.Timestamp.utcnow() - pd.Timestamp(trade['timestamp_utc'])).total_seconds() / 3600
-                open_positions.append(trade)
+        if snapshot_is_fresh():
+            with open(POSITION_SNAPSHOT_FILE, 'rb') as f:
+                return Response(f.read(), mimetype='application/json')
+
+        now = pd.Timestamp.utcnow()
+        open_positions = [
+            {**trade, 'holding_time': (now - pd.Timestamp(trade['timestamp_utc'])).total_seconds() / 3600}
+            for trade in data_cache.get('open_positions', trade_data_paths(), build_open_positions)
+        ]
         
         logging.info(f"Returning {len(open_positions)} open positions.")
-        return jsonify(open_positions)
+        return jsonify({
+            'source': 'store',
+            'version': None,
+            'generated_at': None,
+            'snapshot_updated_at': snapshot_mtime(POSITION_SNAPSHOT_FILE),
+            'positions': open_positions
+        })
     except Exception as e:
         logging.error(f"Error processing open positions: {e}", exc_info=True)
         abort(500, description="Could not process open positions data.")
 
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+@app.route('/stream')
+def stream():
+    """
+    Server-Sent Events: position_opened, position_closed and pnl events from
+    the bot as they happen. Reconnecting clients resume after Last-Event-ID.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = event_hub.subscribe(last_event_id)
+
+    def events():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                batch = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                if not batch:
+                    yield ': keepalive\n\n'
+                    continue
+                yield ''.join(format_sse(event) for event in batch)
+        finally:
+            subscription.close()
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Reverse proxies (nginx) must not buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# /history/closed page size
+CLOSED_PAGE_DEFAULT_LIMIT = 50
+CLOSED_PAGE_MAX_LIMIT = 500
+
+def encode_cursor(cursor):
+    """Opaque page cursor for (close_ts, trade_id)."""
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode()).decode()
+
+def decode_cursor(token):
+    close_ts, trade_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    return float(close_ts), str(trade_id)
+
+def parse_time_arg(value):
+    """Epoch seconds, or an ISO date/time (UTC if no offset is given), as epoch seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        ts = pd.Timestamp(value)
+        if ts.tzinfo is None:
+            ts = ts.tz_localize('UTC')
+        return ts.timestamp()
+
+def closed_filters(args):
+    """Filters of /history/closed from the query string."""
+    return {
+        'pair': args.get('pair') or None,
+        'exchange': args.get('exchange') or None,
+        'close_reason': args.get('close_reason') or None,
+        'start': parse_time_arg(args['start']) if args.get('start') else None,
+        'end': parse_time_arg(args['end']) if args.get('end') else None,
+    }
+
 @app.route('/history/closed')
+@conditional(trade_data_paths)
 def get_closed_positions():
-    """提供已平倉的交易"""
-    df = get_trade_data()
-    if df.empty:
-        logging.info("get_closed_positions: DataFrame is empty from get_trade_data.")
-        return jsonify([])
-    
+    """
+    提供已平倉的交易（分頁）
+
+    Query: limit, cursor (from next_cursor), pair, exchange, close_reason, start, end.
+    Returns one page ordered by close time (newest first), the cursor of the
+    next page and totals over every trade matching the filters.
+    """
     try:
-        closed_positions = []
-        
-        # 1. 將所有無法配對的舊紀錄視為已平倉
-        legacy_trades = df[df['trade_id'].astype(str).str.startswith('legacy_')]
-        for _, trade in legacy_trades.iterrows():
-            position = trade.to_dict()
-            # 由於是舊紀錄，我們不知道確切的開倉/平倉時間，只用一個時間戳
-            position['time'] = position.pop('timestamp_utc') 
-            position['close_reason'] = position.get('close_reason') or '舊紀錄 (無法配對)'
-            
-            # 補上新格式需要的欄位，但給予明確的空值或標記
-            position['open_time'] = None
-            position['close_time'] = position['time'] # 將主要時間戳視為平倉時間
-            position['holding_time'] = -1 # 用-1作為標記，表示未知
-            closed_positions.append(position)
-        
-        # 2. 處理有完整開/平倉紀錄的新交易
-        trades_by_id = df[~df['trade_id'].astype(str).str.startswith('legacy_')].groupby('trade_id')
-        
-        for trade_id, group in trades_by_id:
-            # 已平倉交易 = 有 OPEN 和 CLOSE 兩筆紀錄
-            if len(group) == 2:
-                open_trade_df = group[group['action'] == 'OPEN']
-                close_trade_df = group[group['action'] == 'CLOSE']
-
-                if not open_trade_df.empty and not close_trade_df.empty:
-                    open_trade = open_trade_df.iloc[0]
-                    close_trade = close_trade_df.iloc[0]
-                    
-                    position = {
-                        'trade_id': trade_id,
-                        'pair': open_trade['pair'],
-                        'open_time': open_trade['timestamp_utc'],
-                        'close_time': close_trade['timestamp_utc'],
-                        'holding_time': (pd.Timestamp(close_trade['timestamp_utc']) - pd.Timestamp(open_trade['timestamp_utc'])).total_seconds() / 3600,
-                        'short_exchange': open_trade['short_exchange'],
-                        'long_exchange': open_trade['long_exchange'],
-                        'size_usdt': open_trade['size_usdt'],
-                        'open_short_price': open_trade['short_price'],
-                        'open_long_price': open_trade['long_price'],
-                        'close_short_price': close_trade['short_price'],
-                        'close_long_price': close_trade['long_price'],
-                        'open_funding_rate_diff': open_trade['funding_rate_diff_annualized_percent'],
-                        'close_funding_rate_diff': close_trade['funding_rate_diff_annualized_percent'],
-                        'close_reason': close_trade['close_reason'],
-                        'realized_pnl': close_trade['realized_pnl'],
-                        'funding_fee_profit': close_trade['funding_fee_profit']
-                    }
-                    closed_positions.append(position)
-        
-        # 3. 將所有已平倉紀錄按時間排序
-        closed_positions.sort(key=lambda x: x['close_time'], reverse=True)
-        logging.info(f"Returning {len(closed_positions)} closed positions ({len(legacy_trades)} legacy).")
-        return jsonify(closed_positions)
+        filters = closed_filters(request.args)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = min(max(request.args.get('limit', CLOSED_PAGE_DEFAULT_LIMIT, type=int), 1), CLOSED_PAGE_MAX_LIMIT)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+    try:
+        items, next_cursor = timed_read('trades', 'closed_page', trade_store.closed_page, filters, after=after, limit=limit)
+        totals = timed_read('trades', 'closed_totals', trade_store.closed_totals, filters)
+        logging.info(f"Returning {len(items)} of {totals['count']} closed positions.")
+        return jsonify({
+            'items': items,
+            'next_cursor': encode_cursor(next_cursor) if next_cursor else None,
+            'totals': totals,
+            'limit': limit
+        })
     except Exception as e:
         logging.error(f"Error processing closed positions: {e}", exc_info=True)
         abort(500, description="Could not process closed positions data.")
 
 # --- Funding Rate Analysis API Endpoints ---
 @app.route('/api/analysis')
+@conditional(analysis_paths)
 def get_analysis():
     """API endpoint to get analysis summary"""
-    analysis_data, _ = load_funding_data()
-    return jsonify(analysis_data)
+    return jsonify(load_analysis_summary())
 
 @app.route('/api/clear-closed-trades', methods=['POST'])
 def clear_closed_trades():
     """API endpoint to clear closed trades from trading history"""
     try:
-        df = get_trade_data()
-        if df.empty:
-            return jsonify({'success': True, 'message': 'No trading history to clear'})
-        
-        # 保留開倉中的交易（只有 OPEN 沒有 CLOSE 的記錄）
-        trades_by_id = df.groupby('trade_id')
-        open_trades = []
-        
-        for trade_id, group in trades_by_id:
-            # 如果只有 OPEN 記錄，表示交易還在進行中
-            if len(group) == 1 and 'OPEN' in group['action'].values:
-                open_trades.append(group.iloc[0])
-        
-        # 重新寫入只包含開倉中交易的 CSV
-        if open_trades:
-            new_df = pd.DataFrame(open_trades)
-            new_df.to_csv(TRADE_HISTORY_FILE, index=False)
-            logging.info(f"Cleared closed trades. Kept {len(open_trades)} open trades.")
+        # 保留開倉中的交易（只有 OPEN 沒有 CLOSE 的記錄），其餘全部刪除
+        kept = trade_store.clear_closed()
+        if kept:
+            logging.info(f"Cleared closed trades. Kept {kept} open trades.")
             return jsonify({
                 'success': True, 
-                'message': f'已清空已平倉交易記錄，保留 {len(open_trades)} 筆開倉中交易'
+                'message': f'已清空已平倉交易記錄，保留 {kept} 筆開倉中交易'
             })
         else:
-            # 如果沒有開倉中的交易，清空整個檔案
-            with open(TRADE_HISTORY_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=[
-                    'timestamp_utc', 'pair', 'action', 'short_exchange', 'long_exchange',
-                    'size_usdt', 'short_price', 'long_price', 'funding_rate_diff_annualized_percent',
-                    'close_reason', 'realized_pnl', 'funding_fee_profit', 'trade_id'
-                ])
-                writer.writeheader()
             logging.info("Cleared all trading history.")
             return jsonify({
                 'success': True, 
@@ -388,180 +679,282 @@ def clear_closed_trades():
         logging.error(f"Error clearing closed trades: {e}", exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Closed positions read from the trade store per export chunk
+EXPORT_CHUNK_ROWS = 5000
+
+def iter_export_csv(filters, compress=False):
+    """
+    Yields the closed-trades CSV export piece by piece: the header first, then
+    one block per chunk read from the trade store, optionally gzip-compressed
+    on the fly. Memory use is bounded by one chunk.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    columns = [trade_pairing.EXPORT_RENAMES.get(name, name)
+               for name in trade_pairing.POSITION_COLUMNS + trade_pairing.LEGACY_COLUMNS]
+    pieces = itertools.chain(
+        [','.join(columns) + '\n'],
+        (trade_pairing.export_frame(chunk).to_csv(index=False, header=False)
+         for chunk in trade_store.iter_closed_chunks(filters, chunk_size=EXPORT_CHUNK_ROWS))
+    )
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        if compressor is None:
+            yield data
+        else:
+            compressed = compressor.compress(data)
+            if compressed:
+                yield compressed
+    if compressor is not None:
+        yield compressor.flush()
+
 @app.route('/api/export-closed-trades')
 def export_closed_trades():
-    """API endpoint to export closed trades as CSV"""
+    """
+    API endpoint to export closed trades as CSV (streamed)
+
+    Accepts the filters of /history/closed (pair, exchange, close_reason, start, end)
+    and gzip=1 to download a .csv.gz file.
+    """
     try:
-        df = get_trade_data()
-        if df.empty:
-            return jsonify({'error': 'No trading history to export'}), 404
-        
-        # 獲取已平倉交易
-        closed_positions = []
-        
-        # 處理舊紀錄
-        legacy_trades = df[df['trade_id'].astype(str).str.startswith('legacy_')]
-        for _, trade in legacy_trades.iterrows():
-            closed_positions.append(trade.to_dict())
-        
-        # 處理有完整開/平倉紀錄的新交易
-        trades_by_id = df[~df['trade_id'].astype(str).str.startswith('legacy_')].groupby('trade_id')
-        
-        for trade_id, group in trades_by_id:
-            if len(group) == 2:  # 有 OPEN 和 CLOSE 兩筆紀錄
-                open_trade_df = group[group['action'] == 'OPEN']
-                close_trade_df = group[group['action'] == 'CLOSE']
-
-                if not open_trade_df.empty and not close_trade_df.empty:
-                    open_trade = open_trade_df.iloc[0]
-                    close_trade = close_trade_df.iloc[0]
-                    
-                    # 創建一個包含完整交易信息的記錄
-                    export_record = {
-                        'trade_id': trade_id,
-                        'pair': open_trade['pair'],
-                        'open_time': open_trade['timestamp_utc'],
-                        'close_time': close_trade['timestamp_utc'],
-                        'holding_time_hours': (pd.Timestamp(close_trade['timestamp_utc']) - pd.Timestamp(open_trade['timestamp_utc'])).total_seconds() / 3600,
-                        'short_exchange': open_trade['short_exchange'],
-                        'long_exchange': open_trade['long_exchange'],
-                        'size_usdt': open_trade['size_usdt'],
-                        'open_short_price': open_trade['short_price'],
-                        'open_long_price': open_trade['long_price'],
-                        'close_short_price': close_trade['short_price'],
-                        'close_long_price': close_trade['long_price'],
-                        'open_funding_rate_diff_percent': open_trade['funding_rate_diff_annualized_percent'],
-                        'close_funding_rate_diff_percent': close_trade['funding_rate_diff_annualized_percent'],
-                        'close_reason': close_trade['close_reason'],
-                        'realized_pnl': close_trade['realized_pnl'],
-                        'funding_fee_profit': close_trade['funding_fee_profit']
-                    }
-                    closed_positions.append(export_record)
-        
-        if not closed_positions:
+        filters = closed_filters(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+    try:
+        if trade_store.closed_totals(filters)['count'] == 0:
             return jsonify({'error': 'No closed trades to export'}), 404
-        
-        # 按平倉時間排序
-        closed_positions.sort(key=lambda x: x.get('close_time', x.get('timestamp_utc', '')), reverse=True)
-        
-        # 生成 CSV 內容
-        from io import StringIO
-        output = StringIO()
-        
-        if closed_positions:
-            fieldnames = closed_positions[0].keys()
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(closed_positions)
-        
-        csv_content = output.getvalue()
-        output.close()
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
         
         # 生成檔案名
-        from datetime import datetime
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'closed_trades_export_{timestamp}.csv'
+        filename = f'closed_trades_export_{timestamp}.csv' + ('.gz' if compress else '')
         
-        # 返回 CSV 檔案
-        response = make_response(csv_content)
-        response.headers['Content-Type'] = 'text/csv'
+        # 邊讀取邊輸出，不在記憶體中組出整份檔案
+        response = Response(stream_with_context(iter_export_csv(filters, compress)),
+                            mimetype='application/gzip' if compress else 'text/csv')
         response.headers['Content-Disposition'] = f'attachment; filename={filename}'
         
-        logging.info(f"Exported {len(closed_positions)} closed trades to {filename}")
+        logging.info(f"Streaming closed trades export {filename}")
         return response
         
     except Exception as e:
         logging.error(f"Error exporting closed trades: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+def funding_data_paths():
+    """Files whose versions determine every view derived from the funding rate store."""
+    return [FUNDING_DB_FILE, FUNDING_DB_FILE + '-wal']
+
 @app.route('/api/raw-data/<symbol>')
+@conditional(funding_data_paths)
 def get_raw_data(symbol):
     """API endpoint to get raw funding rate data for a specific symbol"""
-    _, raw_data = load_funding_data()
-    
-    # Filter data for the specific symbol
-    symbol_data = [row for row in raw_data if row['symbol'] == symbol]
+    return jsonify(data_cache.get(('raw_data', symbol), funding_data_paths(), lambda: build_raw_series(symbol)))
+
+def build_raw_series(symbol):
+    """Per-settlement rates of every configured exchange and the best spread for one symbol, newest first."""
+    # Indexed lookup: only this symbol's rows are read
+    symbol_data = timed_read('funding', 'symbol_rows', funding_store.symbol_rows, symbol)
+    configured = set(config.ARBITRAGE_EXCHANGES)
     
     # Group by timestamp
     grouped_data = defaultdict(dict)
     for row in symbol_data:
-        timestamp = row['timestamp']
         exchange = row['exchange']
-        rate = float(row['funding_rate'])
-        grouped_data[timestamp][exchange] = rate
+        if exchange in configured:
+            grouped_data[row['timestamp']][exchange] = float(row['funding_rate'])
     
     # Convert to list format for frontend
     result = []
-    for timestamp, exchanges in grouped_data.items():
-        if 'gateio' in exchanges and 'bitget' in exchanges:
-            diff = exchanges['bitget'] - exchanges['gateio']
-            # 套利費率差：顯示做空-做多獲得的費率差
-            arbitrage_rate_diff = abs(diff)  # 套利費率差總是正值
-            annual_return = arbitrage_rate_diff * 3 * 365 * 100  # Convert to percentage
-            
-            result.append({
-                'timestamp': timestamp,
-                'bitget_rate': exchanges['bitget'] * 100,  # Convert to percentage
-                'gateio_rate': exchanges['gateio'] * 100,  # Convert to percentage
-                'difference': diff * 100,  # Convert to percentage (原始差異，可能為負)
-                'abs_difference': arbitrage_rate_diff * 100,  # Convert to percentage (套利費率差)
-                'annual_return': annual_return,
-                'is_opportunity': arbitrage_rate_diff > OPPORTUNITY_THRESHOLD
-            })
+    for timestamp, rates in grouped_data.items():
+        if len(rates) < 2:
+            continue
+        # 套利費率差：在費率最高的交易所做空、最低的交易所做多獲得的費率差
+        short_exchange = max(rates, key=rates.get)
+        long_exchange = min(rates, key=rates.get)
+        arbitrage_rate_diff = rates[short_exchange] - rates[long_exchange]
+        annual_return = arbitrage_rate_diff * 3 * 365 * 100  # Convert to percentage
+        
+        result.append({
+            'timestamp': format_timestamp(timestamp),
+            'rates': {exchange: rate * 100 for exchange, rate in rates.items()},  # Convert to percentage
+            'short_exchange': short_exchange,
+            'long_exchange': long_exchange,
+            'abs_difference': arbitrage_rate_diff * 100,  # Convert to percentage (套利費率差)
+            'annual_return': annual_return,
+            'is_opportunity': arbitrage_rate_diff > OPPORTUNITY_THRESHOLD
+        })
     
-    # Sort by timestamp (newest first)
+    # Sort by timestamp (newest first); ISO strings sort like the epoch seconds they came from
     result.sort(key=lambda x: x['timestamp'], reverse=True)
     
-    return jsonify(result)
+    return result
+
+def update_funding_data(incremental=True, progress=None):
+    """
+    Runs the funding rate pipeline: fetch every common symbol concurrently, filter each
+    symbol to settlement times as soon as its data arrives, store it and re-analyze it.
+
+    In incremental mode only settlements newer than the stored high-water mark of each
+    (symbol, exchange) are fetched and merged into the store, rows older than the
+    retention window are dropped, and analysis is recomputed only for symbols whose
+    history changed. A full refresh re-downloads the whole window for every symbol;
+    the stored rows of an exchange whose request failed are kept, so a failed
+    fetch never drops history.
+
+    `progress(stage=..., done=..., total=...)` is called as the pipeline advances
+    (e.g. Job.update of the background job runner).
+
+    Returns:
+        (analysis_summary, record_count), or None if no common symbols were found.
+    """
+    progress = progress or (lambda **kwargs: None)
+    logging.info(f"Starting funding rate data update ({'incremental' if incremental else 'full'})...")
+
+    progress(stage='symbols')
+    common_symbols = get_common_symbols()
+    if not common_symbols:
+        return None
+
+    window_start = history_window_start()
+    existing_analysis = load_analysis_summary() if incremental else []
+
+    # Apply the rolling retention window to the stored history
+    changed_symbols = funding_store.delete_before(window_start)
+
+    # Only fetch what is newer than the last stored settlement
+    since = {}
+    if incremental:
+        since = {key: max(ts + 1, window_start) for key, ts in funding_store.high_water_marks().items()}
+
+    started = time.time()
+    new_records = 0
+    # Symbols a full refresh must not drop: fetched now, or not fetched because of an error
+    kept_symbols = set()
+    progress(stage='fetch', done=0, total=len(common_symbols))
+    for done, (symbol, rows, failed) in enumerate(iter_funding_rates(common_symbols, since), start=1):
+        if failed:
+            kept_symbols.add(symbol)
+        if rows:
+            new_records += len(rows)
+            changed_symbols.add(symbol)
+            kept_symbols.add(symbol)
+            stored_rows = funding_store.symbol_rows(symbol)
+            if not incremental:
+                stored_rows = [row for row in stored_rows if row['exchange'] in failed]
+            funding_store.replace_symbol(symbol, filter_to_settlement_times(stored_rows + rows))
+        progress(done=done)
+        if done % 50 == 0 or done == len(common_symbols):
+            logging.info(f"Fetched {done}/{len(common_symbols)} symbols ({time.time() - started:.1f}s)")
+    fetch_seconds = time.time() - started
+    FUNDING_FETCH_SYMBOLS.inc(len(common_symbols))
+    FUNDING_FETCH_RECORDS.inc(new_records)
+    FUNDING_FETCH_THROUGHPUT.set(len(common_symbols) / fetch_seconds if fetch_seconds > 0 else 0.0)
+
+    if not incremental:
+        changed_symbols |= funding_store.delete_symbols_except(kept_symbols)
+        # The summary is rebuilt from scratch, including symbols whose fetch failed
+        changed_symbols |= kept_symbols
+
+    record_count = funding_store.count()
+    if not os.path.exists(ANALYSIS_JSON):
+        # No previous summary to update (e.g. right after importing a legacy CSV)
+        changed_symbols |= funding_store.symbols()
+    elif incremental and not changed_symbols:
+        logging.info("No new settlements since the last update, stored data left unchanged.")
+        return existing_analysis, record_count
+
+    logging.info(f"Stored {new_records} new records, recomputing analysis for {len(changed_symbols)} changed symbols...")
+    analysis_by_symbol = {a['symbol']: a for a in existing_analysis if a['symbol'] not in changed_symbols}
+    progress(stage='analyze', done=0, total=len(changed_symbols))
+    for done, symbol in enumerate(sorted(changed_symbols), start=1):
+        for result in perform_analysis(funding_store.symbol_rows(symbol)):
+            analysis_by_symbol[symbol] = result
+        progress(done=done)
+
+    analysis_summary = sorted(analysis_by_symbol.values(), key=lambda x: x['avg_annualized_return'], reverse=True)
+    
+    # Save analysis summary (temp file + rename: readers never see a partial file)
+    progress(stage='save')
+    atomic_write_json(ANALYSIS_JSON, analysis_summary, indent=4)
+    logging.info(f"Saved analysis summary for {len(analysis_summary)} symbols ({record_count} funding rate records stored)")
+
+    return analysis_summary, record_count
+
+# Background jobs; at most one funding rate update runs at a time
+job_runner = JobRunner()
+FUNDING_UPDATE_JOB = 'funding-update'
+
+def run_funding_update_job(job, incremental=True):
+    started = time.perf_counter()
+    try:
+        result = update_funding_data(incremental=incremental, progress=job.update)
+    finally:
+        FUNDING_UPDATE_SECONDS.labels('incremental' if incremental else 'full').observe(time.perf_counter() - started)
+    if result is None:
+        raise RuntimeError('No common symbols found')
+    analysis_summary, record_count = result
+    return {
+        'message': f'Updated data for {len(analysis_summary)} symbols',
+        'analysis_count': len(analysis_summary),
+        'raw_data_count': record_count
+    }
+
+def submit_funding_update(incremental=True):
+    """
+    Starts the funding rate pipeline in the background, or joins the update
+    that is already running (API request or hourly updater). Returns (job, created).
+
+    A full refresh only joins another full refresh; while an incremental update
+    is running it raises JobConflict, since the two would write the same store.
+    """
+    name = 'funding update (incremental)' if incremental else 'funding update (full)'
+    joins = None if incremental else (lambda running: running.params.get('incremental') is False)
+    return job_runner.submit(FUNDING_UPDATE_JOB, run_funding_update_job, incremental=incremental, name=name, joins=joins)
 
 @app.route('/api/update-data', methods=['POST'])
 def update_data():
-    """API endpoint to trigger data update"""
+    """
+    API endpoint to trigger data update
+
+    Returns 202 with a job id right away; progress is at /api/jobs/<job_id>.
+    A request made while an update is running joins that update, except a full
+    refresh during an incremental update, which gets 409 with the running job.
+    """
     try:
-        logging.info("Starting funding rate data update...")
-        
-        common_symbols = get_common_symbols()
-        if not common_symbols:
-            return jsonify({'error': 'No common symbols found'}), 400
-
-        all_raw_data = []
-        for i, symbol in enumerate(common_symbols):
-            logging.info(f"Fetching data for {symbol} ({i+1}/{len(common_symbols)})...")
-            all_raw_data.extend(fetch_gate_rates(symbol))
-            all_raw_data.extend(fetch_bitget_rates(symbol))
-            time.sleep(0.2)  # To avoid hitting rate limits
-
-        logging.info("Filtering data to settlement times...")
-        filtered_data = filter_to_settlement_times(all_raw_data)
-        
-        logging.info("Performing analysis for each symbol...")
-        analysis_summary = perform_analysis(filtered_data)
-        
-        # Save analysis summary
-        with open(ANALYSIS_JSON, 'w', encoding='utf-8') as f:
-            json.dump(analysis_summary, f, indent=4)
-        logging.info(f"Saved analysis summary for {len(analysis_summary)} symbols")
-
-        # Save raw data
-        filtered_data.sort(key=lambda x: (x['symbol'], x['timestamp']), reverse=True)
-        with open(RAW_DATA_CSV, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['symbol', 'exchange', 'timestamp', 'funding_rate'])
-            writer.writeheader()
-            writer.writerows(filtered_data)
-        logging.info(f"Saved {len(filtered_data)} funding rate records")
-        
+        # 預設為增量更新，傳入 {"full": true} 可強制重新下載整個時間窗口
+        full_refresh = bool((request.get_json(silent=True) or {}).get('full'))
+        try:
+            job, created = submit_funding_update(incremental=not full_refresh)
+        except JobConflict as e:
+            return jsonify({
+                'success': False,
+                'error': 'An incremental update is running, retry the full refresh after it has finished',
+                'job_id': e.job.id,
+                'progress_url': f'/api/jobs/{e.job.id}'
+            }), 409
         return jsonify({
             'success': True,
-            'message': f'Updated data for {len(analysis_summary)} symbols',
-            'analysis_count': len(analysis_summary),
-            'raw_data_count': len(filtered_data)
-        })
+            'job_id': job.id,
+            'status': job.status,
+            'deduplicated': not created,
+            'progress_url': f'/api/jobs/{job.id}'
+        }), 202
         
     except Exception as e:
         logging.error(f"Error updating data: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """API endpoint to get the progress (stage, done/total, ETA) or result of a background job"""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(job.snapshot())
+
 @app.route('/api/last-update')
+@conditional(analysis_paths)
 def get_last_update():
     """API endpoint to get last update time"""
     try:
@@ -588,6 +981,126 @@ def get_last_update():
             'has_data': False
         })
 
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    """API endpoint to inspect the data cache (hit/miss counters, size)"""
+    return jsonify(data_cache.stats())
+
+# --- Profiling API Endpoints (admin only, disabled unless ADMIN_TOKEN is set) ---
+sampling_profiler = SamplingProfiler()
+memory_profiler = MemoryProfiler()
+
+def admin_required(view):
+    """
+    Answers 404 unless ADMIN_TOKEN is configured, and 403 unless the request
+    sends it in the X-Admin-Token header.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not config.ADMIN_TOKEN:
+            abort(404)
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+            return jsonify({'error': 'Invalid admin token'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/admin/profiler', methods=['GET'])
+@admin_required
+def get_profiler_status():
+    """Sampling profiler status"""
+    return jsonify(sampling_profiler.status())
+
+@app.route('/api/admin/profiler/start', methods=['POST'])
+@admin_required
+def start_profiler():
+    """
+    Starts sampling every thread's stack. Body (optional): {"interval": seconds
+    between samples, default 0.01; "duration": seconds before it stops by itself, default 60}
+    """
+    options = request.get_json(silent=True) or {}
+    try:
+        interval = min(max(float(options.get('interval', 0.01)), 0.001), 1.0)
+        duration = max(float(options.get('duration', 60)), 1.0)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameter: {e}'}), 400
+    if not sampling_profiler.start(interval=interval, duration=duration):
+        return jsonify({'error': 'Profiler is already running', **sampling_profiler.status()}), 409
+    return jsonify(sampling_profiler.status())
+
+@app.route('/api/admin/profiler/stop', methods=['POST'])
+@admin_required
+def stop_profiler():
+    """Stops the sampling profiler; the samples stay available for download"""
+    return jsonify(sampling_profiler.stop())
+
+@app.route('/api/admin/profiler/collapsed')
+@admin_required
+def download_profile():
+    """Samples in collapsed-stack format (flamegraph.pl, speedscope)"""
+    filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded"
+    return Response(sampling_profiler.collapsed(), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/api/admin/memory', methods=['GET'])
+@admin_required
+def get_memory_status():
+    """tracemalloc status: traced/peak bytes and the snapshots kept"""
+    return jsonify(memory_profiler.status())
+
+@app.route('/api/admin/memory/start', methods=['POST'])
+@admin_required
+def start_memory_tracing():
+    """Starts tracemalloc. Body (optional): {"frames": traceback depth, default 10}"""
+    options = request.get_json(silent=True) or {}
+    try:
+        frames = min(max(int(options.get('frames', 10)), 1), 50)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameter: {e}'}), 400
+    memory_profiler.start(frames)
+    return jsonify(memory_profiler.status())
+
+@app.route('/api/admin/memory/stop', methods=['POST'])
+@admin_required
+def stop_memory_tracing():
+    """Stops tracemalloc and discards its snapshots"""
+    memory_profiler.stop()
+    return jsonify(memory_profiler.status())
+
+@app.route('/api/admin/memory/snapshots', methods=['POST'])
+@admin_required
+def take_memory_snapshot():
+    """Takes a tracemalloc snapshot"""
+    try:
+        return jsonify(memory_profiler.take_snapshot()), 201
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/api/admin/memory/snapshots/<int:snapshot_id>')
+@admin_required
+def get_memory_snapshot(snapshot_id):
+    """
+    Largest allocation sites of a snapshot, or with ?base=<id> the largest
+    changes since that snapshot. Optional: group_by (lineno, filename, traceback), limit.
+    """
+    base_id = request.args.get('base', type=int)
+    key_type = request.args.get('group_by', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': f'Invalid group_by: {key_type}'}), 400
+    limit = min(max(request.args.get('limit', 25, type=int), 1), 500)
+    try:
+        stats = memory_profiler.top(snapshot_id, base_id=base_id, key_type=key_type, limit=limit)
+    except KeyError as e:
+        return jsonify({'error': f'Unknown snapshot id {e}'}), 404
+    return jsonify({'snapshot': snapshot_id, 'base': base_id, 'group_by': key_type, 'stats': stats})
+
+@app.route('/api/admin/threads')
+@admin_required
+def get_thread_cpu():
+    """CPU time per thread; with ?sample=<seconds> also CPU usage over that interval (max 10s)"""
+    sample = min(max(request.args.get('sample', 0.0, type=float), 0.0), 10.0)
+    return jsonify({'sample_seconds': sample, 'threads': thread_cpu_times(sample)})
+
 # --- Configuration Management API Endpoints ---
 @app.route('/config')
 def config_page():
@@ -598,22 +1111,8 @@ def config_page():
 def get_config():
     """API endpoint to get current configuration"""
     try:
-        config.load_config_from_file()
-        config_data = {
-            'MIN_FUNDING_RATE_DIFFERENCE': config.MIN_FUNDING_RATE_DIFFERENCE,
-            'CLOSE_FUNDING_RATE_DIFFERENCE': config.CLOSE_FUNDING_RATE_DIFFERENCE,
-            'MAX_PRICE_SPREAD': config.MAX_PRICE_SPREAD,
-            'POSITION_SIZE_USDT': config.POSITION_SIZE_USDT,
-            'MAX_TOTAL_EXPOSURE_USDT': config.MAX_TOTAL_EXPOSURE_USDT,
-            'STOP_LOSS_USDT': config.STOP_LOSS_USDT,
-            'MAX_HOLDING_PRICE_SPREAD': config.MAX_HOLDING_PRICE_SPREAD,
-            'MAX_HOLDING_DURATION_HOURS': config.MAX_HOLDING_DURATION_HOURS,
-            'MIN_HOLDING_HOURS_FOR_REVERSAL': config.MIN_HOLDING_HOURS_FOR_REVERSAL,
-            'LOOP_INTERVAL_SECONDS': config.LOOP_INTERVAL_SECONDS,
-            'TEST_MODE': config.TEST_MODE,
-            'TRADING_PAIRS': config.TRADING_PAIRS,
-            'WEB_SERVER_PORT': config.WEB_SERVER_PORT
-        }
+        # 只讀取檔案，不修改 config 模組的全域變數（同一行程中的機器人正在使用）
+        config_data = config.resolve_config(config.read_config_file())
         return jsonify(config_data)
     except Exception as e:
         logging.error(f"Error getting config: {e}")
@@ -635,7 +1134,7 @@ def update_config():
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         # Save to config.json
-        config.save_config_to_file({
+        values = {
             'MIN_FUNDING_RATE_DIFFERENCE': data['MIN_FUNDING_RATE_DIFFERENCE'],
             'CLOSE_FUNDING_RATE_DIFFERENCE': data['CLOSE_FUNDING_RATE_DIFFERENCE'],
             'MAX_PRICE_SPREAD': data['MAX_PRICE_SPREAD'],
@@ -649,23 +1148,42 @@ def update_config():
             'TEST_MODE': data['TEST_MODE'],
             'TRADING_PAIRS': data['TRADING_PAIRS'],
             'WEB_SERVER_PORT': data['WEB_SERVER_PORT']
-        })
-        # Create a config update notification file
-        with open('config_update.timestamp', 'w') as f:
-            f.write(str(time.time()))
-        # Reload configuration to apply changes (for web server process)
-        config.reload_config()
-        
-        # 觸發機器人端的配置重載
-        with open(os.path.join(DATA_DIR, 'config_update.timestamp'), 'w') as f:
-            f.write(str(time.time()))
+        }
+        config.save_config_to_file(values)
+
+        # 發布新的設定快照並通知機器人，由機器人在兩次交易對評估之間套用
+        snapshot, notified = config_channel.publish(values)
             
-        logging.info(f"Configuration saved and update signal sent. Test mode: {data['TEST_MODE']}")
-        return jsonify({'success': True, 'message': 'Configuration updated successfully'})
+        logging.info(f"Configuration saved and published as version {snapshot.version} (bot notified: {notified}). Test mode: {data['TEST_MODE']}")
+        return jsonify({
+            'success': True,
+            'message': 'Configuration updated successfully',
+            'version': snapshot.version,
+            'notified': notified
+        })
     except Exception as e:
         logging.error(f"Error updating config: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/config/status')
+def get_config_status():
+    """API endpoint to compare the last published config version with the one the bot applied"""
+    try:
+        snapshot = config_channel.read_snapshot()
+        applied = config_channel.read_status() or {}
+        published_version = snapshot.version if snapshot else None
+        return jsonify({
+            'published_version': published_version,
+            'published_at': snapshot.published_at if snapshot else None,
+            'applied_version': applied.get('version'),
+            'applied_at': applied.get('applied_at'),
+            'propagation_delay_seconds': applied.get('propagation_delay_seconds'),
+            'in_sync': published_version is None or applied.get('version') == published_version
+        })
+    except Exception as e:
+        logging.error(f"Error getting config status: {e}")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     # Use 0.0.0.0 to make it accessible in a container environment like Zeabur
     # The port is now controlled by the PORT environment variable via Procfile and config.py